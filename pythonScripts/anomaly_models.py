@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import IsolationForest
+from sklearn.neighbors import LocalOutlierFactor
+from sklearn.preprocessing import StandardScaler
+
+from module import load_marathon_data, prepare_marathon_data, analyze_per_user, feature_matrix
+
+MODEL_FEATURES = [
+    'TotalSteps', 'TotalDistance', 'VeryActiveDistance', 'VeryActiveMinutes', 'AvgSpeed', 'DistancePerStep',
+    'heartRate', 'HeartRatePerStep', 'HeartRatePerSpeed',
+    'StepDeviation', 'SpeedDeviation', 'DistPerStepDeviation', 'HeartRateDeviation'
+]
+MODEL_FILE = 'models.joblib'
+METADATA_FILE = 'metadata.json'
+LATEST_FILE = 'LATEST'
+
+_loaded_models = {}
+_loaded_models_lock = threading.Lock()
+
+def model_feature_matrix(df):
+    return feature_matrix(df, MODEL_FEATURES)
+
+def train_models(population_df, contamination=0.05, n_estimators=100, n_neighbors=20, version=None):
+    features = model_feature_matrix(population_df)
+    if len(features) < 2:
+        raise ValueError("Cần ít nhất 2 bản ghi để huấn luyện mô hình")
+
+    scaler = StandardScaler().fit(features)
+    features_scaled = scaler.transform(features, copy=False)
+
+    isolation_forest = IsolationForest(contamination=contamination, random_state=42, n_estimators=n_estimators)
+    isolation_forest.fit(features_scaled)
+
+    lof = LocalOutlierFactor(n_neighbors=min(n_neighbors, len(features_scaled) - 1), contamination=contamination, novelty=True)
+    lof.fit(features_scaled)
+
+    return {
+        'version': version or datetime.now().strftime('%Y%m%d%H%M%S'),
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'features': list(MODEL_FEATURES),
+        'training_rows': len(features_scaled),
+        'contamination': contamination,
+        'sklearn_version': sklearn.__version__,
+        'scaler': scaler,
+        'isolation_forest': isolation_forest,
+        'lof': lof
+    }
+
+def model_metadata(bundle):
+    return {key: value for key, value in bundle.items() if key not in ('scaler', 'isolation_forest', 'lof')}
+
+def save_models(bundle, model_dir):
+    version_dir = os.path.join(model_dir, bundle['version'])
+    os.makedirs(version_dir, exist_ok=True)
+    joblib.dump(bundle, os.path.join(version_dir, MODEL_FILE))
+    with open(os.path.join(version_dir, METADATA_FILE), 'w', encoding='utf-8') as f:
+        json.dump(model_metadata(bundle), f, ensure_ascii=False, indent=2)
+    with open(os.path.join(model_dir, LATEST_FILE), 'w', encoding='utf-8') as f:
+        f.write(bundle['version'])
+    return version_dir
+
+def load_models(model_dir, version=None):
+    if version is None:
+        with open(os.path.join(model_dir, LATEST_FILE), 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+
+    cache_key = (os.path.abspath(model_dir), version)
+    with _loaded_models_lock:
+        if cache_key not in _loaded_models:
+            bundle = joblib.load(os.path.join(model_dir, version, MODEL_FILE))
+            if bundle['features'] != MODEL_FEATURES:
+                raise ValueError(f"Mô hình {version} dùng bộ đặc trưng khác với phiên bản hiện tại")
+            _loaded_models[cache_key] = bundle
+        return _loaded_models[cache_key]
+
+def score_records(bundle, df):
+    features_scaled = bundle['scaler'].transform(model_feature_matrix(df), copy=False)
+    if_predictions = np.where(bundle['isolation_forest'].predict(features_scaled) == -1, 1, 0)
+    lof_predictions = np.where(bundle['lof'].predict(features_scaled) == -1, 1, 0)
+    return {
+        'if_predictions': if_predictions,
+        'if_scores': -bundle['isolation_forest'].score_samples(features_scaled),
+        'lof_predictions': lof_predictions,
+        'lof_scores': -bundle['lof'].score_samples(features_scaled)
+    }
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print("Hướng dẫn sử dụng: python anomaly_models.py <tệp_dữ_liệu_csv_hoặc_jsonl> <thư_mục_mô_hình> [--version <phiên_bản>] [--contamination <tỉ_lệ>]")
+        sys.exit(1)
+
+    version = args[args.index('--version') + 1] if '--version' in args else None
+    contamination = float(args[args.index('--contamination') + 1]) if '--contamination' in args else 0.05
+
+    print(f"Đang tải dữ liệu huấn luyện từ: {args[0]}")
+    population_df, _ = analyze_per_user(prepare_marathon_data(load_marathon_data(args[0])))
+    bundle = train_models(population_df, contamination=contamination, version=version)
+    version_dir = save_models(bundle, args[1])
+    print(f"Đã huấn luyện mô hình phiên bản {bundle['version']} trên {bundle['training_rows']} bản ghi: {version_dir}")
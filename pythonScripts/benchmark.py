@@ -0,0 +1,207 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import record_validator
+from history_stub import HistoryStubServer
+from module import (
+    records_to_marathon_data, prepare_marathon_data, analyze_per_user, extract_features,
+    detect_anomalies_isolation_forest, detect_anomalies_lof, detailed_fraud_analysis, generate_final_report
+)
+from synthetic_data import generate_marathon_records
+
+DEFAULT_SIZES = '50x10,200x10,1000x10'
+
+def parse_sizes(sizes):
+    parsed = []
+    for size in sizes.split(','):
+        n_users, records_per_user = size.lower().split('x')
+        parsed.append((int(n_users), int(records_per_user)))
+    return parsed
+
+def quiet(fn):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+def measure_peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def summarize(latencies, rows_per_call):
+    latencies = np.asarray(latencies)
+    return {
+        'calls': len(latencies),
+        'rows_per_call': rows_per_call,
+        'mean_ms': float(latencies.mean() * 1000),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'throughput_per_s': float(rows_per_call / latencies.mean()) if latencies.mean() > 0 else float('inf')
+    }
+
+def benchmark_stage(fn, repeats, rows_per_call):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    result = summarize(latencies, rows_per_call)
+    result['peak_memory_mb'] = measure_peak_memory(fn) / (1024 * 1024)
+    return result
+
+def benchmark_validate_record(records, samples, stub_server):
+    record_validator.configure_history_client(base_url=stub_server.base_url, cache_ttl=0)
+    latest_by_user = {}
+    for record in records:
+        latest_by_user[record['user']['id']] = record
+    sample_records = [json.dumps(record) for record in list(latest_by_user.values())[:samples]]
+
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for record_json in sample_records:
+            start = time.perf_counter()
+            record_validator.validate_record(record_json)
+            latencies.append(time.perf_counter() - start)
+        peak_memory = measure_peak_memory(lambda: record_validator.validate_record(sample_records[0]))
+
+    result = summarize(latencies, 1)
+    result['peak_memory_mb'] = peak_memory / (1024 * 1024)
+    return result
+
+def benchmark_size(n_users, records_per_user, repeats, validate_samples, seed):
+    records = generate_marathon_records(n_users, records_per_user, seed=seed, end_time=datetime.now())
+    raw_df = records_to_marathon_data(records)
+    rows = len(raw_df)
+    results = {}
+
+    prepared_df = prepare_marathon_data(raw_df.copy())
+    results['prepare_marathon_data'] = benchmark_stage(lambda: prepare_marathon_data(raw_df.copy()), repeats, rows)
+
+    analyzed_df, _ = analyze_per_user(prepared_df.copy())
+    results['analyze_per_user'] = benchmark_stage(lambda: analyze_per_user(prepared_df.copy()), repeats, rows)
+
+    features_scaled, _ = extract_features(analyzed_df)
+    results['extract_features'] = benchmark_stage(lambda: extract_features(analyzed_df), repeats, rows)
+
+    if_predictions, _ = detect_anomalies_isolation_forest(features_scaled)
+    results['detect_anomalies_isolation_forest'] = benchmark_stage(
+        lambda: detect_anomalies_isolation_forest(features_scaled), repeats, rows)
+
+    lof_predictions, _ = detect_anomalies_lof(features_scaled)
+    results['detect_anomalies_lof'] = benchmark_stage(lambda: detect_anomalies_lof(features_scaled), repeats, rows)
+
+    flagged_df = analyzed_df.copy()
+    flagged_df['IsFraud'] = np.maximum(if_predictions, lof_predictions)
+    classified_df = quiet(lambda: detailed_fraud_analysis(flagged_df.copy()))()
+    results['detailed_fraud_analysis'] = benchmark_stage(
+        quiet(lambda: detailed_fraud_analysis(flagged_df.copy())), repeats, rows)
+
+    results['generate_final_report'] = benchmark_stage(
+        quiet(lambda: generate_final_report(classified_df)), repeats, rows)
+
+    stub_server = HistoryStubServer(records).start()
+    try:
+        results['validate_record'] = benchmark_validate_record(records, validate_samples, stub_server)
+    finally:
+        stub_server.stop()
+
+    return results
+
+def run_benchmarks(sizes, repeats=5, validate_samples=30, seed=42):
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {'repeats': repeats, 'validate_samples': validate_samples, 'seed': seed},
+        'sizes': {}
+    }
+    for n_users, records_per_user in sizes:
+        size_key = f'{n_users}x{records_per_user}'
+        print(f"Đang đo hiệu năng với {n_users} người dùng x {records_per_user} bản ghi...")
+        report['sizes'][size_key] = benchmark_size(n_users, records_per_user, repeats, validate_samples, seed)
+    return report
+
+def print_report(report):
+    for size_key, stages in report['sizes'].items():
+        print(f"\n=== Kích thước {size_key} ===")
+        print(f"{'Giai đoạn':<36}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'bản ghi/s':>14}{'bộ nhớ MB':>12}")
+        for stage, result in stages.items():
+            print(f"{stage:<36}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                  f"{result['throughput_per_s']:>14.0f}{result['peak_memory_mb']:>12.2f}")
+
+def compare_reports(baseline, current, tolerance=0.25):
+    regressions = []
+    for size_key, stages in current['sizes'].items():
+        baseline_stages = baseline.get('sizes', {}).get(size_key, {})
+        for stage, result in stages.items():
+            if stage not in baseline_stages:
+                continue
+            for metric in ('p50_ms', 'peak_memory_mb'):
+                previous = baseline_stages[stage][metric]
+                if previous > 0 and result[metric] > previous * (1 + tolerance):
+                    regressions.append({
+                        'size': size_key,
+                        'stage': stage,
+                        'metric': metric,
+                        'baseline': previous,
+                        'current': result[metric],
+                        'ratio': result[metric] / previous
+                    })
+    return regressions
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    sizes = parse_sizes(option('--sizes', DEFAULT_SIZES))
+    report = run_benchmarks(
+        sizes,
+        repeats=int(option('--repeats', 5)),
+        validate_samples=int(option('--validate-samples', 30)),
+        seed=int(option('--seed', 42))
+    )
+    print_report(report)
+
+    if option('--output'):
+        with open(option('--output'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if option('--save-baseline'):
+        with open(option('--save-baseline'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã lưu kết quả chuẩn: {option('--save-baseline')}")
+
+    if option('--compare'):
+        with open(option('--compare'), 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, float(option('--tolerance', 0.25)))
+        if regressions:
+            print("\nPhát hiện suy giảm hiệu năng:")
+            for regression in regressions:
+                print(f"- {regression['size']} / {regression['stage']} / {regression['metric']}: "
+                      f"{regression['baseline']:.2f} -> {regression['current']:.2f} (x{regression['ratio']:.2f})")
+            sys.exit(1)
+        print("\nKhông phát hiện suy giảm hiệu năng so với kết quả chuẩn.")
@@ -0,0 +1,33 @@
+import json
+import sys
+import threading
+from datetime import datetime
+
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+_log_config = {'level': LOG_LEVELS['INFO'], 'structured': False, 'stream': None}
+_log_lock = threading.Lock()
+
+def configure_logging(level='INFO', structured=False, stream=None):
+    _log_config['level'] = LOG_LEVELS[str(level).upper()]
+    _log_config['structured'] = structured
+    _log_config['stream'] = stream
+
+def log(level, message, **fields):
+    if LOG_LEVELS[level] < _log_config['level']:
+        return
+
+    stream = _log_config['stream'] or sys.stdout
+    if not _log_config['structured']:
+        print(message, file=stream)
+        return
+
+    entry = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'level': level,
+        'message': message,
+        **fields
+    }
+    with _log_lock:
+        stream.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        stream.flush()
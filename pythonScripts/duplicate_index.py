@@ -0,0 +1,280 @@
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+from itertools import combinations
+
+from run_record import RunRecord, end_time_seconds, frame_end_seconds, is_missing
+
+FINGERPRINT_FIELDS = ('steps', 'distance', 'time_taken', 'heart_rate', 'end_time')
+FIELD_DECIMALS = (0, 3, 2, 1, 0)
+NEAR_TOLERANCE = {'steps': 0.02, 'distance': 0.02, 'time_taken': 0.05, 'heart_rate': 3.0, 'end_time': 600}
+BAND_SIZE = 3
+BANDS = list(combinations(range(len(FINGERPRINT_FIELDS)), BAND_SIZE))
+MAX_CANDIDATES = 1000
+
+def signed_digest(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+def quantize(value, decimals):
+    if is_missing(value):
+        return None
+    value = round(float(value), decimals)
+    return int(value) if decimals == 0 else value
+
+def field_close(field, value, other):
+    tolerance = NEAR_TOLERANCE[field]
+    if field in ('heart_rate', 'end_time'):
+        return abs(value - other) <= tolerance
+    return abs(value - other) <= tolerance * max(abs(value), abs(other))
+
+def is_near(values, other):
+    exact_fields = 0
+    for field, value, other_value in zip(FINGERPRINT_FIELDS, values, other):
+        if value is None or other_value is None:
+            if field != 'heart_rate':
+                return False
+        elif value == other_value:
+            exact_fields += 1
+        elif not field_close(field, value, other_value):
+            return False
+    return exact_fields >= BAND_SIZE
+
+class RecordFingerprint:
+    __slots__ = ('user_id', 'record_id', 'values', 'content_hash', 'buckets')
+
+    def __init__(self, user_id, record_id, steps, distance, time_taken, heart_rate, end_time):
+        self.user_id = str(user_id)
+        self.record_id = None if is_missing(record_id) or record_id == '' else str(record_id)
+        self.values = tuple(quantize(value, decimals) for value, decimals in zip(
+            (steps or 0, distance or 0, time_taken or 0, heart_rate, end_time_seconds(end_time)), FIELD_DECIMALS))
+        self.content_hash = signed_digest("|".join('' if value is None else str(value) for value in self.values))
+        self.buckets = [
+            signed_digest("|".join(f"{field}={self.values[field]}" for field in band)) for band in BANDS
+            if all(self.values[field] is not None for field in band)
+        ]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.get('UserId'), row.get('Id'), row.get('TotalSteps'), row.get('TotalDistance'),
+                   row.get('TimeTaken'), row.get('heartRate'), row.get('EndTime', row.get('Timestamp')))
+
+def candidate_match(fingerprint, record_id, user_id, content_hash, values):
+    exact = content_hash == fingerprint.content_hash
+    if user_id == fingerprint.user_id:
+        if record_id is not None and record_id == fingerprint.record_id:
+            return None
+        if record_id is None and exact:
+            return None
+    if exact or is_near(fingerprint.values, values):
+        return {'recordId': record_id, 'userId': user_id, 'exact': exact}
+    return None
+
+def batch_matches(fingerprints):
+    earlier = {}
+    matches = []
+    for position, fingerprint in enumerate(fingerprints):
+        keys = [fingerprint.content_hash, *fingerprint.buckets]
+        row_matches = []
+        for other in sorted({other for key in keys for other in earlier.get(key, ())}):
+            previous = fingerprints[other]
+            match = candidate_match(fingerprint, previous.record_id, previous.user_id, previous.content_hash, previous.values)
+            if match is not None:
+                row_matches.append((other, match))
+        matches.append(row_matches)
+        for key in keys:
+            earlier.setdefault(key, []).append(position)
+    return matches
+
+def duplicate_features(matches, fingerprint):
+    return {
+        'cross_user_matches': len({match['userId'] for match in matches if match['userId'] != fingerprint.user_id}),
+        'replay_matches': sum(1 for match in matches if match['userId'] == fingerprint.user_id)
+    }
+
+class DuplicateIndex:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS submitted_records (id INTEGER PRIMARY KEY, record_id TEXT, user_id TEXT NOT NULL, "
+            "content_hash INTEGER NOT NULL, steps REAL, distance REAL, time_taken REAL, heart_rate REAL, end_time INTEGER)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS submitted_records_hash ON submitted_records (content_hash)")
+        self.connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS submitted_records_user_record ON submitted_records (user_id, record_id)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS record_buckets (bucket INTEGER NOT NULL, record INTEGER NOT NULL, "
+            "PRIMARY KEY (bucket, record)) WITHOUT ROWID"
+        )
+
+    def _matches(self, fingerprint):
+        query = ("SELECT id, record_id, user_id, content_hash, steps, distance, time_taken, heart_rate, end_time "
+                 "FROM submitted_records WHERE content_hash = ?")
+        params = [fingerprint.content_hash]
+        if fingerprint.buckets:
+            query += (" UNION SELECT r.id, r.record_id, r.user_id, r.content_hash, r.steps, r.distance, r.time_taken, "
+                      "r.heart_rate, r.end_time FROM record_buckets b JOIN submitted_records r ON r.id = b.record "
+                      f"WHERE b.bucket IN ({', '.join('?' for _ in fingerprint.buckets)})")
+            params.extend(fingerprint.buckets)
+        query += " LIMIT ?"
+        params.append(MAX_CANDIDATES)
+
+        matches = []
+        for _, record_id, user_id, content_hash, *values in self.connection.execute(query, params):
+            match = candidate_match(fingerprint, record_id, user_id, content_hash, values)
+            if match is not None:
+                matches.append(match)
+        return matches
+
+    def _add(self, fingerprint):
+        unsaved = self.connection.execute(
+            "SELECT id FROM submitted_records WHERE user_id = ? AND content_hash = ? AND record_id IS NULL LIMIT 1",
+            [fingerprint.user_id, fingerprint.content_hash]
+        ).fetchone()
+        if unsaved is not None:
+            if fingerprint.record_id is not None:
+                self.connection.execute("UPDATE OR IGNORE submitted_records SET record_id = ? WHERE id = ?",
+                                        [fingerprint.record_id, unsaved[0]])
+            return
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO submitted_records (record_id, user_id, content_hash, steps, distance, time_taken, "
+            "heart_rate, end_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [fingerprint.record_id, fingerprint.user_id, fingerprint.content_hash, *fingerprint.values]
+        )
+        if cursor.rowcount:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO record_buckets (bucket, record) VALUES (?, ?)",
+                [(bucket, cursor.lastrowid) for bucket in fingerprint.buckets]
+            )
+
+    def matches(self, fingerprint):
+        with self.lock:
+            return self._matches(fingerprint)
+
+    def add_many(self, fingerprints):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                for fingerprint in fingerprints:
+                    self._add(fingerprint)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def add(self, fingerprint):
+        self.add_many([fingerprint])
+
+    def observe_many(self, fingerprints):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                results = []
+                for fingerprint in fingerprints:
+                    results.append(self._matches(fingerprint))
+                    self._add(fingerprint)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return results
+
+    def record_count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM submitted_records").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def group_pairs(group_ids, user_codes):
+    import numpy as np
+    import pandas as pd
+    groups = pd.DataFrame({'group': group_ids, 'row': np.arange(len(group_ids)), 'user': user_codes})
+    groups = groups[groups['group'] >= 0]
+    groups = groups[groups.groupby('group')['user'].transform('nunique') > 1]
+    pairs = groups.merge(groups, on='group')
+    pairs = pairs[pairs['user_x'] != pairs['user_y']]
+    return pairs['row_x'].to_numpy(), pairs['row_y'].to_numpy()
+
+def frame_values(df):
+    import numpy as np
+    columns = {
+        'steps': df['TotalSteps'],
+        'distance': df['TotalDistance'],
+        'time_taken': df['TimeTaken'],
+        'heart_rate': df['heartRate'] if 'heartRate' in df.columns else np.full(len(df), np.nan)
+    }
+    values = [np.round(np.asarray(columns[field], dtype=float), decimals)
+              for field, decimals in zip(FINGERPRINT_FIELDS[:-1], FIELD_DECIMALS[:-1])]
+    for index in range(3):
+        values[index] = np.nan_to_num(values[index], nan=0.0)
+    return values + [frame_end_seconds(df)]
+
+def near_pairs(values, left, right):
+    import numpy as np
+    near = np.ones(len(left), dtype=bool)
+    exact_fields = np.zeros(len(left), dtype=int)
+    with np.errstate(invalid='ignore'):
+        for field, column in zip(FINGERPRINT_FIELDS, values):
+            value, other = column[left], column[right]
+            missing = np.isnan(value) | np.isnan(other)
+            if field != 'heart_rate':
+                near &= ~missing
+            exact = ~missing & (value == other)
+            exact_fields += exact
+            gap = np.abs(value - other)
+            if field in ('heart_rate', 'end_time'):
+                close = gap <= NEAR_TOLERANCE[field]
+            else:
+                close = gap <= NEAR_TOLERANCE[field] * np.maximum(np.abs(value), np.abs(other))
+            near &= missing | exact | close
+    return near & (exact_fields >= BAND_SIZE)
+
+def duplicate_users(df):
+    import numpy as np
+    import pandas as pd
+    user_id_col = 'UserId' if 'UserId' in df.columns else 'Id'
+    user_codes, _ = pd.factorize(df[user_id_col].astype(str))
+    values = frame_values(df)
+    columns = pd.DataFrame(dict(zip(FINGERPRINT_FIELDS, values)))
+
+    content_ids = columns.groupby(list(FINGERPRINT_FIELDS), dropna=False, sort=False).ngroup().to_numpy()
+    pair_rows = [group_pairs(content_ids, user_codes)]
+    for band in BANDS:
+        band_fields = [FINGERPRINT_FIELDS[field] for field in band]
+        band_ids = columns.groupby(band_fields, dropna=True, sort=False).ngroup().to_numpy()
+        left, right = group_pairs(band_ids, user_codes)
+        near = near_pairs(values, left, right)
+        pair_rows.append((left[near], right[near]))
+
+    pairs = pd.DataFrame({
+        'row': np.concatenate([left for left, _ in pair_rows]),
+        'user': user_codes[np.concatenate([right for _, right in pair_rows])]
+    }).drop_duplicates()
+    counts = np.zeros(len(df), dtype=int)
+    row_counts = pairs.groupby('row').size()
+    counts[row_counts.index.to_numpy()] = row_counts.to_numpy()
+    return counts
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Hướng dẫn sử dụng: python duplicate_index.py <tệp_sqlite> <tệp_jsonl_bản_ghi>")
+        sys.exit(1)
+
+    index = DuplicateIndex(sys.argv[1])
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        fingerprints = [RecordFingerprint.from_row(RunRecord.from_dict(json.loads(line)).to_row()) for line in f if line.strip()]
+    duplicated = 0
+    for fingerprint, matches in zip(fingerprints, index.observe_many(fingerprints)):
+        features = duplicate_features(matches, fingerprint)
+        if features['cross_user_matches'] or features['replay_matches']:
+            duplicated += 1
+    print(f"Đã lập chỉ mục {len(fingerprints)} bản ghi, phát hiện {duplicated} bản ghi trùng lặp "
+          f"(tổng {index.record_count()} bản ghi trong {sys.argv[1]})")
+    index.close()
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from diagnostics import log
+from run_record import history_bounds, parse_timestamp, safe_get
+
+DEFAULT_API_URL = 'http://localhost:8080/api/v1/record/user'
+
+class TTLCache:
+    def __init__(self, max_size=1024, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+class HistoryIndex:
+    __slots__ = ('start', 'end', 'end_times', 'records', 'unparsed')
+
+    def __init__(self, records, start, end):
+        timed = []
+        self.unparsed = 0
+        for record in records:
+            end_time = parse_timestamp(safe_get(record, 'endTime'))
+            if end_time is not None:
+                timed.append((end_time, record))
+            else:
+                self.unparsed += 1
+        timed.sort(key=lambda item: item[0])
+        self.start = start
+        self.end = end
+        self.end_times = [end_time for end_time, _ in timed]
+        self.records = [record for _, record in timed]
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def window(self, start, end, max_records=None, exclude_id=None):
+        lower = bisect_left(self.end_times, start)
+        upper = bisect_right(self.end_times, end)
+        records = self.records[lower:upper]
+        if exclude_id is not None and exclude_id != '':
+            exclude_id = str(exclude_id)
+            records = [record for record in records if str(safe_get(record, 'id')) != exclude_id]
+        if max_records:
+            records = records[-max_records:]
+        return records
+
+class HistoryClient:
+    def __init__(self, base_url=None, timeout=10, pool_size=10, cache_size=1024, cache_ttl=60.0):
+        self.base_url = (base_url or os.getenv('API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.batch = threading.local()
+        self.unparsed_records = 0
+        self.unparsed_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Connection': 'keep-alive', 'Accept': 'application/json'})
+
+    def history_url(self, user_id, start_date, end_date):
+        return (
+            f'{self.base_url}/{user_id}/history'
+            f'?startDate={start_date.strftime("%Y-%m-%dT%H:%M:%S")}&endDate={end_date.strftime("%Y-%m-%dT%H:%M:%S")}'
+        )
+
+    def fetch_index(self, user_id, start, end):
+        cache_key = str(user_id)
+        prefetched = getattr(self.batch, 'indexes', None)
+        if prefetched is not None:
+            index = prefetched.get(cache_key)
+            if index is not None and index.covers(start, end):
+                return index
+
+        cached = self.cache.get(cache_key)
+        if cached is not None and cached[1].covers(start, end):
+            return cached[1]
+
+        api_url = self.history_url(user_id, start, end)
+        log('DEBUG', f"Đang tải lịch sử chạy bộ của bạn: {api_url}", userId=user_id)
+        response = self.session.get(api_url, timeout=self.timeout)
+        response.raise_for_status()
+
+        index = HistoryIndex(response.json() or [], start, end)
+        if index.unparsed:
+            with self.unparsed_lock:
+                self.unparsed_records += index.unparsed
+            log('WARNING', f"Bỏ qua {index.unparsed} bản ghi lịch sử của người dùng {user_id} vì endTime không hợp lệ",
+                userId=user_id, unparsedRecords=index.unparsed)
+        self.cache.put(cache_key, index)
+        return index
+
+    def fetch_records(self, user_id, days=7, end_time=None, max_records=None, exclude_id=None):
+        start, end = history_bounds(days, end_time)
+        return self.fetch_index(user_id, start, end).window(start, end, max_records, exclude_id)
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        self.cache.invalidate(lambda key: key == user_id)
+
+    async def fetch_index_async(self, user_id, start, end):
+        return await asyncio.to_thread(self.fetch_index, user_id, start, end)
+
+    async def fetch_many_async(self, ranges):
+        """Tải song song bằng luồng: mỗi yêu cầu requests đồng bộ chạy trong asyncio.to_thread, tối đa pool_size luồng."""
+        semaphore = asyncio.Semaphore(self.pool_size)
+
+        async def fetch(user_id, start, end):
+            async with semaphore:
+                try:
+                    return user_id, await self.fetch_index_async(user_id, start, end)
+                except requests.RequestException as e:
+                    log('WARNING', f"Không thể tải lịch sử chạy bộ của người dùng {user_id}: {e}", userId=user_id)
+                    return user_id, None
+
+        return dict(await asyncio.gather(*(fetch(user_id, start, end) for user_id, (start, end) in ranges.items())))
+
+    def prefetch(self, ranges):
+        return asyncio.run(self.fetch_many_async(ranges))
+
+    @contextmanager
+    def batch_scope(self, ranges):
+        indexes = self.prefetch(ranges) if ranges else {}
+        self.batch.indexes = {str(user_id): index for user_id, index in indexes.items() if index is not None}
+        try:
+            yield
+        finally:
+            self.batch.indexes = None
+
+    def close(self):
+        self.session.close()
+        self.cache.clear()
@@ -0,0 +1,204 @@
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from run_record import end_time_seconds, history_bounds, safe_get, safe_get_nested, safe_get_numeric
+
+HISTORY_COLUMNS = {
+    'id': np.dtype('<i8'),
+    'steps': np.dtype('<f4'),
+    'distance': np.dtype('<f4'),
+    'time_taken': np.dtype('<f4'),
+    'avg_speed': np.dtype('<f4'),
+    'heart_rate': np.dtype('<f4'),
+    'end_time': np.dtype('<i8')
+}
+HISTORY_ROW = np.dtype(list(HISTORY_COLUMNS.items()))
+HISTORY_FILE = 'history.bin'
+SAFE_USER_KEY = re.compile(r'^[A-Za-z0-9_-]+$')
+LOCK_FILE = '.lock'
+MAPPED_FILES = 256
+
+def store_record_id(record_id):
+    try:
+        return int(record_id)
+    except (TypeError, ValueError):
+        return None
+
+def user_key(user_id):
+    user_id = str(user_id)
+    return user_id if SAFE_USER_KEY.match(user_id) else 'x' + user_id.encode('utf-8').hex()
+
+def record_to_history_row(record):
+    end_time = end_time_seconds(safe_get(record, 'endTime', ''))
+    if end_time is None:
+        return None
+    record_id = safe_get_numeric(record, 'id', -1)
+    heart_rate = safe_get_numeric(record, 'heartRate', None, allow_none=True)
+    return (
+        int(record_id) if record_id == record_id else -1,
+        safe_get_numeric(record, 'steps', 0),
+        safe_get_numeric(record, 'distance', 0.0),
+        safe_get_numeric(record, 'timeTaken', 0),
+        safe_get_numeric(record, 'avgSpeed', 0.0),
+        np.nan if heart_rate is None else heart_rate,
+        end_time
+    )
+
+class HistoryStore:
+    def __init__(self, root, mapped_files=MAPPED_FILES):
+        self.root = root
+        self.lock = threading.Lock()
+        self.mapped = OrderedDict()
+        self.mapped_files = mapped_files
+        self.mapped_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def user_dir(self, user_id):
+        return os.path.join(self.root, user_key(user_id))
+
+    def history_path(self, user_id):
+        return os.path.join(self.user_dir(user_id), HISTORY_FILE)
+
+    def row_count(self, user_id):
+        try:
+            return os.path.getsize(self.history_path(user_id)) // HISTORY_ROW.itemsize
+        except FileNotFoundError:
+            return 0
+
+    @contextmanager
+    def user_lock(self, user_id):
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.user_dir(user_id), LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def columns(self, user_id):
+        try:
+            history_stat = os.stat(self.history_path(user_id))
+        except FileNotFoundError:
+            return None
+        row_count = history_stat.st_size // HISTORY_ROW.itemsize
+        if row_count == 0:
+            return None
+
+        key = user_key(user_id)
+        version = (history_stat.st_ino, row_count)
+        with self.mapped_lock:
+            cached = self.mapped.get(key)
+            if cached is not None and cached[0] == version:
+                self.mapped.move_to_end(key)
+                return cached[1]
+
+        rows = np.memmap(self.history_path(user_id), dtype=HISTORY_ROW, mode='r', shape=(row_count,))
+        columns = {column: rows[column] for column in HISTORY_COLUMNS}
+        with self.mapped_lock:
+            self.mapped[key] = (version, columns)
+            self.mapped.move_to_end(key)
+            while len(self.mapped) > self.mapped_files:
+                self.mapped.popitem(last=False)
+        return columns
+
+    def append_rows(self, user_id, rows):
+        rows = [row for row in rows if row is not None]
+        if not rows:
+            return 0
+        new_rows = np.array(rows, dtype=HISTORY_ROW)
+        new_rows = new_rows[np.argsort(new_rows['end_time'], kind='stable')]
+
+        os.makedirs(self.user_dir(user_id), exist_ok=True)
+        with self.user_lock(user_id):
+            path = self.history_path(user_id)
+            row_count = self.row_count(user_id)
+            if os.path.exists(path) and os.path.getsize(path) > row_count * HISTORY_ROW.itemsize:
+                os.truncate(path, row_count * HISTORY_ROW.itemsize)
+
+            existing = self.columns(user_id)
+            if existing is not None and existing['end_time'][-1] > new_rows['end_time'][0]:
+                merged = np.concatenate([np.fromfile(path, dtype=HISTORY_ROW, count=row_count), new_rows])
+                self.replace_rows(user_id, merged[np.argsort(merged['end_time'], kind='stable')])
+            else:
+                with open(path, 'ab') as f:
+                    f.write(new_rows.tobytes())
+        return len(rows)
+
+    def replace_rows(self, user_id, rows):
+        path = self.history_path(user_id)
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    def append_records(self, records):
+        rows_by_user = {}
+        for record in records:
+            user_id = safe_get_nested(record, ['user', 'id'])
+            if user_id is None:
+                continue
+            rows_by_user.setdefault(user_id, []).append(record_to_history_row(record))
+        return sum(self.append_rows(user_id, rows) for user_id, rows in rows_by_user.items())
+
+    def window(self, user_id, days=7, end_time=None, max_records=None, exclude_id=None):
+        columns = self.columns(user_id)
+        if columns is None:
+            return None
+        start, end = history_bounds(days, end_time)
+        end_times = columns['end_time']
+        lower = np.searchsorted(end_times, end_time_seconds(start), side='left')
+        upper = np.searchsorted(end_times, end_time_seconds(end), side='right')
+        window = {column: values[lower:upper] for column, values in columns.items()}
+
+        exclude_id = store_record_id(exclude_id)
+        if exclude_id is not None and (window['id'] == exclude_id).any():
+            keep = window['id'] != exclude_id
+            window = {column: values[keep] for column, values in window.items()}
+        if max_records:
+            window = {column: values[-max_records:] for column, values in window.items()}
+        return window if len(window['end_time']) else None
+
+    def window_frame(self, user_id, days=7, end_time=None, max_records=None, exclude_id=None):
+        import pandas as pd
+        window = self.window(user_id, days, end_time, max_records, exclude_id)
+        if window is None:
+            return None
+        return pd.DataFrame({
+            'Id': window['id'],
+            'UserId': np.full(len(window['id']), user_id),
+            'TotalSteps': window['steps'],
+            'TotalDistance': window['distance'],
+            'TimeTaken': window['time_taken'],
+            'AvgSpeed': window['avg_speed'],
+            'Timestamp': window['end_time'].view('datetime64[s]'),
+            'heartRate': window['heart_rate']
+        }, copy=False)
+
+    def users(self):
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Hướng dẫn sử dụng: python history_store.py <thư_mục_lịch_sử> <tệp_jsonl_bản_ghi>")
+        sys.exit(1)
+
+    store = HistoryStore(sys.argv[1])
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        loaded = store.append_records(json.loads(line) for line in f if line.strip())
+    print(f"Đã ghi {loaded} bản ghi lịch sử cho {len(store.users())} người dùng vào {sys.argv[1]}")
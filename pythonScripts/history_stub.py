@@ -0,0 +1,102 @@
+import json
+import re
+import sys
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HISTORY_PATH = re.compile(r'^/api/v1/record/user/([^/]+)/history$')
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+class HistoryStubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        match = HISTORY_PATH.match(url.path)
+        if match is None:
+            self.send_error(404)
+            return
+
+        query = parse_qs(url.query)
+        start_date = parse_time(query.get('startDate', [''])[0])
+        end_date = parse_time(query.get('endDate', [''])[0])
+        records = self.server.history_for(match.group(1), start_date, end_date)
+        body = json.dumps(records, ensure_ascii=False).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class HistoryStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, records=(), host='127.0.0.1', port=0):
+        super().__init__((host, port), HistoryStubHandler)
+        self.records_by_user = {}
+        self.request_count = 0
+        self.lock = threading.Lock()
+        for record in records:
+            self.add_record(record)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api/v1/record/user'
+
+    def add_record(self, record):
+        user_id = str((record.get('user') or {}).get('id', ''))
+        with self.lock:
+            self.records_by_user.setdefault(user_id, []).append(record)
+
+    def history_for(self, user_id, start_date, end_date):
+        with self.lock:
+            self.request_count += 1
+            records = list(self.records_by_user.get(user_id, []))
+
+        selected = []
+        for record in records:
+            end_time = parse_time(record.get('endTime', ''))
+            if end_time is None:
+                continue
+            if start_date is not None and end_time < start_date:
+                continue
+            if end_date is not None and end_time > end_date:
+                continue
+            selected.append(record)
+        return selected
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def load_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Hướng dẫn sử dụng: python history_stub.py <tệp_jsonl_lịch_sử> [--port <cổng>]")
+        sys.exit(1)
+
+    port = int(sys.argv[sys.argv.index('--port') + 1]) if '--port' in sys.argv else 8080
+    server = HistoryStubServer(load_jsonl(sys.argv[1]), port=port)
+    print(f"Máy chủ lịch sử giả lập đang chạy tại: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_settings = {'track_allocations': False}
+_local = threading.local()
+
+class StageMetrics:
+    __slots__ = ('count', 'total_seconds', 'max_seconds', 'bucket_counts', 'allocated_bytes')
+
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bucket_counts = [0] * bucket_count
+        self.allocated_bytes = 0
+
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages = {}
+        self.outcomes = {}
+
+    def observe(self, stage_name, seconds, allocated_bytes=None):
+        with self.lock:
+            metrics = self.stages.get(stage_name)
+            if metrics is None:
+                metrics = self.stages[stage_name] = StageMetrics(len(self.buckets))
+            metrics.count += 1
+            metrics.total_seconds += seconds
+            metrics.max_seconds = max(metrics.max_seconds, seconds)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    metrics.bucket_counts[index] += 1
+                    break
+            if allocated_bytes is not None:
+                metrics.allocated_bytes += allocated_bytes
+
+    def count_outcome(self, status):
+        with self.lock:
+            self.outcomes[status] = self.outcomes.get(status, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.stages = {}
+            self.outcomes = {}
+
+    def snapshot(self):
+        with self.lock:
+            stages = {}
+            for stage_name, metrics in self.stages.items():
+                cumulative = 0
+                buckets = {}
+                for bound, bucket_count in zip(self.buckets, metrics.bucket_counts):
+                    cumulative += bucket_count
+                    buckets[str(bound)] = cumulative
+                buckets['+Inf'] = metrics.count
+                stages[stage_name] = {
+                    'count': metrics.count,
+                    'totalMs': metrics.total_seconds * 1000,
+                    'meanMs': metrics.total_seconds * 1000 / metrics.count if metrics.count else 0.0,
+                    'maxMs': metrics.max_seconds * 1000,
+                    'allocatedBytes': metrics.allocated_bytes,
+                    'buckets': buckets
+                }
+            return {
+                'uptimeSeconds': time.time() - self.started_at,
+                'stages': stages,
+                'outcomes': dict(self.outcomes)
+            }
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP validator_stage_duration_seconds Wall time spent in each validation stage.',
+            '# TYPE validator_stage_duration_seconds histogram'
+        ]
+        for stage_name, stage in snapshot['stages'].items():
+            for bound, cumulative in stage['buckets'].items():
+                lines.append(f'validator_stage_duration_seconds_bucket{{stage="{stage_name}",le="{bound}"}} {cumulative}')
+            lines.append(f'validator_stage_duration_seconds_sum{{stage="{stage_name}"}} {stage["totalMs"] / 1000}')
+            lines.append(f'validator_stage_duration_seconds_count{{stage="{stage_name}"}} {stage["count"]}')
+
+        lines.append('# HELP validator_stage_allocated_bytes_total Bytes allocated in each stage while allocation tracking is on '
+                     '(process-wide peak for outermost main-thread stages, net growth otherwise).')
+        lines.append('# TYPE validator_stage_allocated_bytes_total counter')
+        for stage_name, stage in snapshot['stages'].items():
+            lines.append(f'validator_stage_allocated_bytes_total{{stage="{stage_name}"}} {stage["allocatedBytes"]}')
+
+        lines.append('# HELP validator_results_total Validation results by approval status.')
+        lines.append('# TYPE validator_results_total counter')
+        for status, count in snapshot['outcomes'].items():
+            lines.append(f'validator_results_total{{status="{status}"}} {count}')
+
+        lines.append('# HELP validator_uptime_seconds Seconds since the metrics were last reset.')
+        lines.append('# TYPE validator_uptime_seconds gauge')
+        lines.append(f'validator_uptime_seconds {snapshot["uptimeSeconds"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+    def write_json(self, path):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+_registry = MetricsRegistry()
+
+def get_registry():
+    return _registry
+
+def configure_instrumentation(track_allocations=False):
+    _settings['track_allocations'] = track_allocations
+    if track_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+@contextmanager
+def trace():
+    previous = getattr(_local, 'timings', None)
+    timings = _local.timings = {}
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+@contextmanager
+def stage(stage_name):
+    """Đỉnh bộ nhớ tracemalloc là giá trị chung của cả tiến trình: chỉ giai đoạn ngoài cùng trên luồng chính đo theo đỉnh, các giai đoạn lồng nhau hoặc trên luồng khác đo phần bộ nhớ tăng thêm."""
+    track_allocations = _settings['track_allocations'] and tracemalloc.is_tracing()
+    depth = getattr(_local, 'stage_depth', 0)
+    track_peak = track_allocations and depth == 0 and threading.current_thread() is threading.main_thread()
+    if track_peak:
+        tracemalloc.reset_peak()
+    if track_allocations:
+        start_memory = tracemalloc.get_traced_memory()[0]
+    _local.stage_depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _local.stage_depth = depth
+        allocated_bytes = None
+        if track_allocations:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            allocated_bytes = max(0, (peak_memory if track_peak else current_memory) - start_memory)
+        _registry.observe(stage_name, seconds, allocated_bytes)
+
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timing = timings.setdefault(stage_name, {'ms': 0.0})
+            timing['ms'] += seconds * 1000
+            if allocated_bytes is not None:
+                timing['allocatedKb'] = timing.get('allocatedKb', 0.0) + allocated_bytes / 1024
+
+class MetricsExporter:
+    def __init__(self, path, interval=15.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or _registry
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def write(self):
+        if self.path.endswith('.json'):
+            self.registry.write_json(self.path)
+        else:
+            self.registry.write_prometheus(self.path)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.write()
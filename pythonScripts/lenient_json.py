@@ -0,0 +1,209 @@
+import json
+import math
+import re
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RECORD_SCHEMA = {
+    'id': None,
+    'user': {'id': None},
+    'steps': None,
+    'distance': None,
+    'timeTaken': None,
+    'avgSpeed': None,
+    'endTime': None,
+    'heartRate': None,
+    'eventId': None,
+    'event': {'id': None},
+    'samples': None,
+    'splits': None
+}
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+BARE_VALUE = re.compile(r'[^,\]}:\s]*')
+BARE_KEY = re.compile(r'[^:{}\[\],\s]*')
+NUMBER = re.compile(r'-?\d+(\.\d+)?([eE][-+]?\d+)?$')
+LITERALS = {
+    'true': True, 'false': False, 'null': None,
+    'True': True, 'False': False, 'None': None,
+    'NaN': math.nan, 'Infinity': math.inf, '-Infinity': -math.inf
+}
+STRICT_DECODER = json.JSONDecoder()
+ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+class LenientDecoder:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.end = len(text)
+        self.strict = True
+
+    def error(self, message):
+        raise json.JSONDecodeError(message, self.text, self.pos)
+
+    def peek(self):
+        self.pos = WHITESPACE.match(self.text, self.pos).end()
+        return self.text[self.pos] if self.pos < self.end else ''
+
+    def decode(self, schema=None):
+        value = self.value(schema)
+        if self.peek():
+            self.error("Dữ liệu thừa sau giá trị JSON")
+        return value
+
+    def value(self, schema=None, keep=True):
+        char = self.peek()
+        if self.strict and keep and schema is None and (char == '{' or char == '['):
+            try:
+                value, self.pos = STRICT_DECODER.raw_decode(self.text, self.pos)
+                return value
+            except json.JSONDecodeError:
+                self.strict = False
+        if char == '{':
+            return self.object(schema, keep)
+        if char == '[':
+            return self.array(schema, keep)
+        if char == '"' or char == "'":
+            return self.string(keep)
+        return self.bare(keep)
+
+    def object(self, schema, keep):
+        self.pos += 1
+        result = {} if keep else None
+        while True:
+            char = self.peek()
+            if char == '}':
+                self.pos += 1
+                return result
+            if not char:
+                self.error("Thiếu dấu } kết thúc đối tượng")
+
+            key = self.string(True) if char == '"' or char == "'" else self.bare_key()
+            if self.peek() != ':':
+                self.error(f"Thiếu dấu : sau khóa {key}")
+            self.pos += 1
+            wanted = keep and (schema is None or key in schema)
+            value = self.value(schema[key] if wanted and schema is not None else None, wanted)
+            if wanted:
+                result[key] = value
+            self.separator('}')
+
+    def array(self, schema, keep):
+        self.pos += 1
+        result = [] if keep else None
+        while True:
+            char = self.peek()
+            if char == ']':
+                self.pos += 1
+                return result
+            if not char:
+                self.error("Thiếu dấu ] kết thúc mảng")
+            value = self.value(schema, keep)
+            if keep:
+                result.append(value)
+            self.separator(']')
+
+    def separator(self, closing):
+        char = self.peek()
+        if char == ',':
+            self.pos += 1
+        elif char != closing:
+            self.error(f"Thiếu dấu , hoặc {closing}")
+
+    def string(self, keep):
+        quote = self.text[self.pos]
+        start = self.pos + 1
+        end = self.text.find(quote, start)
+        if end == -1:
+            self.error("Chuỗi chưa được đóng")
+        if self.text.find('\\', start, end) == -1:
+            self.pos = end + 1
+            return self.text[start:end] if keep else None
+
+        chars = []
+        self.pos = start
+        while self.pos < self.end:
+            char = self.text[self.pos]
+            if char == quote:
+                self.pos += 1
+                return ''.join(chars) if keep else None
+            if char == '\\':
+                chars.append(self.escape())
+            else:
+                chars.append(char)
+                self.pos += 1
+        self.error("Chuỗi chưa được đóng")
+
+    def escape(self):
+        code = self.text[self.pos + 1:self.pos + 2]
+        if code != 'u':
+            self.pos += 2
+            return ESCAPES.get(code, code)
+        try:
+            value = int(self.text[self.pos + 2:self.pos + 6], 16)
+        except ValueError:
+            self.error("Mã \\u không hợp lệ")
+        self.pos += 6
+        if 0xD800 <= value < 0xDC00 and self.text[self.pos:self.pos + 2] == '\\u':
+            try:
+                low = int(self.text[self.pos + 2:self.pos + 6], 16)
+            except ValueError:
+                low = 0
+            if 0xDC00 <= low < 0xE000:
+                self.pos += 6
+                value = 0x10000 + ((value - 0xD800) << 10) + (low - 0xDC00)
+        return chr(value)
+
+    def bare_key(self):
+        match = BARE_KEY.match(self.text, self.pos)
+        if match.end() == self.pos:
+            self.error("Thiếu khóa của trường")
+        self.pos = match.end()
+        return match.group()
+
+    def bare(self, keep):
+        match = BARE_VALUE.match(self.text, self.pos)
+        token = match.group()
+        if not token:
+            self.error("Thiếu giá trị JSON")
+        if token in LITERALS:
+            self.pos = match.end()
+            return LITERALS[token] if keep else None
+        number = NUMBER.match(token)
+        if number is None:
+            self.error(f"Giá trị không hợp lệ: {token}")
+        self.pos = match.end()
+        if not keep:
+            return None
+        return int(token) if number.group(1) is None and number.group(2) is None else float(token)
+
+def decode_lenient(text, schema=RECORD_SCHEMA):
+    return LenientDecoder(text).decode(schema)
+
+def require_object(value, text):
+    if not isinstance(value, dict):
+        raise json.JSONDecodeError("Bản ghi JSON phải là một đối tượng", text, 0)
+    return value
+
+def decode_record(text):
+    try:
+        record = loads(text)
+    except json.JSONDecodeError:
+        record = decode_lenient(text)
+    return require_object(record, text)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Hướng dẫn sử dụng: python lenient_json.py <tệp_bản_ghi_json>")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        print(json.dumps(decode_record(f.read()), ensure_ascii=False, indent=2))
@@ -1,11 +1,48 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 from sklearn.neighbors import LocalOutlierFactor
 import warnings
 warnings.filterwarnings('ignore')
 
+from risk_report import build_risk_report
+from rules import frame_event_ids, frame_features, get_rule_book
+from run_record import SAMPLE_FIELDS
+from trajectory import TRAJECTORY_FEATURES, record_trajectory
+
+RECORD_FIELD_COLUMNS = {
+    'id': 'Id',
+    'user.id': 'UserId',
+    'steps': 'TotalSteps',
+    'distance': 'TotalDistance',
+    'timeTaken': 'TimeTaken',
+    'avgSpeed': 'AvgSpeed',
+    'endTime': 'Timestamp',
+    'startTime': 'StartTime',
+    'heartRate': 'heartRate',
+    'eventId': 'EventId'
+}
+
+def load_marathon_data(path):
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    return records_to_marathon_data(pd.read_json(path, lines=not path.endswith('.json')))
+
+def records_to_marathon_data(records):
+    records_df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    if 'user' in records_df.columns:
+        records_df['user.id'] = records_df['user'].map(lambda user: user.get('id') if isinstance(user, dict) else None)
+    marathon_df = records_df[[col for col in RECORD_FIELD_COLUMNS if col in records_df.columns]].rename(columns=RECORD_FIELD_COLUMNS)
+    for col in ['TotalSteps', 'TotalDistance', 'TimeTaken', 'AvgSpeed', 'heartRate']:
+        if col in marathon_df.columns:
+            marathon_df[col] = pd.to_numeric(marathon_df[col], errors='coerce')
+
+    sample_fields = [field for field in SAMPLE_FIELDS if field in records_df.columns]
+    if sample_fields:
+        trajectories = [record_trajectory(record) or {} for record in records_df[sample_fields].to_dict('records')]
+        marathon_df = marathon_df.join(pd.DataFrame(trajectories, index=marathon_df.index, columns=TRAJECTORY_FEATURES))
+    return marathon_df
+
 def prepare_marathon_data(marathon_df):
 
     if all(col in marathon_df.columns for col in ['TotalDistance', 'TotalSteps']):
@@ -42,51 +79,88 @@ def prepare_marathon_data(marathon_df):
         if 'heartRate' in marathon_df.columns:
             marathon_df['heartRate'] = np.nan
 
-    return marathon_df.copy()
+    return marathon_df
+
+def grouped_correlation(df, user_id_col, x_col, y_col):
+    valid = df[x_col].notna() & df[y_col].notna()
+    pairs = df.loc[valid, [user_id_col, x_col, y_col]]
+    grouped = pairs.groupby(user_id_col, sort=False)
+    x_centered = pairs[x_col] - grouped[x_col].transform('mean')
+    y_centered = pairs[y_col] - grouped[y_col].transform('mean')
+
+    sums = pd.DataFrame({
+        'xy': x_centered * y_centered,
+        'xx': x_centered * x_centered,
+        'yy': y_centered * y_centered,
+        user_id_col: pairs[user_id_col]
+    }).groupby(user_id_col, sort=False).sum()
+    divisor = np.sqrt(sums['xx'] * sums['yy'])
+    correlation = (sums['xy'] / divisor).where(divisor != 0)
+    return correlation, grouped.size()
 
 def analyze_per_user(df):
     user_stats = {}
     user_id_col = 'UserId' if 'UserId' in df.columns else 'Id'
-    user_ids = df[user_id_col].unique()
-
-    for user_id in user_ids:
-        user_data = df[df[user_id_col] == user_id]
-        if len(user_data) >= 2:
-            user_stats[user_id] = {}
-            for col in ['TotalSteps', 'TotalDistance', 'AvgSpeed', 'DistancePerStep']:
-                if col in user_data.columns:
-                    user_stats[user_id][f'avg_{col.lower()}'] = user_data[col].mean()
-                    user_stats[user_id][f'std_{col.lower()}'] = user_data[col].std()
-            if 'heartRate' in user_data.columns and user_data['heartRate'].notna().any():
-                valid_heart_rates = user_data['heartRate'][user_data['heartRate'].notna()]
-                user_stats[user_id]['avg_heartrate'] = valid_heart_rates.mean()
-                user_stats[user_id]['std_heartrate'] = valid_heart_rates.std()
-            user_stats[user_id]['record_count'] = len(user_data)
-
-            if len(user_data) >= 5:
-                correlations = user_data[['TotalSteps', 'TotalDistance', 'AvgSpeed', 'TimeTaken']].corr()['TotalSteps'].drop('TotalSteps')
-                user_stats[user_id]['step_correlations'] = correlations.to_dict()
-                if 'heartRate' in user_data.columns and user_data['heartRate'].notna().any():
-                    valid_data = user_data[['TotalSteps', 'heartRate']].dropna()
-                    if len(valid_data) >= 2:
-                        heart_rate_corr = valid_data.corr().iloc[0, 1]
-                        user_stats[user_id]['step_heart_rate_correlation'] = heart_rate_corr
-
+    grouped = df.groupby(user_id_col, sort=False)
+    record_counts = grouped.size()
+    user_ids = record_counts.index[record_counts >= 2]
+
+    summary = {}
+    for col in ['TotalSteps', 'TotalDistance', 'AvgSpeed', 'DistancePerStep']:
+        if col in df.columns:
+            summary[f'avg_{col.lower()}'] = grouped[col].mean()
+            summary[f'std_{col.lower()}'] = grouped[col].std()
+
+    has_heart_rate = 'heartRate' in df.columns
+    if has_heart_rate:
+        heart_rate_counts = grouped['heartRate'].count()
+        summary['avg_heartrate'] = grouped['heartRate'].mean()
+        summary['std_heartrate'] = grouped['heartRate'].std()
+
+    correlated_user_ids = set(record_counts.index[record_counts >= 5])
+    step_correlations = {}
+    if correlated_user_ids:
+        for col in ['TotalDistance', 'AvgSpeed', 'TimeTaken']:
+            step_correlations[col] = grouped_correlation(df, user_id_col, 'TotalSteps', col)[0]
+        if has_heart_rate:
+            heart_rate_correlation, heart_rate_pairs = grouped_correlation(df, user_id_col, 'TotalSteps', 'heartRate')
+
+    summary = pd.DataFrame(summary).reindex(user_ids)
+    for user_id, stats in zip(user_ids, summary.to_dict('records')):
+        if not has_heart_rate or heart_rate_counts[user_id] == 0:
+            stats.pop('avg_heartrate', None)
+            stats.pop('std_heartrate', None)
+        stats['record_count'] = int(record_counts[user_id])
+
+        if user_id in correlated_user_ids:
+            stats['step_correlations'] = {
+                col: correlations.get(user_id, np.nan) for col, correlations in step_correlations.items()
+            }
+            if has_heart_rate and heart_rate_counts[user_id] > 0 and heart_rate_pairs.get(user_id, 0) >= 2:
+                stats['step_heart_rate_correlation'] = heart_rate_correlation[user_id]
+
+        user_stats[user_id] = stats
+
+    return add_deviation_columns(df, user_stats), user_stats
+
+def add_deviation_columns(df, user_stats):
+    user_id_col = 'UserId' if 'UserId' in df.columns else 'Id'
     for col, prefix in zip(
             ['TotalSteps', 'AvgSpeed', 'DistancePerStep', 'heartRate'],
             ['StepDeviation', 'SpeedDeviation', 'DistPerStepDeviation', 'HeartRateDeviation']
     ):
         if col in df.columns and (col != 'heartRate' or df['heartRate'].notna().any()):
-            df[prefix] = np.nan
-            for user_id, stats in user_stats.items():
-                user_indices = df[df[user_id_col] == user_id].index
-                if len(user_indices) > 0 and f'avg_{col.lower()}' in stats and f'std_{col.lower()}' in stats:
-                    valid_rows = user_indices if col != 'heartRate' else user_indices[df.loc[user_indices, 'heartRate'].notna()]
-                    df.loc[valid_rows, prefix] = (
-                                                         df.loc[valid_rows, col] - stats[f'avg_{col.lower()}']
-                                                 ) / (stats[f'std_{col.lower()}'] + 1e-6)
+            avg_key, std_key = f'avg_{col.lower()}', f'std_{col.lower()}'
+            user_means = pd.Series({
+                user_id: stats[avg_key] for user_id, stats in user_stats.items() if avg_key in stats and std_key in stats
+            }, dtype=float)
+            user_stds = pd.Series({
+                user_id: stats[std_key] for user_id, stats in user_stats.items() if avg_key in stats and std_key in stats
+            }, dtype=float)
+            user_ids = df[user_id_col]
+            df[prefix] = (df[col] - user_ids.map(user_means)) / (user_ids.map(user_stds) + 1e-6)
 
-    return df, user_stats
+    return df
 
 def extract_features(df):
     available_basic_features = [col for col in [
@@ -99,6 +173,7 @@ def extract_features(df):
         heart_rate_features = [col for col in ['heartRate', 'HeartRatePerStep', 'HeartRatePerSpeed'] if col in df.columns]
 
     available_advanced_features = [col for col in ['Weekend', 'DayOfWeek'] if col in df.columns]
+    trajectory_features = [col for col in TRAJECTORY_FEATURES if col in df.columns and df[col].notna().all()]
     available_user_features = [col for col in [
         'StepDeviation', 'SpeedDeviation', 'DistPerStepDeviation'
     ] if col in df.columns]
@@ -106,18 +181,29 @@ def extract_features(df):
         if 'HeartRateDeviation' in df.columns:
             available_user_features.append('HeartRateDeviation')
 
-    all_available_features = available_basic_features + heart_rate_features + available_advanced_features + available_user_features
+    all_available_features = (available_basic_features + heart_rate_features + available_advanced_features +
+                              trajectory_features + available_user_features)
 
     if not all_available_features:
         raise ValueError("Không có đặc trưng nào khả dụng để phân tích")
 
-    features = df[all_available_features].copy()
-    features = features.fillna(0)
+    return scale_features(feature_matrix(df, all_available_features)), all_available_features
 
-    scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(features)
+def feature_matrix(df, columns):
+    matrix = np.zeros((len(df), len(columns)), dtype=np.float32)
+    for index, col in enumerate(columns):
+        if col in df.columns:
+            matrix[:, index] = df[col].to_numpy(dtype=float, na_value=np.nan)
+    matrix[np.isnan(matrix)] = 0
+    return matrix
 
-    return features_scaled, features
+def scale_features(matrix):
+    mean = matrix.mean(axis=0, dtype=np.float64)
+    matrix -= mean.astype(np.float32)
+    scale = np.sqrt(np.einsum('ij,ij->j', matrix, matrix, dtype=np.float64) / max(len(matrix), 1))
+    scale[scale == 0] = 1.0
+    matrix /= scale.astype(np.float32)
+    return matrix
 
 def detect_anomalies_isolation_forest(features_scaled, contamination=0.05):
     model = IsolationForest(contamination=contamination, random_state=42, n_estimators=100)
@@ -134,140 +220,39 @@ def detect_anomalies_lof(features_scaled, contamination=0.05):
     lof_scores = -lof.negative_outlier_factor_
     return fraud_predictions, lof_scores
 
-def detailed_fraud_analysis(df):
-    fraud_cases = df[df['IsFraud'] == 1]
-    print(f"\n=== Phân tích chi tiết {len(fraud_cases)} trường hợp gian lận ===")
-
-    if len(fraud_cases) == 0:
-        print("Không có trường hợp gian lận được phát hiện.")
-        return df
-
-    df['FraudType'] = "Unknown"
-
-    vehicle_fraud_mask = pd.Series(False, index=df.index)
-    if 'AvgSpeed' in df.columns:
-        vehicle_fraud_mask = (df['AvgSpeed'] > 12) & (df['IsFraud'] == 1)
-        df.loc[vehicle_fraud_mask, 'FraudType'] = "Sử dụng phương tiện"
-
-    shortcut_fraud_mask = pd.Series(False, index=df.index)
-    if all(x in df.columns for x in ['SpeedDeviation', 'DistPerStepDeviation']):
-        shortcut_fraud_mask = (df['SpeedDeviation'] > 2) & (df['DistPerStepDeviation'] > 2) & (df['IsFraud'] == 1)
-        df.loc[shortcut_fraud_mask & ~vehicle_fraud_mask, 'FraudType'] = "Đi tắt đường"
-
-    step_fraud_mask = pd.Series(False, index=df.index)
-    if 'DistancePerStep' in df.columns:
-        step_fraud_mask = (df['DistancePerStep'] > 0.001) & (df['IsFraud'] == 1) & (~vehicle_fraud_mask)
-        if 'DistPerStepDeviation' in df.columns:
-            step_fraud_mask = step_fraud_mask & (df['DistPerStepDeviation'] > 2)
-        df.loc[step_fraud_mask & ~shortcut_fraud_mask & ~vehicle_fraud_mask, 'FraudType'] = "Khai báo sai số bước"
-
-    heart_rate_fraud_mask = pd.Series(False, index=df.index)
-    if 'heartRate' in df.columns and df['heartRate'].notna().any():
-        heart_rate_fraud_mask = (df['heartRate'] < 60) & (df['TotalSteps'] > 10000) & (df['IsFraud'] == 1)
-        df.loc[heart_rate_fraud_mask & ~step_fraud_mask & ~shortcut_fraud_mask & ~vehicle_fraud_mask, 'FraudType'] = "Nhịp tim bất thường"
-
-    correlation_fraud_mask = pd.Series(False, index=df.index)
+def steps_distance_correlation(df):
     if all(x in df.columns for x in ['TotalSteps', 'TotalDistance']):
-        correlations = df[['TotalSteps', 'TotalDistance']].corr().iloc[0, 1]
-        if correlations < 0.5:
-            correlation_fraud_mask = (df['IsFraud'] == 1) & (~heart_rate_fraud_mask) & (~step_fraud_mask) & (~shortcut_fraud_mask) & (~vehicle_fraud_mask)
-            df.loc[correlation_fraud_mask, 'FraudType'] = "Tương quan bất thường"
-
-    unknown_fraud_mask = (df['IsFraud'] == 1) & (df['FraudType'] == "Unknown")
-    df.loc[unknown_fraud_mask, 'FraudType'] = "Dữ liệu bất thường"
+        return df[['TotalSteps', 'TotalDistance']].corr().iloc[0, 1]
+    return None
+
+def classify_fraud_types(df, correlations=None):
+    if correlations is None:
+        correlations = steps_distance_correlation(df)
+
+    rule_book = get_rule_book()
+    features = frame_features(df, rule_book.rule_set('fraud_types').features())
+    features['steps_distance_correlation'] = correlations
+    _, _, fraud_types, _ = rule_book.evaluate('fraud_types', features, len(df), frame_event_ids(df), notes=False)
+    df['FraudType'] = np.where(df['IsFraud'] == 1, fraud_types, "Unknown")
+    return df
 
-    fraud_type_counts = df[df['IsFraud'] == 1]['FraudType'].value_counts()
-    print("\nPhân loại các trường hợp gian lận:")
-    for fraud_type, count in fraud_type_counts.items():
-        print(f"- {fraud_type}: {count} trường hợp")
+def detailed_fraud_analysis(df, risk_config=None):
+    is_fraud = df['IsFraud'] == 1
+    if is_fraud.any():
+        classify_fraud_types(df)
 
     user_id_col = 'UserId' if 'UserId' in df.columns else 'Id'
-    fraud_users = df[df['IsFraud'] == 1][user_id_col].unique()
-    print(f"\nSố người dùng có dấu hiệu gian lận: {len(fraud_users)}")
-
-    for user_id in fraud_users:
-        user_fraud = df[(df[user_id_col] == user_id) & (df['IsFraud'] == 1)]
-        fraud_types = user_fraud['FraudType'].value_counts()
-        print(f"\nNgười dùng {user_id}:")
-        print(f"- Tổng số hoạt động: {len(df[df[user_id_col] == user_id])}")
-        print(f"- Số hoạt động gian lận: {len(user_fraud)} ({len(user_fraud)/len(df[df[user_id_col] == user_id])*100:.1f}%)")
-        for fraud_type, count in fraud_types.items():
-            print(f"  + {fraud_type}: {count} trường hợp")
-        print("- Thông số trung bình trong các hoạt động gian lận:")
-        for col, format_str in [
-            ('AvgSpeed', "  + Tốc độ: {:.2f} km/h"),
-            ('DistancePerStep', "  + Khoảng cách/bước: {:.5f} km"),
-            ('TotalSteps', "  + Số bước: {:.0f}"),
-            ('TotalDistance', "  + Quãng đường: {:.2f} km"),
-            ('heartRate', "  + Nhịp tim: {:.1f} bpm")
-        ]:
-            if col in user_fraud.columns and (col != 'heartRate' or user_fraud['heartRate'].notna().any()):
-                print(format_str.format(user_fraud[col][user_fraud[col].notna()].mean()))
-
+    report = build_risk_report(df, risk_config)
+    print("\n".join(report.detail_lines(df.loc[is_fraud, user_id_col].unique())))
     return df
 
-def generate_final_report(df, fraud_cases):
-    total_records = len(df)
-    user_id_col = 'UserId' if 'UserId' in df.columns else 'Id'
-    total_users = len(df[user_id_col].unique())
-    fraud_records = len(fraud_cases)
-    fraud_users = len(fraud_cases[user_id_col].unique()) if fraud_records > 0 else 0
-
-    print("\n=== BÁO CÁO PHÁT HIỆN GIAN LẬN ===")
-    print(f"Tổng số bản ghi phân tích: {total_records}")
-    print(f"Tổng số người dùng: {total_users}")
-    print(f"Số bản ghi gian lận: {fraud_records} ({fraud_records/total_records*100:.2f}%)")
-    print(f"Số người dùng gian lận: {fraud_users} ({fraud_users/total_users*100:.2f}%)")
-
-    if fraud_records > 0:
-        print("\nThống kê theo loại gian lận:")
-        fraud_types = fraud_cases['FraudType'].value_counts()
-        for fraud_type, count in fraud_types.items():
-            print(f"- {fraud_type}: {count} trường hợp ({count/fraud_records*100:.2f}%)")
-
-    user_risk_scores = {}
-    for user_id in df[user_id_col].unique():
-        user_data = df[df[user_id_col] == user_id]
-        fraud_data = user_data[user_data['IsFraud'] == 1]
-        fraud_ratio = len(fraud_data) / len(user_data) if len(user_data) > 0 else 0
-
-        fraud_weights = {
-            "Sử dụng phương tiện": 1.0,
-            "Đi tắt đường": 0.8,
-            "Khai báo sai số bước": 0.6,
-            "Nhịp tim bất thường": 0.7,
-            "Tương quan bất thường": 0.5,
-            "Dữ liệu bất thường": 0.4
-        }
-
-        risk_score = fraud_ratio * 100
-        if len(fraud_data) > 0:
-            fraud_type_counts = fraud_data['FraudType'].value_counts()
-            if len(fraud_type_counts) > 0:
-                worst_fraud_type = fraud_type_counts.index[0]
-                worst_fraud_weight = fraud_weights.get(worst_fraud_type, 0.5)
-                risk_score = risk_score * (1 + worst_fraud_weight)
-        risk_score = min(100, max(0, risk_score))
-
-        risk_level = "Thấp"
-        if risk_score >= 70:
-            risk_level = "Cao"
-        elif risk_score >= 40:
-            risk_level = "Trung bình"
-
-        user_risk_scores[user_id] = {
-            "risk_score": risk_score,
-            "risk_level": risk_level,
-            "fraud_count": len(fraud_data),
-            "total_activities": len(user_data),
-            "fraud_ratio": fraud_ratio
-        }
-
-    print("\nBáo cáo rủi ro theo người dùng:")
-    for user_id, risk_data in user_risk_scores.items():
-        if risk_data['fraud_count'] > 0:
-            print(f"- Người dùng {user_id}:")
-            print(f"  + Điểm rủi ro: {risk_data['risk_score']:.1f}/100 (Mức: {risk_data['risk_level']})")
-            print(f"  + Số hoạt động gian lận: {risk_data['fraud_count']}/{risk_data['total_activities']} ({risk_data['fraud_ratio']*100:.1f}%)")
-
-    return user_risk_scores
\ No newline at end of file
+def compute_user_risk_scores(df, risk_config=None):
+    return build_risk_report(df, risk_config).user_risk_scores()
+
+def generate_final_report(df, fraud_cases=None, *, risk_config=None):
+    if fraud_cases is not None:
+        df = df.assign(IsFraud=df.index.isin(fraud_cases.index).astype(int),
+                       FraudType=fraud_cases['FraudType'].reindex(df.index))
+    report = build_risk_report(df, risk_config)
+    print("\n".join(report.summary_lines()))
+    return report.user_risk_scores()
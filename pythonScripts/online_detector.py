@@ -0,0 +1,310 @@
+import json
+import math
+import sys
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from run_record import RunRecord, DEFAULT_EVENT_ID, basic_conditions_ok, is_missing, record_event_id, safe_get
+
+ONLINE_FEATURES = ['TotalSteps', 'TotalDistance', 'TimeTaken', 'AvgSpeed', 'DistancePerStep', 'Cadence', 'heartRate']
+
+def scaled_features(run):
+    steps, distance, time_taken = run.steps, run.distance, run.time_taken
+    distance_per_step = distance * 1000 / steps if steps > 0 else 0.0
+    cadence = steps / time_taken if time_taken > 0 else 0.0
+    heart_rate = 0.0 if is_missing(run.heart_rate) else (run.heart_rate - 40) / 180
+    features = np.array([
+        math.log1p(max(steps, 0)) / math.log1p(100000),
+        math.log1p(max(distance, 0)) / math.log1p(100),
+        math.log1p(max(time_taken, 0)) / math.log1p(1440),
+        run.avg_speed / 25,
+        distance_per_step / 2.0,
+        cadence / 300,
+        heart_rate
+    ])
+    return np.clip(features, 0.0, 1.0)
+
+class HalfSpaceTrees:
+    def __init__(self, n_features, n_trees=25, height=8, window_size=100, contamination=0.1, seed=42):
+        rng = np.random.default_rng(seed)
+        self.n_trees = n_trees
+        self.height = height
+        self.window_size = window_size
+        self.contamination = contamination
+        self.size_limit = 0.1 * window_size
+
+        n_internal = 2 ** height - 1
+        n_nodes = 2 ** (height + 1) - 1
+        self.split_features = np.zeros((n_trees, n_internal), dtype=np.int64)
+        self.split_values = np.zeros((n_trees, n_internal))
+        for tree in range(n_trees):
+            pivot = rng.random(n_features)
+            spread = 2 * np.maximum(pivot, 1 - pivot)
+            lower, upper = pivot - spread, pivot + spread
+            self.build_tree(tree, 0, lower, upper, rng)
+
+        self.reference_mass = np.zeros((n_trees, n_nodes))
+        self.latest_mass = np.zeros((n_trees, n_nodes))
+        self.tree_index = np.arange(n_trees)[:, None]
+        self.depth_weights = 2.0 ** np.arange(height + 1)
+        self.max_score = n_trees * window_size * 2.0 ** height
+        self.observed = 0
+        self.recent_scores = deque(maxlen=window_size)
+
+    def build_tree(self, tree, node, lower, upper, rng):
+        if node >= self.split_features.shape[1]:
+            return
+        feature = rng.integers(len(lower))
+        split = (lower[feature] + upper[feature]) / 2
+        self.split_features[tree, node] = feature
+        self.split_values[tree, node] = split
+
+        left_upper = upper.copy()
+        left_upper[feature] = split
+        right_lower = lower.copy()
+        right_lower[feature] = split
+        self.build_tree(tree, 2 * node + 1, lower, left_upper, rng)
+        self.build_tree(tree, 2 * node + 2, right_lower, upper, rng)
+
+    def paths(self, x):
+        trees = self.tree_index[:, 0]
+        nodes = np.zeros(self.n_trees, dtype=np.int64)
+        paths = np.empty((self.n_trees, self.height + 1), dtype=np.int64)
+        paths[:, 0] = 0
+        for depth in range(self.height):
+            go_right = x[self.split_features[trees, nodes]] > self.split_values[trees, nodes]
+            nodes = 2 * nodes + 1 + go_right
+            paths[:, depth + 1] = nodes
+        return paths
+
+    @property
+    def ready(self):
+        return self.observed >= self.window_size
+
+    def score(self, paths):
+        masses = self.reference_mass[self.tree_index, paths]
+        terminal = masses < self.size_limit
+        terminal[:, -1] = True
+        depths = terminal.argmax(axis=1)
+        mass_score = (masses[np.arange(self.n_trees), depths] * self.depth_weights[depths]).sum()
+        return 1.0 - mass_score / self.max_score
+
+    def score_point(self, x):
+        if not self.ready:
+            return None, False
+        anomaly_score = self.score(self.paths(x))
+        flagged = len(self.recent_scores) >= 10 and anomaly_score > np.quantile(self.recent_scores, 1 - self.contamination)
+        return anomaly_score, bool(flagged)
+
+    def update(self, x):
+        paths = self.paths(x)
+        if self.ready:
+            self.recent_scores.append(self.score(paths))
+
+        self.latest_mass[self.tree_index, paths] += 1
+        self.observed += 1
+        if self.observed % self.window_size == 0:
+            self.reference_mass = self.latest_mass
+            self.latest_mass = np.zeros_like(self.reference_mass)
+
+    def score_and_update(self, x):
+        result = self.score_point(x)
+        self.update(x)
+        return result
+
+def window_local_outlier_factor(points, n_neighbors):
+    n_points = len(points)
+    n_neighbors = min(n_neighbors, n_points - 1)
+    distances = np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=-1))
+    np.fill_diagonal(distances, np.inf)
+    neighbors = np.argsort(distances, axis=1)[:, :n_neighbors]
+    k_distance = distances[np.arange(n_points), neighbors[:, -1]]
+    reach_distance = np.maximum(distances[np.arange(n_points)[:, None], neighbors], k_distance[neighbors])
+    local_density = 1.0 / (reach_distance.mean(axis=1) + 1e-10)
+    return local_density[neighbors].mean(axis=1) / local_density
+
+class UserWindow:
+    __slots__ = ('runs', 'features')
+
+    def __init__(self, size):
+        self.runs = deque(maxlen=size)
+        self.features = deque(maxlen=size)
+
+def window_deviation(values, value):
+    if len(values) < 2 or is_missing(value):
+        return float('nan')
+    values = np.asarray(values, dtype=float)
+    return (value - values.mean()) / (values.std(ddof=1) + 1e-6)
+
+class OnlineAnomalyDetector:
+    def __init__(self, user_window=50, event_window=100, n_trees=25, height=8, n_neighbors=20,
+                 contamination=0.1, max_users=100000, seed=42):
+        self.user_window = user_window
+        self.event_window = event_window
+        self.n_trees = n_trees
+        self.height = height
+        self.n_neighbors = n_neighbors
+        self.contamination = contamination
+        self.max_users = max_users
+        self.seed = seed
+        self.users = OrderedDict()
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def event_detector(self, event_id):
+        detector = self.events.get(event_id)
+        if detector is None:
+            detector = self.events[event_id] = HalfSpaceTrees(
+                len(ONLINE_FEATURES), self.n_trees, self.height, self.event_window, self.contamination, self.seed)
+        return detector
+
+    def user_state(self, user_id):
+        window = self.users.get(user_id)
+        if window is None:
+            window = self.users[user_id] = UserWindow(self.user_window)
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        else:
+            self.users.move_to_end(user_id)
+        return window
+
+    def user_scores(self, features):
+        if len(features) < 5:
+            return None, False
+        points = np.asarray(features)
+        spread = points.std(axis=0)
+        points = (points - points.mean(axis=0)) / np.where(spread > 0, spread, 1.0)
+        lof = window_local_outlier_factor(points, self.n_neighbors)
+        return float(lof[-1]), bool(lof[-1] > np.percentile(lof, 100 * (1 - self.contamination)))
+
+    def score(self, run, event_id=DEFAULT_EVENT_ID):
+        with self.lock:
+            return self.score_locked(run, event_id)
+
+    def update(self, run, event_id=DEFAULT_EVENT_ID):
+        with self.lock:
+            self.update_locked(run, event_id)
+
+    def observe(self, run, event_id=DEFAULT_EVENT_ID):
+        with self.lock:
+            observation = self.score_locked(run, event_id)
+            self.update_locked(run, event_id)
+            return observation
+
+    def update_locked(self, run, event_id):
+        x = scaled_features(run)
+        self.event_detector(event_id).update(x)
+        window = self.user_state(run.user_id)
+        window.runs.append(run)
+        window.features.append(x)
+
+    def score_locked(self, run, event_id):
+        x = scaled_features(run)
+        detector = self.events.get(event_id)
+        event_score, event_flagged = (None, False) if detector is None else detector.score_point(x)
+
+        window = self.users.get(run.user_id)
+        runs, features = ([], []) if window is None else (list(window.runs), list(window.features))
+        history_count = len(runs)
+        if len(runs) >= self.user_window:
+            runs, features = runs[1:], features[1:]
+        runs.append(run)
+        features.append(x)
+        user_score, user_flagged = self.user_scores(features)
+
+        steps = [r.steps for r in runs]
+        distance_per_step = [r.distance / r.steps if r.steps > 0 else 0.0 for r in runs]
+        heart_rates = [r.heart_rate for r in runs if not is_missing(r.heart_rate)]
+        deviations = {
+            'StepDeviation': window_deviation(steps, run.steps),
+            'SpeedDeviation': window_deviation([r.avg_speed for r in runs], run.avg_speed),
+            'DistPerStepDeviation': window_deviation(distance_per_step, distance_per_step[-1]),
+            'HeartRateDeviation': window_deviation(heart_rates, run.heart_rate)
+        }
+
+        step_distance_correlation = 1.0
+        if len(runs) >= 5:
+            distances = [r.distance for r in runs]
+            if np.std(steps) > 0 and np.std(distances) > 0:
+                step_distance_correlation = float(np.corrcoef(steps, distances)[0, 1])
+
+        return {
+            'history_count': history_count,
+            'deviations': deviations,
+            'step_distance_correlation': step_distance_correlation,
+            'event_score': event_score,
+            'event_flagged': event_flagged,
+            'user_score': user_score,
+            'user_flagged': user_flagged
+        }
+
+def batch_flags(runs):
+    import pandas as pd
+    from module import prepare_marathon_data, analyze_per_user, extract_features, detect_anomalies_isolation_forest, detect_anomalies_lof
+    analysis_df, _ = analyze_per_user(prepare_marathon_data(pd.DataFrame([r.to_row() for r in runs])))
+    features_scaled, _ = extract_features(analysis_df)
+    if len(features_scaled) < 5:
+        return False, False
+    if_predictions, _ = detect_anomalies_isolation_forest(features_scaled, contamination=0.1)
+    lof_predictions, _ = detect_anomalies_lof(features_scaled, contamination=0.1)
+    return bool(if_predictions[-1]), bool(lof_predictions[-1])
+
+def detection_summary(flags, labels):
+    flags = np.asarray(flags, dtype=bool)
+    summary = {'flag_rate': float(flags.mean()) if len(flags) else 0.0}
+    if labels is not None:
+        labels = np.asarray(labels, dtype=bool)
+        true_positive = int((flags & labels).sum())
+        summary['precision'] = true_positive / flags.sum() if flags.sum() else 0.0
+        summary['recall'] = true_positive / labels.sum() if labels.sum() else 0.0
+    return summary
+
+def replay(records, detector=None, compare_batch=False):
+    import time
+    detector = detector or OnlineAnomalyDetector()
+    records = sorted(records, key=lambda record: str(safe_get(record, 'endTime', '')))
+    has_labels = all(isinstance(safe_get(record, 'label'), dict) for record in records)
+
+    online_flags, batch_flag_values, labels, latencies = [], [], [], []
+    for record in records:
+        run = RunRecord.from_dict(record)
+        if not basic_conditions_ok(run):
+            continue
+        start = time.perf_counter()
+        observation = detector.observe(run, record_event_id(record))
+        latencies.append(time.perf_counter() - start)
+
+        online_flags.append(observation['event_flagged'] or observation['user_flagged'])
+        if has_labels:
+            labels.append(bool(record['label'].get('isFraud')))
+        if compare_batch:
+            window = list(detector.users[run.user_id].runs)
+            batch_flag_values.append(any(batch_flags(window)))
+
+    report = {
+        'records': len(online_flags),
+        'mean_latency_us': float(np.mean(latencies) * 1e6) if latencies else 0.0,
+        'p99_latency_us': float(np.percentile(latencies, 99) * 1e6) if latencies else 0.0,
+        'online': detection_summary(online_flags, labels if has_labels else None)
+    }
+    if compare_batch:
+        report['batch'] = detection_summary(batch_flag_values, labels if has_labels else None)
+        report['agreement'] = float(np.mean(np.asarray(online_flags) == np.asarray(batch_flag_values))) if online_flags else 0.0
+    return report
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 1:
+        print("Hướng dẫn sử dụng: python online_detector.py <tệp_jsonl_bản_ghi> [--compare-batch] [--user-window <số_bản_ghi>] [--event-window <số_bản_ghi>]")
+        sys.exit(1)
+
+    compare_batch = '--compare-batch' in args
+    user_window = int(args[args.index('--user-window') + 1]) if '--user-window' in args else 50
+    event_window = int(args[args.index('--event-window') + 1]) if '--event-window' in args else 100
+
+    with open(args[0], 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    report = replay(records, OnlineAnomalyDetector(user_window=user_window, event_window=event_window), compare_batch)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
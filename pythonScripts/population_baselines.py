@@ -0,0 +1,174 @@
+import json
+import math
+import sys
+from bisect import bisect_right
+
+from rules import spec_digest
+
+BASELINE_METRICS = ['speed', 'distance_per_step', 'steps_per_minute', 'heart_rate_per_speed']
+PERCENTILES = ([round(0.1 * step, 1) for step in range(10)] + list(range(1, 99)) +
+               [round(99 + 0.1 * step, 1) for step in range(11)])
+COHORT_DISTANCES = [7.5, 15.0, 30.0]
+COHORT_LABELS = ['5k', '10k', 'half', 'full']
+ALL_COHORT = 'all'
+MIN_COHORT_RECORDS = 200
+
+_baselines = None
+
+def baseline_metrics(features):
+    speed, heart_rate = features['speed'], features['heart_rate']
+    if isinstance(speed, (int, float)):
+        heart_rate_per_speed = heart_rate / speed if speed > 0 else math.nan
+    else:
+        import numpy as np
+        with np.errstate(divide='ignore', invalid='ignore'):
+            heart_rate_per_speed = np.where(speed > 0, heart_rate / speed, np.nan)
+    return {
+        'speed': speed,
+        'distance_per_step': features['distance_per_step'],
+        'steps_per_minute': features['steps_per_minute'],
+        'heart_rate_per_speed': heart_rate_per_speed
+    }
+
+def percentile_rank(table, percentiles, value):
+    if value != value:
+        return math.nan
+    position = bisect_right(table, value)
+    if position == 0:
+        return percentiles[0]
+    if position == len(table):
+        return percentiles[-1]
+    lower, upper = table[position - 1], table[position]
+    return percentiles[position - 1] + (value - lower) / (upper - lower) * (percentiles[position] - percentiles[position - 1])
+
+def percentile_ranks(table, percentiles, values):
+    import numpy as np
+    table = np.asarray(table)
+    percentiles = np.asarray(percentiles, dtype=float)
+    positions = np.searchsorted(table, values, side='right')
+    inner = np.clip(positions, 1, len(table) - 1)
+    lower, upper = table[inner - 1], table[inner]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ranks = percentiles[inner - 1] + (values - lower) / (upper - lower) * (percentiles[inner] - percentiles[inner - 1])
+    ranks = np.where(positions == 0, percentiles[0], np.where(positions == len(table), percentiles[-1], ranks))
+    return np.where(np.isnan(values), np.nan, ranks)
+
+class PopulationBaselines:
+    def __init__(self, spec):
+        self.percentiles = spec.get('percentiles', PERCENTILES)
+        self.cohort_distances = spec.get('cohortDistances', COHORT_DISTANCES)
+        self.cohort_labels = spec.get('cohortLabels', COHORT_LABELS)
+        self.cohorts = spec['cohorts']
+        self.record_count = spec.get('recordCount')
+        self.digest = spec_digest(spec)
+
+    def to_dict(self):
+        return {
+            'percentiles': self.percentiles,
+            'cohortDistances': self.cohort_distances,
+            'cohortLabels': self.cohort_labels,
+            'recordCount': self.record_count,
+            'cohorts': self.cohorts
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    def cohort_label(self, distance):
+        if distance != distance:
+            return self.cohort_labels[0]
+        return self.cohort_labels[bisect_right(self.cohort_distances, distance)]
+
+    def metric_table(self, metric, label, event_id=None):
+        for cohort in (f'{event_id}:{label}', label, ALL_COHORT):
+            table = self.cohorts.get(cohort, {}).get(metric)
+            if table is not None:
+                return table
+        return None
+
+    def percentile_features(self, features, event_id=None):
+        label = self.cohort_label(features['distance'])
+        result = {}
+        for metric, value in baseline_metrics(features).items():
+            table = self.metric_table(metric, label, event_id)
+            result[f'{metric}_percentile'] = math.nan if table is None else percentile_rank(table, self.percentiles, value)
+        return result
+
+    def frame_percentile_features(self, features, event_ids=None):
+        import numpy as np
+        metrics = baseline_metrics(features)
+        size = len(features['distance'])
+        distance = np.asarray(features['distance'], dtype=float)
+        labels = np.asarray(self.cohort_labels, dtype=object)[
+            np.searchsorted(self.cohort_distances, np.nan_to_num(distance, nan=-np.inf), side='right')]
+        if event_ids is None:
+            event_ids = np.full(size, None, dtype=object)
+        cohort_keys = np.asarray([f'{event_id}:{label}' for event_id, label in zip(event_ids, labels)], dtype=object)
+
+        result = {f'{metric}_percentile': np.full(size, np.nan) for metric in metrics}
+        for cohort_key in np.unique(cohort_keys):
+            rows = np.flatnonzero(cohort_keys == cohort_key)
+            event_id, label = cohort_key.rsplit(':', 1)
+            for metric, values in metrics.items():
+                table = self.metric_table(metric, label, event_id)
+                if table is not None:
+                    result[f'{metric}_percentile'][rows] = percentile_ranks(table, self.percentiles, values[rows])
+        return result
+
+def build_baselines(features, event_ids=None, min_records=MIN_COHORT_RECORDS, percentiles=PERCENTILES):
+    import numpy as np
+    metrics = baseline_metrics(features)
+    distance = np.asarray(features['distance'], dtype=float)
+    labels = np.asarray(COHORT_LABELS, dtype=object)[np.searchsorted(COHORT_DISTANCES, distance, side='right')]
+
+    groups = {ALL_COHORT: np.ones(len(distance), dtype=bool)}
+    for label in COHORT_LABELS:
+        groups[label] = labels == label
+    if event_ids is not None:
+        event_ids = np.asarray([str(event_id) for event_id in event_ids], dtype=object)
+        for event_id in np.unique(event_ids):
+            for label in COHORT_LABELS:
+                groups[f'{event_id}:{label}'] = (event_ids == event_id) & (labels == label)
+
+    cohorts = {}
+    for cohort, mask in groups.items():
+        tables = {}
+        for metric, values in metrics.items():
+            values = values[mask]
+            values = values[np.isfinite(values)]
+            if len(values) >= min_records:
+                tables[metric] = [float(value) for value in np.percentile(values, percentiles)]
+        if tables:
+            cohorts[cohort] = tables
+    return PopulationBaselines({'percentiles': list(percentiles), 'cohorts': cohorts, 'recordCount': int(len(distance))})
+
+def load_baselines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return PopulationBaselines(json.load(f))
+
+def configure_baselines(path):
+    global _baselines
+    _baselines = load_baselines(path) if path else None
+    return _baselines
+
+def get_baselines():
+    return _baselines
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print("Hướng dẫn sử dụng: python population_baselines.py <tệp_dữ_liệu_bản_ghi_đã_duyệt> <tệp_bảng_json> [--min-records <số_bản_ghi>]")
+        sys.exit(1)
+
+    from module import load_marathon_data
+    from rules import frame_event_ids, frame_record_features, get_rule_book
+    min_records = int(args[args.index('--min-records') + 1]) if '--min-records' in args else MIN_COHORT_RECORDS
+
+    records_df = load_marathon_data(args[0])
+    features = frame_record_features(records_df)
+    rejected, _, _, _ = get_rule_book().evaluate('basic_conditions', features, len(records_df), notes=False)
+    accepted_df = records_df[~rejected]
+    baselines = build_baselines(frame_record_features(accepted_df), frame_event_ids(accepted_df), min_records)
+    baselines.write(args[1])
+    print(f"Đã xây dựng bảng phân vị cho {len(baselines.cohorts)} nhóm từ {baselines.record_count} bản ghi hợp lệ: {args[1]}")
@@ -0,0 +1,182 @@
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from module import (
+    load_marathon_data, prepare_marathon_data, analyze_per_user, extract_features,
+    detect_anomalies_isolation_forest, detect_anomalies_lof, steps_distance_correlation,
+    classify_fraud_types, compute_user_risk_scores
+)
+from duplicate_index import duplicate_users
+from rules import frame_event_ids, get_rule_book
+from session_index import frame_session_features
+from risk_report import load_risk_config
+
+SHARDS_PER_WORKER = 4
+ACTIVITY_COLUMNS = ['TotalSteps', 'TotalDistance', 'TimeTaken', 'AvgSpeed', 'heartRate', 'Timestamp']
+
+def user_id_column(df):
+    return 'UserId' if 'UserId' in df.columns else 'Id'
+
+def shard_by_user(df, n_shards):
+    user_codes, _ = pd.factorize(df[user_id_column(df)])
+    shard_ids = user_codes % n_shards
+    return [df[shard_ids == shard] for shard in range(n_shards) if (shard_ids == shard).any()]
+
+def load_scan_models(model_dir, version=None):
+    if not model_dir:
+        return None
+    from anomaly_models import load_models
+    return load_models(model_dir, version)
+
+def analyze_shard(shard_df, model_dir=None, version=None):
+    analyzed_df, user_stats = analyze_per_user(shard_df)
+    models = load_scan_models(model_dir, version)
+    if models is not None:
+        analyzed_df = detect_fraud(analyzed_df, models)
+    return analyzed_df, user_stats
+
+def classify_shard(shard_df, correlations, risk_config=None):
+    classified_df = classify_fraud_types(shard_df, correlations)
+    return classified_df[['FraudType']], compute_user_risk_scores(classified_df, risk_config)
+
+def order_by_user(df, values_by_user):
+    first_seen = {user_id: position for position, user_id in enumerate(df[user_id_column(df)].unique())}
+    return dict(sorted(values_by_user.items(), key=lambda item: first_seen.get(item[0], len(first_seen))))
+
+def merge_analyzed_shards(df, results):
+    frames = [frame for frame, _ in results]
+    columns = max((list(frame.columns) for frame in frames), key=len)
+    analyzed_df = pd.concat(frames).reindex(columns=columns).sort_index()
+
+    user_stats = {}
+    for _, shard_stats in results:
+        user_stats.update(shard_stats)
+    return analyzed_df, order_by_user(df, user_stats)
+
+def detect_fraud(df, models=None):
+    if 'IsFraud' in df.columns:
+        return df
+    if models is not None:
+        from anomaly_models import score_records
+        scores = score_records(models, df)
+        df['IsFraud'] = np.maximum(scores['if_predictions'], scores['lof_predictions'])
+        return df
+    features_scaled, _ = extract_features(df)
+    if_predictions, _ = detect_anomalies_isolation_forest(features_scaled)
+    lof_predictions, _ = detect_anomalies_lof(features_scaled)
+    df['IsFraud'] = np.maximum(if_predictions, lof_predictions)
+    return df
+
+def mark_duplicates(df):
+    df['DuplicateUsers'] = duplicate_users(df)
+    df['IsFraud'] = np.maximum(df['IsFraud'], (df['DuplicateUsers'] > 0).astype(int))
+    return df
+
+def mark_sessions(df):
+    features = frame_session_features(df)
+    for col, values in features.items():
+        df[col] = values
+    violations, _, _, _ = get_rule_book().evaluate('sessions', {
+        'overlapping_sessions': features['OverlappingSessions'],
+        'daily_distance': features['DailyDistance'],
+        'weekly_distance': features['WeeklyDistance']
+    }, len(df), frame_event_ids(df), notes=False)
+    df['IsFraud'] = np.maximum(df['IsFraud'], violations.astype(int))
+    return df
+
+def scan_population(marathon_df, workers=1, risk_config=None, model_dir=None, model_version=None):
+    df = prepare_marathon_data(marathon_df.reset_index(drop=True))
+
+    if workers <= 1:
+        analyzed_df, user_stats = analyze_per_user(df)
+        analyzed_df = mark_sessions(mark_duplicates(detect_fraud(analyzed_df, load_scan_models(model_dir, model_version))))
+        classify_fraud_types(analyzed_df)
+        return analyzed_df, user_stats, compute_user_risk_scores(analyzed_df, risk_config)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shards = shard_by_user(df, workers * SHARDS_PER_WORKER)
+        analyzed_df, user_stats = merge_analyzed_shards(df, list(executor.map(
+            analyze_shard, shards, [model_dir] * len(shards), [model_version] * len(shards))))
+        analyzed_df = mark_sessions(mark_duplicates(detect_fraud(analyzed_df)))
+
+        correlations = steps_distance_correlation(analyzed_df)
+        shards = shard_by_user(analyzed_df, workers * SHARDS_PER_WORKER)
+        results = list(executor.map(classify_shard, shards, [correlations] * len(shards), [risk_config] * len(shards)))
+
+    analyzed_df['FraudType'] = pd.concat([fraud_types for fraud_types, _ in results]).sort_index()['FraudType']
+    user_risk_scores = {}
+    for _, shard_scores in results:
+        user_risk_scores.update(shard_scores)
+    return analyzed_df, user_stats, order_by_user(analyzed_df, user_risk_scores)
+
+def json_value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def build_response(analyzed_df, user_risk_scores):
+    user_id_col = user_id_column(analyzed_df)
+    fraud_cases = analyzed_df[analyzed_df['IsFraud'] == 1]
+    activity_columns = [col for col in ACTIVITY_COLUMNS if col in fraud_cases.columns]
+
+    fraud_record_details = []
+    for record in fraud_cases.to_dict('records'):
+        user_id = record[user_id_col]
+        fraud_record_details.append({
+            "id": str(json_value(record.get('Id', ''))),
+            "userId": str(json_value(user_id)),
+            "fraudType": record['FraudType'],
+            "riskScore": float(user_risk_scores[user_id]['risk_score']),
+            "activityData": {col: json_value(record[col]) for col in activity_columns}
+        })
+
+    return {
+        "totalRecords": len(analyzed_df),
+        "totalFraudRecords": len(fraud_cases),
+        "fraudUserIds": [str(json_value(user_id)) for user_id in fraud_cases[user_id_col].unique()],
+        "userRiskScores": {
+            str(json_value(user_id)): {key: json_value(value) for key, value in risk_data.items()}
+            for user_id, risk_data in user_risk_scores.items() if risk_data['fraud_count'] > 0
+        },
+        "fraudRecordDetails": fraud_record_details
+    }
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 1:
+        print("Hướng dẫn sử dụng: python population_scan.py <tệp_dữ_liệu_csv_hoặc_jsonl> [--workers <số_tiến_trình>] [--output <tệp_json>] [--risk-config <tệp_json>]")
+        print("                   [--models <thư_mục_mô_hình> [--model-version <phiên_bản>]]")
+        print("Không có --models, Isolation Forest/LOF được huấn luyện tuần tự trên toàn bộ dữ liệu trong tiến trình chính; "
+              "với --models, các tiến trình con chấm điểm từng phần bằng mô hình đã huấn luyện.")
+        sys.exit(1)
+
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else os.cpu_count() or 1
+    output_path = args[args.index('--output') + 1] if '--output' in args else None
+    risk_config = load_risk_config(args[args.index('--risk-config') + 1]) if '--risk-config' in args else None
+    model_dir = args[args.index('--models') + 1] if '--models' in args else None
+    model_version = args[args.index('--model-version') + 1] if '--model-version' in args else None
+    if model_dir is None and workers > 1:
+        print("Không có --models: Isolation Forest/LOF chạy tuần tự, chỉ phân tích và phân loại được chia cho các tiến trình")
+
+    print(f"Đang quét dữ liệu toàn bộ người tham gia từ: {args[0]} ({workers} tiến trình)")
+    analyzed_df, _, user_risk_scores = scan_population(load_marathon_data(args[0]), workers=workers, risk_config=risk_config,
+                                                       model_dir=model_dir, model_version=model_version)
+    response = build_response(analyzed_df, user_risk_scores)
+    print(f"Đã phân tích {response['totalRecords']} bản ghi, phát hiện {response['totalFraudRecords']} bản ghi gian lận "
+          f"của {len(response['fraudUserIds'])} người dùng")
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(response, f, ensure_ascii=False, indent=2)
+        print(f"Đã lưu kết quả quét: {output_path}")
+    else:
+        print("--- BEGIN JSON RESULT ---")
+        print(json.dumps(response, ensure_ascii=False))
+        print("--- END JSON RESULT ---")
@@ -1,368 +1,1064 @@
-import pandas as pd
+import requests
+import contextlib
 import json
 import sys
 import os
+import signal
+import socket
+import socketserver
+import threading
+import time
 import warnings
 warnings.filterwarnings('ignore')
 sys.stdout.reconfigure(encoding='utf-8')
 
-from module import (
-    prepare_marathon_data, analyze_per_user, extract_features,
-    detect_anomalies_isolation_forest, detect_anomalies_lof
+from run_record import (
+    RunRecord, safe_get, safe_get_nested, safe_get_numeric, basic_conditions_result, history_bounds, parse_timestamp,
+    validate_run_record
 )
+from rules import (
+    configure_rules, frame_event_ids, frame_features, frame_record_features, get_rule_book, history_features
+)
+from population_baselines import configure_baselines, get_baselines
+from lenient_json import decode_lenient, loads, require_object
+from user_stats_store import UserStatsStore
+from history_client import HistoryClient
+from diagnostics import configure_logging, log
+from instrumentation import configure_instrumentation, get_registry, stage, trace, MetricsExporter
+
+_user_stats_store = None
+_history_client = None
+_anomaly_models = None
+_debug_timings = False
+_online_detector = None
+_history_store = None
+_history_days = 7
+_history_max_records = None
+_duplicate_index = None
+_verdict_cache = None
+_request_state = threading.local()
+
+def configure_user_stats_store(path):
+    global _user_stats_store
+    if _user_stats_store is not None:
+        _user_stats_store.close()
+    _user_stats_store = UserStatsStore(path) if path else None
+    return _user_stats_store
+
+def get_user_stats_store():
+    return _user_stats_store
+
+def configure_history_client(**options):
+    global _history_client
+    if _history_client is not None:
+        _history_client.close()
+    _history_client = HistoryClient(**options)
+    return _history_client
+
+def configure_anomaly_models(model_dir, version=None):
+    global _anomaly_models
+    if not model_dir:
+        _anomaly_models = None
+        return None
+    from anomaly_models import load_models
+    _anomaly_models = load_models(model_dir, version)
+    return _anomaly_models
+
+def get_anomaly_models():
+    return _anomaly_models
+
+def configure_history_store(path):
+    global _history_store
+    if not path:
+        _history_store = None
+        return None
+    from history_store import HistoryStore
+    _history_store = HistoryStore(path)
+    return _history_store
+
+def get_history_store():
+    return _history_store
+
+def configure_duplicate_index(path):
+    global _duplicate_index
+    if _duplicate_index is not None:
+        _duplicate_index.close()
+    if not path:
+        _duplicate_index = None
+        return None
+    from duplicate_index import DuplicateIndex
+    _duplicate_index = DuplicateIndex(path)
+    return _duplicate_index
+
+def get_duplicate_index():
+    return _duplicate_index
+
+def configure_verdict_cache(path, max_entries=None):
+    global _verdict_cache
+    if _verdict_cache is not None:
+        _verdict_cache.close()
+    if not path:
+        _verdict_cache = None
+        return None
+    from verdict_cache import VerdictCache, DEFAULT_MAX_ENTRIES
+    _verdict_cache = VerdictCache(None if path == 'memory' else path, max_entries or DEFAULT_MAX_ENTRIES)
+    return _verdict_cache
+
+def get_verdict_cache():
+    return _verdict_cache
+
+def configure_history_window(days=7, max_records=None):
+    global _history_days, _history_max_records
+    _history_days = days
+    _history_max_records = max_records or None
+
+def configure_online_detector(enabled, **options):
+    global _online_detector
+    if not enabled:
+        _online_detector = None
+        return None
+    from online_detector import OnlineAnomalyDetector
+    _online_detector = OnlineAnomalyDetector(**options)
+    return _online_detector
+
+def get_online_detector():
+    return _online_detector
+
+def configure_debug_timings(enabled, track_allocations=False):
+    global _debug_timings
+    _debug_timings = enabled
+    configure_instrumentation(track_allocations=track_allocations)
+
+def get_history_client():
+    global _history_client
+    if _history_client is None:
+        _history_client = HistoryClient()
+    return _history_client
+
+def format_error_result(error):
+    error_msg = f"Định dạng dữ liệu cần điều chỉnh: {str(error)}"
+    log('WARNING', f"Thông tin xử lý: {error_msg}")
+    return {
+        "approvalStatus": "PENDING",
+        "fraudRisk": 50.0,
+        "fraudType": "Cần điều chỉnh định dạng",
+        "reviewNote": "Dữ liệu cần được định dạng lại để xử lý chính xác hơn."
+    }
+
+def review_error_result(error):
+    error_msg = f"Cần kiểm tra lại thông tin bản ghi: {str(error)}"
+    log('WARNING', error_msg)
+    return {
+        "approvalStatus": "PENDING",
+        "fraudRisk": 50.0,
+        "fraudType": "Cần xem xét thêm",
+        "reviewNote": "Thông tin cần được xem xét thêm để đảm bảo chính xác."
+    }
+
+def parse_record(record_json):
+    record_json = record_json.strip()
+    if not record_json:
+        raise ValueError("Empty JSON string")
+
+    try:
+        with stage('parse'):
+            record = loads(record_json)
+    except json.JSONDecodeError:
+        with stage('json_repair'):
+            record = require_object(decode_lenient(record_json), record_json)
+
+    if not isinstance(record, dict):
+        raise ValueError("JSON must be an object/dictionary")
+    return record
+
+def record_to_row(record):
+    return RunRecord.from_dict(record).to_row()
+
+def prepare_record_frame(run):
+    import pandas as pd
+    from module import prepare_marathon_data
+    with stage('prepare'):
+        return prepare_marathon_data(pd.DataFrame([run.to_row()]))
 
 def validate_record(record_json):
+    if not _debug_timings:
+        return observe_validation(record_json)
+
+    with trace() as timings:
+        start = time.perf_counter()
+        result = observe_validation(record_json)
+        total_ms = (time.perf_counter() - start) * 1000
+    return {**result, "debug": {"totalMs": total_ms, "timings": timings}}
+
+def observe_validation(record_json):
+    start = time.perf_counter()
+    result = run_validation(record_json)
+    registry = get_registry()
+    registry.observe('total', time.perf_counter() - start)
+    registry.count_outcome(result['approvalStatus'])
+    return result
+
+def run_validation(record_json):
     try:
-        record_json = record_json.strip()
-        if not record_json:
-            raise ValueError("Empty JSON string")
+        record = parse_record(record_json)
+        run = RunRecord.from_dict(record)
 
-        try:
-            record = json.loads(record_json)
-        except json.JSONDecodeError as e:
-            record_json_fixed = fix_json_string(record_json)
-            record = json.loads(record_json_fixed)
-
-        if not isinstance(record, dict):
-            raise ValueError("JSON must be an object/dictionary")
-
-        record_df = pd.DataFrame([{
-            'Id': safe_get(record, 'id', ''),
-            'UserId': safe_get_nested(record, ['user', 'id'], ''),
-            'TotalSteps': safe_get_numeric(record, 'steps', 0),
-            'TotalDistance': safe_get_numeric(record, 'distance', 0.0),
-            'TimeTaken': safe_get_numeric(record, 'timeTaken', 0),
-            'AvgSpeed': safe_get_numeric(record, 'avgSpeed', 0.0),
-            'EndTime': safe_get(record, 'endTime', ''),
-            'heartRate': safe_get_numeric(record, 'heartRate', None, allow_none=True)
-        }])
-
-        if not validate_basic_conditions(record_df):
-            return {
-                "approvalStatus": "REJECTED",
-                "fraudRisk": 100.0,
-                "fraudType": "Dữ liệu cần kiểm tra lại",
-                "reviewNote": "Một số thông tin chạy bộ cần được xem xét lại để đảm bảo chính xác. Vui lòng kiểm tra lại số bước, khoảng cách, thời gian và nhịp tim của bạn."
-            }
-
-        processed_df = prepare_marathon_data(record_df)
-        user_id = processed_df['UserId'].iloc[0]
-        user_history = load_user_history(user_id)
-
-        if user_history is not None and not user_history.empty:
-            analysis_df = pd.concat([user_history, processed_df], ignore_index=True)
-        else:
-            return validate_single_record(processed_df)
+        verdict_cache = get_verdict_cache()
+        if verdict_cache is None:
+            return validate_run(run, record)
 
-        analysis_df, user_stats = analyze_per_user(analysis_df)
-        last_index = analysis_df.index[-1]
-        result = validate_with_user_history(analysis_df, last_index, user_stats)
+        with stage('verdict_cache'):
+            cache_key = run_verdict_key(run, verdict_cache)
+            cached = verdict_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        _request_state.history_failed = False
+        result = validate_run(run, record)
+        if not _request_state.history_failed:
+            with stage('verdict_cache'):
+                verdict_cache.put(run_verdict_key(run, verdict_cache), result)
         return result
 
     except json.JSONDecodeError as e:
-        error_msg = f"Định dạng dữ liệu cần điều chỉnh: {str(e)}"
-        print(f"Thông tin xử lý: {error_msg}")
-        return {
-            "approvalStatus": "PENDING",
-            "fraudRisk": 50.0,
-            "fraudType": "Cần điều chỉnh định dạng",
-            "reviewNote": "Dữ liệu cần được định dạng lại để xử lý chính xác hơn."
-        }
+        return format_error_result(e)
     except Exception as e:
-        error_msg = f"Cần kiểm tra lại thông tin bản ghi: {str(e)}"
-        print(error_msg)
-        return {
-            "approvalStatus": "PENDING",
-            "fraudRisk": 50.0,
-            "fraudType": "Cần xem xét thêm",
-            "reviewNote": "Thông tin cần được xem xét thêm để đảm bảo chính xác."
-        }
+        return review_error_result(e)
 
-def fix_json_string(json_str):
-    json_str = json_str.strip()
+def validate_run(run, record):
+    rejection = basic_conditions_result(run)
+    if rejection is not None:
+        return rejection
 
-    import re
-    json_str = re.sub(r"'([^']*)':", r'"\1":', json_str)
-    json_str = re.sub(r":\s*'([^']*)'", r': "\1"', json_str)
+    fingerprint = run_fingerprint(run)
+    result = duplicate_review(fingerprint, run.event_id)
+    if result is None:
+        result = review_run(run, record)
+    if fingerprint is not None and result['approvalStatus'] != 'REJECTED':
+        with stage('duplicate_index'):
+            get_duplicate_index().add(fingerprint)
+    return result
 
-    json_str = re.sub(r'(\w+):', r'"\1":', json_str)
+def review_run(run, record):
+    trajectory_result = trajectory_review(run)
+    if trajectory_result is not None:
+        return trajectory_result
 
-    json_str = re.sub(r',\s*}', '}', json_str)
-    json_str = re.sub(r',\s*]', ']', json_str)
+    stats_store = get_user_stats_store()
+    if stats_store is not None:
+        return validate_with_stats_store(prepare_record_frame(run), stats_store)
 
-    return json_str
+    user_history = load_user_history(run.user_id, run.end_time, run.id)
+    session_history = load_session_history(run.user_id, run.end_time, run.id, user_history)
+    result = session_review(session_history, run.end_time, run.time_taken, run.distance, run.event_id, run.start_time)
+    if result is None:
+        if user_history is None:
+            result = validate_run_record(run)
+        else:
+            result = validate_against_history(prepare_record_frame(run), user_history)
+    return finalize_result(run, record, result)
 
-def safe_get(data, key, default=None):
-    return data.get(key, default) if isinstance(data, dict) else default
+def finalize_result(run, record, result):
+    online_detector = get_online_detector()
+    if online_detector is not None and result['approvalStatus'] == 'APPROVED':
+        result = online_review(run, online_detector) or result
 
-def safe_get_nested(data, keys, default=None):
-    current = data
-    for key in keys:
-        if isinstance(current, dict) and key in current:
-            current = current[key]
-        else:
-            return default
-    return current
+    if result['approvalStatus'] == 'APPROVED':
+        record_accepted(run.user_id, record)
+        if online_detector is not None:
+            with stage('online_detector'):
+                online_detector.update(run, run.event_id)
+    return result
+
+def validator_version():
+    anomaly_models = get_anomaly_models()
+    baselines = get_baselines()
+    return [
+        get_rule_book().digest,
+        None if anomaly_models is None else anomaly_models['version'],
+        None if baselines is None else baselines.digest,
+        _history_days,
+        _history_max_records,
+        get_duplicate_index() is not None,
+        get_online_detector() is not None
+    ]
+
+def history_version(user_id):
+    stats_store = get_user_stats_store()
+    if stats_store is not None:
+        state = stats_store.get_state(user_id)
+        return ['stats', 0 if state is None else int(state['count'])]
+    history_store = get_history_store()
+    if history_store is not None:
+        return ['store', history_store.row_count(user_id)]
+    return ['api']
 
-def safe_get_numeric(data, key, default=0, allow_none=False):
-    value = safe_get(data, key, default)
-    if value is None and allow_none:
+def run_verdict_key(run, verdict_cache):
+    from verdict_cache import verdict_key
+    return verdict_key(validator_version(), verdict_cache.history_generation(run.user_id), history_version(run.user_id),
+                       run.to_row())
+
+def run_fingerprint(run):
+    if get_duplicate_index() is None:
         return None
-    try:
-        return float(value) if value is not None else default
-    except (ValueError, TypeError):
-        return default
+    from duplicate_index import RecordFingerprint
+    return RecordFingerprint.from_row(run.to_row())
+
+def duplicate_review(fingerprint, event_id, batch_matches=()):
+    if fingerprint is None:
+        return None
+    from duplicate_index import duplicate_features
+    with stage('duplicate_index'):
+        matches = get_duplicate_index().matches(fingerprint) + list(batch_matches)
+    return get_rule_book().score('duplicates', duplicate_features(matches, fingerprint), event_id)
+
+def duplicate_reviews(batch_df, row_indices):
+    duplicate_index = get_duplicate_index()
+    if duplicate_index is None or not len(row_indices):
+        return {}, {}, {}
+    from duplicate_index import RecordFingerprint, batch_matches
+    rows = batch_df.iloc[row_indices].to_dict('records')
+    fingerprints = dict(zip(row_indices, (RecordFingerprint.from_row(row) for row in rows)))
+    reviews, dependent = {}, {}
+    with stage('duplicate_index'):
+        in_batch = batch_matches(list(fingerprints.values()))
+    for row_index, row, earlier in zip(row_indices, rows, in_batch):
+        result = duplicate_review(fingerprints[row_index], row.get('EventId'))
+        if result is not None:
+            reviews[row_index] = result
+        elif earlier:
+            dependent[row_index] = [(row_indices[other], match) for other, match in earlier]
+    return fingerprints, reviews, dependent
+
+def trajectory_review(run):
+    if run.trajectory is None:
+        return None
+    from trajectory import trajectory_result
+    return trajectory_result(run.trajectory, run.event_id)
+
+def trajectory_reviews(batch_df, row_indices):
+    from trajectory import TRAJECTORY_FEATURES
+    if not all(col in batch_df.columns for col in TRAJECTORY_FEATURES):
+        return {}
+    rows_df = batch_df.iloc[row_indices]
+    results = get_rule_book().score_many('trajectory', frame_features(rows_df, TRAJECTORY_FEATURES), len(rows_df),
+                                         frame_event_ids(rows_df))
+    return {row_index: result for row_index, result in zip(row_indices, results) if result is not None}
+
+def session_review(session_history, end_time, time_taken, distance, event_id=None, start_time=None):
+    if session_history is None or session_history.empty:
+        return None
+    from session_index import SessionIndex
+    with stage('session_index'):
+        features = SessionIndex.from_frame(session_history).session_features(end_time, time_taken, distance, start_time)
+    if features is None:
+        return None
+    return get_rule_book().score('sessions', features, event_id)
+
+def online_review(run, online_detector):
+    with stage('online_detector'):
+        observation = online_detector.score(run, run.event_id)
+    if observation['history_count'] == 0:
+        return None
+    result = history_rule_result(observation['deviations'], observation['step_distance_correlation'],
+                                 observation['event_flagged'], observation['user_flagged'], run.event_id)
+    return None if result['approvalStatus'] == 'APPROVED' else result
+
+def validate_against_history(processed_df, user_history):
+    import pandas as pd
+    from module import analyze_per_user
+    with stage('analyze_per_user'):
+        analysis_df = pd.concat([user_history, processed_df], ignore_index=True)
+        analysis_df, user_stats = analyze_per_user(analysis_df)
+    last_index = analysis_df.index[-1]
+    return validate_with_user_history(analysis_df, last_index, user_stats)
+
+def validate_with_stats_store(processed_df, stats_store):
+    from module import add_deviation_columns
+    user_id = processed_df['UserId'].iloc[0]
+    row = processed_df.iloc[0].to_dict()
+    with stage('stats_store_read'):
+        user_stats = stats_store.user_stats(user_id, pending_row=row)
+
+    if user_stats is None:
+        result = validate_single_record(processed_df)
+    else:
+        analysis_df = add_deviation_columns(processed_df, {user_id: user_stats})
+        result = validate_with_user_history(analysis_df, 0, {user_id: user_stats})
+
+    if result['approvalStatus'] == 'APPROVED':
+        with stage('stats_store_write'):
+            stats_store.add_record(user_id, row)
+    return result
+
+def validate_records(records):
+    import pandas as pd
+    import numpy as np
+    from module import prepare_marathon_data
+    results = [None] * len(records)
+    parsed = [None] * len(records)
+    rows = []
+    row_positions = []
+
+    for position, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                record = parse_record(record)
+            parsed[position] = record
+            rows.append(record_to_row(record))
+            row_positions.append(position)
+        except json.JSONDecodeError as e:
+            results[position] = format_error_result(e)
+        except Exception as e:
+            results[position] = review_error_result(e)
+
+    if not rows:
+        return results
+
+    batch_df = pd.DataFrame(rows)
+    basic_mask = np.ones(len(batch_df), dtype=bool)
+    for row_index, rejection in enumerate(basic_conditions_results(batch_df)):
+        if rejection is not None:
+            results[row_positions[row_index]] = rejection
+            basic_mask[row_index] = False
+    fingerprints, duplicate_results, dependent_rows = duplicate_reviews(batch_df, np.flatnonzero(basic_mask))
+    for row_index, result in duplicate_results.items():
+        results[row_positions[row_index]] = result
+        basic_mask[row_index] = False
+    basic_mask[list(dependent_rows)] = False
+    for row_index, result in trajectory_reviews(batch_df, np.flatnonzero(basic_mask)).items():
+        results[row_positions[row_index]] = result
+        basic_mask[row_index] = False
+
+    single_rows = []
+    stats_store = get_user_stats_store()
+    batch_scope = contextlib.nullcontext()
+    if stats_store is None and get_history_store() is None:
+        batch_scope = get_history_client().batch_scope(history_ranges(batch_df, np.flatnonzero(basic_mask)))
+    with batch_scope:
+        for row_index in np.flatnonzero(basic_mask):
+            position = row_positions[row_index]
+            try:
+                if stats_store is not None:
+                    processed_df = prepare_marathon_data(batch_df.iloc[[row_index]].reset_index(drop=True))
+                    results[position] = validate_with_stats_store(processed_df, stats_store)
+                    continue
+
+                row = batch_df.iloc[row_index]
+                user_history = load_user_history(row['UserId'], row['EndTime'], row['Id'])
+                session_history = load_session_history(row['UserId'], row['EndTime'], row['Id'], user_history)
+                session_result = session_review(session_history, row['EndTime'], row['TimeTaken'], row['TotalDistance'],
+                                                row['EventId'], row['StartTime'])
+                if session_result is not None:
+                    results[position] = session_result
+                    continue
+
+                if user_history is None or user_history.empty:
+                    single_rows.append(row_index)
+                    continue
+
+                processed_df = prepare_marathon_data(batch_df.iloc[[row_index]].reset_index(drop=True))
+                results[position] = finalize_result(RunRecord.from_dict(parsed[position]), parsed[position],
+                                                    validate_against_history(processed_df, user_history))
+            except Exception as e:
+                results[position] = review_error_result(e)
+
+    if single_rows:
+        processed_df = prepare_marathon_data(batch_df.iloc[single_rows].reset_index(drop=True))
+        for row_index, result in zip(single_rows, validate_single_records(processed_df)):
+            position = row_positions[row_index]
+            results[position] = finalize_result(RunRecord.from_dict(parsed[position]), parsed[position], result)
+
+    for row_index, earlier in dependent_rows.items():
+        position = row_positions[row_index]
+        accepted = [match for other, match in earlier if results[row_positions[other]]['approvalStatus'] != 'REJECTED']
+        try:
+            result = duplicate_review(fingerprints[row_index], batch_df['EventId'].iloc[row_index], accepted)
+            if result is None:
+                result = review_run(RunRecord.from_dict(parsed[position]), parsed[position])
+            results[position] = result
+        except Exception as e:
+            results[position] = review_error_result(e)
+
+    accepted = [fingerprint for row_index, fingerprint in fingerprints.items()
+                if results[row_positions[row_index]]['approvalStatus'] != 'REJECTED']
+    if accepted:
+        with stage('duplicate_index'):
+            get_duplicate_index().add_many(accepted)
+    return results
+
+def history_ranges(batch_df, row_indices):
+    from session_index import SESSION_HISTORY_DAYS
+    ranges = {}
+    for row_index in row_indices:
+        user_id = batch_df['UserId'].iloc[row_index]
+        start, end = history_bounds(max(_history_days, SESSION_HISTORY_DAYS), batch_df['EndTime'].iloc[row_index])
+        if user_id in ranges:
+            start, end = min(start, ranges[user_id][0]), max(end, ranges[user_id][1])
+        ranges[user_id] = (start, end)
+    return ranges
+
+def basic_conditions_results(record_df):
+    return get_rule_book().score_many('basic_conditions', frame_record_features(record_df), len(record_df),
+                                      frame_event_ids(record_df))
 
 def validate_basic_conditions(record_df):
-    if record_df['TotalSteps'].iloc[0] < 0 or pd.isna(record_df['TotalSteps'].iloc[0]):
-        return False
-    if record_df['TotalDistance'].iloc[0] < 0 or pd.isna(record_df['TotalDistance'].iloc[0]):
-        return False
-    if record_df['TimeTaken'].iloc[0] <= 0 or pd.isna(record_df['TimeTaken'].iloc[0]):
-        return False
-
-    distance = record_df['TotalDistance'].iloc[0]
-    steps = record_df['TotalSteps'].iloc[0]
-    time_taken = record_df['TimeTaken'].iloc[0]
-
-    if steps > 0 and distance > 0:
-        distance_per_step = distance * 1000 / steps
-        if distance_per_step > 2.0:
-            return False
-
-    if time_taken > 0 and distance > 0:
-        speed = distance / (time_taken / 60)
-        if speed > 25.0:
-            return False
-
-    if 'heartRate' in record_df.columns and pd.notna(record_df['heartRate'].iloc[0]):
-        heart_rate = record_df['heartRate'].iloc[0]
-        if heart_rate < 40 or heart_rate > 220:
-            return False
-
-    return True
+    return basic_conditions_results(record_df)[0] is None
+
+def validate_single_records(processed_df):
+    features = frame_record_features(processed_df)
+    event_ids = frame_event_ids(processed_df)
+    baselines = get_baselines()
+    if baselines is None:
+        return get_rule_book().score_many('single_record', features, len(processed_df), event_ids)
+    features.update(baselines.frame_percentile_features(features, event_ids))
+    return get_rule_book().score_many('cold_start', features, len(processed_df), event_ids)
 
 def validate_single_record(processed_df):
-    steps = processed_df['TotalSteps'].iloc[0]
-    distance = processed_df['TotalDistance'].iloc[0]
-    time_taken = processed_df['TimeTaken'].iloc[0]
-    heart_rate = processed_df['heartRate'].iloc[0] if 'heartRate' in processed_df.columns and pd.notna(processed_df['heartRate'].iloc[0]) else None
-
-    speed = distance / (time_taken / 60) if time_taken > 0 else 0
-    distance_per_step = (distance * 1000) / steps if steps > 0 else 0
-    fraud_risk = 0
-    fraud_type = None
-    review_note = "Tuyệt vời! Kết quả chạy bộ của bạn trông rất tốt."
-
-    if speed > 20:
-        fraud_risk = max(fraud_risk, 90)
-        fraud_type = "Tốc độ cần xác nhận"
-        review_note = f"Wow! Tốc độ {speed:.2f}km/h thật ấn tượng. Hãy giúp chúng tôi xác nhận bạn thực sự chạy bộ để ghi nhận thành tích này nhé!"
-    elif speed > 15:
-        fraud_risk = max(fraud_risk, 70)
-        fraud_type = "Tốc độ xuất sắc"
-        review_note = f"Tốc độ {speed:.2f}km/h rất tuyệt! Chúng tôi chỉ cần xác minh thêm để đảm bảo ghi nhận chính xác thành tích của bạn."
-
-    if distance_per_step > 1.5:
-        fraud_risk = max(fraud_risk, 80)
-        fraud_type = "Chiều dài bước cần kiểm tra"
-        review_note = f"Chiều dài bước ({distance_per_step:.2f}m) của bạn khá đặc biệt. Hãy giúp chúng tôi xác nhận để ghi nhận chính xác thành tích này!"
-    elif distance_per_step > 1.0:
-        fraud_risk = max(fraud_risk, 60)
-        fraud_type = "Chiều dài bước đặc biệt"
-        review_note = f"Chiều dài bước ({distance_per_step:.2f}m) của bạn khá ấn tượng. Chúng tôi sẽ xem xét để ghi nhận chính xác."
-
-    steps_per_minute = steps / time_taken if time_taken > 0 else 0
-    if steps_per_minute > 250:
-        fraud_risk = max(fraud_risk, 75)
-        fraud_type = "Nhịp độ bước cần xác nhận"
-        review_note = f"Nhịp độ {steps_per_minute:.0f} bước/phút thật tuyệt vời! Hãy giúp chúng tôi xác nhận để ghi nhận thành tích này."
-
-    if heart_rate is not None and heart_rate > 0:
-        if heart_rate < 60 and steps > 10000:
-            fraud_risk = max(fraud_risk, 85)
-            fraud_type = "Nhịp tim cần kiểm tra"
-            review_note = f"Nhịp tim {heart_rate:.1f} bpm với {steps} bước khá đặc biệt. Hãy kiểm tra lại thiết bị đo nhịp tim để đảm bảo chính xác nhé!"
-
-    approval_status = "APPROVED"
-    if fraud_risk >= 70:
-        approval_status = "REJECTED"
-    elif fraud_risk >= 40:
-        approval_status = "PENDING"
+    return validate_single_records(processed_df.iloc[[0]])[0]
 
-    return {
-        "approvalStatus": approval_status,
-        "fraudRisk": float(fraud_risk),
-        "fraudType": fraud_type if fraud_type else "Hoàn hảo",
-        "reviewNote": review_note
-    }
+HISTORY_DEVIATION_COLUMNS = ['StepDeviation', 'SpeedDeviation', 'DistPerStepDeviation', 'HeartRateDeviation']
+
+def history_rule_result(deviations, step_distance_correlation, if_flagged, lof_flagged, event_id=None):
+    features = history_features(deviations, step_distance_correlation, if_flagged, lof_flagged)
+    return get_rule_book().score('history', features, event_id)
 
 def validate_with_user_history(analysis_df, new_record_index, user_stats):
+    import pandas as pd
     new_record = analysis_df.iloc[new_record_index]
     user_id = new_record['UserId']
-    fraud_risk = 0
-    fraud_type = None
-    review_note = "Tuyệt vời! Kết quả chạy bộ của bạn rất ổn định và tự nhiên."
-
-    if 'StepDeviation' in analysis_df.columns and abs(new_record['StepDeviation']) > 3:
-        fraud_risk = max(fraud_risk, 75)
-        fraud_type = "Số bước khác thường"
-        review_note = f"Số bước hôm nay khác khá nhiều so với thói quen thường ngày ({abs(new_record['StepDeviation']):.2f} lần). Điều này có bình thường không?"
-
-    if 'SpeedDeviation' in analysis_df.columns and abs(new_record['SpeedDeviation']) > 3:
-        fraud_risk = max(fraud_risk, 80)
-        fraud_type = "Tốc độ bất ngờ"
-        review_note = f"Tốc độ hôm nay thay đổi khá nhiều so với lịch sử ({abs(new_record['SpeedDeviation']):.2f} lần). Bạn có tập luyện đặc biệt gì không?"
-
-    if 'DistPerStepDeviation' in analysis_df.columns and abs(new_record['DistPerStepDeviation']) > 3:
-        fraud_risk = max(fraud_risk, 85)
-        fraud_type = "Kiểu chạy khác lạ"
-        review_note = f"Kiểu chạy hôm nay có vẻ khác so với thường ngày ({abs(new_record['DistPerStepDeviation']):.2f} lần). Có thể bạn thay đổi cách chạy?"
-
-    if ('heartRate' in analysis_df.columns and pd.notna(new_record['heartRate']) and
-            'HeartRateDeviation' in analysis_df.columns and pd.notna(new_record['HeartRateDeviation'])):
-        if abs(new_record['HeartRateDeviation']) > 3:
-            fraud_risk = max(fraud_risk, 80)
-            fraud_type = "Nhịp tim khác thường"
-            review_note = f"Nhịp tim hôm nay khác khá nhiều so với thường ngày ({abs(new_record['HeartRateDeviation']):.2f} lần). Bạn có cảm thấy khác lạ gì không?"
 
+    deviations = {col: new_record[col] for col in HISTORY_DEVIATION_COLUMNS if col in analysis_df.columns}
+    if 'heartRate' not in analysis_df.columns or pd.isna(new_record['heartRate']):
+        deviations.pop('HeartRateDeviation', None)
+
+    step_distance_correlation = 1.0
     if user_id in user_stats and 'step_correlations' in user_stats[user_id]:
-        if user_stats[user_id]['step_correlations'].get('TotalDistance', 1.0) < 0.5:
-            fraud_risk = max(fraud_risk, 70)
-            fraud_type = "Mẫu chạy khác lạ"
-            review_note = "Mối quan hệ giữa số bước và khoảng cách hôm nay có vẻ khác so với thường ngày. Có thể bạn chạy ở địa hình mới?"
+        step_distance_correlation = user_stats[user_id]['step_correlations'].get('TotalDistance', 1.0)
 
     try:
-        features_scaled, _ = extract_features(analysis_df)
-        if len(features_scaled) >= 5:
-            if_predictions, _ = detect_anomalies_isolation_forest(features_scaled, contamination=0.1)
-            if if_predictions[new_record_index] == 1:
-                fraud_risk = max(fraud_risk, 70)
-                if fraud_type is None:
-                    fraud_type = "Mẫu chạy đặc biệt"
-                review_note += " Các chỉ số hôm nay có một số điểm đặc biệt so với thường ngày."
-
-            lof_predictions, _ = detect_anomalies_lof(features_scaled, contamination=0.1)
-            if lof_predictions[new_record_index] == 1:
-                fraud_risk = max(fraud_risk, 65)
-                if fraud_type is None:
-                    fraud_type = "Dữ liệu đặc biệt"
-                review_note += " Một số chỉ số cần được xem xét thêm."
+        anomaly_models = get_anomaly_models()
+        if anomaly_models is not None:
+            from anomaly_models import score_records
+            with stage('model_scoring'):
+                model_scores = score_records(anomaly_models, analysis_df.iloc[[new_record_index]])
+            if_flagged = model_scores['if_predictions'][0] == 1
+            lof_flagged = model_scores['lof_predictions'][0] == 1
+        else:
+            if_flagged, lof_flagged = fit_anomaly_detectors(analysis_df, new_record_index)
     except Exception as e:
-        print(f"Thông tin xử lý: Đang phân tích dữ liệu - {e}")
+        log('WARNING', f"Thông tin xử lý: Đang phân tích dữ liệu - {e}")
+        if_flagged = lof_flagged = False
 
-    approval_status = "APPROVED"
-    if fraud_risk >= 70:
-        approval_status = "REJECTED"
-    elif fraud_risk >= 40:
-        approval_status = "PENDING"
+    return history_rule_result(deviations, step_distance_correlation, if_flagged, lof_flagged, new_record.get('EventId'))
 
-    if fraud_risk == 0:
-        fraud_type = "Hoàn hảo"
+def history_records_to_frame(records):
+    import pandas as pd
+    return pd.DataFrame([{
+        'Id': safe_get(record, 'id', ''),
+        'UserId': safe_get_nested(record, ['user', 'id'], ''),
+        'TotalSteps': safe_get_numeric(record, 'steps', 0),
+        'TotalDistance': safe_get_numeric(record, 'distance', 0.0),
+        'TimeTaken': safe_get_numeric(record, 'timeTaken', 0),
+        'AvgSpeed': safe_get_numeric(record, 'avgSpeed', 0.0),
+        'Timestamp': parse_timestamp(safe_get(record, 'endTime')),
+        'StartTime': parse_timestamp(safe_get(record, 'startTime')),
+        'heartRate': safe_get_numeric(record, 'heartRate', None, allow_none=True)
+    } for record in records])
 
-    return {
-        "approvalStatus": approval_status,
-        "fraudRisk": float(fraud_risk),
-        "fraudType": fraud_type,
-        "reviewNote": review_note
-    }
+def fit_anomaly_detectors(analysis_df, new_record_index):
+    from module import extract_features, detect_anomalies_isolation_forest, detect_anomalies_lof
+    with stage('extract_features'):
+        features_scaled, _ = extract_features(analysis_df)
+    if len(features_scaled) < 5:
+        return False, False
 
-def load_user_history(user_id, days=7):
+    with stage('isolation_forest'):
+        if_predictions, _ = detect_anomalies_isolation_forest(features_scaled, contamination=0.1)
+    with stage('lof'):
+        lof_predictions, _ = detect_anomalies_lof(features_scaled, contamination=0.1)
+    return if_predictions[new_record_index] == 1, lof_predictions[new_record_index] == 1
+
+def load_user_history_records(user_id, end_time=None, exclude_id=None, days=None, max_records=None):
+    if days is None:
+        days, max_records = _history_days, _history_max_records
     try:
-        from datetime import datetime, timedelta
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        api_url = (
-                os.getenv('API_URL', 'http://localhost:8080/api/v1/record/user') +
-                f'/{user_id}/history?startDate={start_date.strftime("%Y-%m-%dT%H:%M:%S")}&endDate={end_date.strftime("%Y-%m-%dT%H:%M:%S")}'
-        )
-        print(f"Đang tải lịch sử chạy bộ của bạn: {api_url}")
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-
-        records = response.json()
+        with stage('history_fetch'):
+            records = get_history_client().fetch_records(user_id, days, end_time, max_records, exclude_id)
         if not records:
-            print(f"Chưa có lịch sử chạy bộ cho người dùng {user_id} trong {days} ngày qua")
+            log('INFO', f"Chưa có lịch sử chạy bộ cho người dùng {user_id} trong {days} ngày trước lần chạy này",
+                userId=user_id)
             return None
 
-        user_history = pd.DataFrame([{
-            'Id': safe_get(record, 'id', ''),
-            'UserId': safe_get_nested(record, ['user', 'id'], ''),
-            'TotalSteps': safe_get_numeric(record, 'steps', 0),
-            'TotalDistance': safe_get_numeric(record, 'distance', 0.0),
-            'TimeTaken': safe_get_numeric(record, 'timeTaken', 0),
-            'AvgSpeed': safe_get_numeric(record, 'avgSpeed', 0.0),
-            'Timestamp': safe_get(record, 'endTime', ''),
-            'heartRate': safe_get_numeric(record, 'heartRate', None, allow_none=True)
-        } for record in records])
-
-        print(f"Đã tải {len(user_history)} bản ghi lịch sử chạy bộ của người dùng {user_id} trong {days} ngày qua")
-        return user_history
+        log('INFO', f"Đã tải {len(records)} bản ghi lịch sử chạy bộ của người dùng {user_id} trong {days} ngày trước lần chạy này",
+            userId=user_id, historyRecords=len(records))
+        return records
 
     except requests.RequestException as e:
-        print(f"Không thể tải lịch sử chạy bộ: {e}")
+        log('WARNING', f"Không thể tải lịch sử chạy bộ: {e}", userId=user_id)
+        _request_state.history_failed = True
         return None
     except Exception as e:
-        print(f"Có vấn đề khi xử lý lịch sử: {e}")
+        log('ERROR', f"Có vấn đề khi xử lý lịch sử: {e}", userId=user_id)
+        _request_state.history_failed = True
         return None
 
+def load_user_history(user_id, end_time=None, exclude_id=None, days=None, max_records=None):
+    if days is None:
+        days, max_records = _history_days, _history_max_records
+    history_df = None
+    history_store = get_history_store()
+    if history_store is not None:
+        try:
+            with stage('history_fetch'):
+                history_df = history_store.window_frame(user_id, days, end_time, max_records, exclude_id)
+            if history_df is None:
+                return None
+        except (OSError, ValueError) as e:
+            log('WARNING', f"Không thể đọc kho lịch sử, chuyển sang tải lịch sử từ API: {e}", userId=user_id)
+            _request_state.history_failed = True
+
+    if history_df is None:
+        records = load_user_history_records(user_id, end_time, exclude_id, days, max_records)
+        if not records:
+            return None
+        with stage('history_frame'):
+            history_df = history_records_to_frame(records)
+    from module import prepare_marathon_data
+    with stage('history_frame'):
+        return prepare_marathon_data(history_df)
+
+def load_session_history(user_id, end_time=None, exclude_id=None, user_history=None):
+    from session_index import SESSION_HISTORY_DAYS
+    if _history_days >= SESSION_HISTORY_DAYS and _history_max_records is None:
+        return user_history
+    return load_user_history(user_id, end_time, exclude_id, SESSION_HISTORY_DAYS)
+
+def record_accepted(user_id, record=None):
+    verdict_cache = get_verdict_cache()
+    if verdict_cache is not None:
+        verdict_cache.history_changed(user_id)
+    history_store = get_history_store()
+    if history_store is not None:
+        if record is not None:
+            try:
+                with stage('history_store_write'):
+                    history_store.append_records([record])
+            except (OSError, ValueError) as e:
+                log('WARNING', f"Không thể ghi bản ghi vào kho lịch sử: {e}", userId=user_id)
+        return
+    get_history_client().invalidate(user_id)
+
+WARM_UP_HISTORY = [
+    (8000, 6.1, 38, 142.0),
+    (8500, 6.4, 40, 145.0),
+    (7900, 6.0, 37, 139.0),
+    (9100, 6.9, 43, 150.0),
+    (8200, 6.2, 39, 141.0),
+    (8800, 6.6, 41, 147.0),
+]
+
+def warm_up():
+    import pandas as pd
+    from module import prepare_marathon_data, analyze_per_user
+    history_df = pd.DataFrame([{
+        'Id': index,
+        'UserId': 'warm-up',
+        'TotalSteps': float(steps),
+        'TotalDistance': distance,
+        'TimeTaken': float(time_taken),
+        'AvgSpeed': distance / (time_taken / 60),
+        'EndTime': '',
+        'heartRate': heart_rate
+    } for index, (steps, distance, time_taken, heart_rate) in enumerate(WARM_UP_HISTORY)])
+
+    processed_df = prepare_marathon_data(history_df)
+    validate_basic_conditions(processed_df.iloc[[0]].reset_index(drop=True))
+    validate_single_record(processed_df.iloc[[0]].reset_index(drop=True))
+    analysis_df, user_stats = analyze_per_user(processed_df)
+    validate_with_user_history(analysis_df, analysis_df.index[-1], user_stats)
+
+STATS_COMMAND = "stats"
+
+class ValidatorServer:
+    def __init__(self, output):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.active_requests = 0
+        self.active_lock = threading.Lock()
+
+    def handle_line(self, line, stream):
+        line = line.strip()
+        if not line:
+            return
+        with self.active_lock:
+            self.active_requests += 1
+        try:
+            if line == STATS_COMMAND:
+                response = json.dumps(get_registry().snapshot(), ensure_ascii=False)
+            else:
+                response = json.dumps(validate_record(line), ensure_ascii=False)
+            with self.output_lock:
+                stream.write(response + "\n")
+                stream.flush()
+        finally:
+            with self.active_lock:
+                self.active_requests -= 1
+
+    def is_idle(self):
+        with self.active_lock:
+            return self.active_requests == 0
+
+class ServerShutdown(Exception):
+    pass
+
+def serve_stdio(server):
+    def request_shutdown(signum, frame):
+        server.stopping.set()
+        if server.is_idle():
+            raise ServerShutdown()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    try:
+        for line in sys.stdin:
+            server.handle_line(line, server.output)
+            if server.stopping.is_set():
+                break
+    except ServerShutdown:
+        pass
+
+class ValidatorRequestHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.server.track_connection(self.request)
+
+    def handle(self):
+        validator = self.server.validator
+        for raw_line in self.rfile:
+            validator.handle_line(raw_line.decode('utf-8'), self)
+            if validator.stopping.is_set():
+                break
+
+    def write(self, data):
+        self.wfile.write(data.encode('utf-8'))
+
+    def flush(self):
+        self.wfile.flush()
+
+    def finish(self):
+        self.server.untrack_connection(self.request)
+        super().finish()
+
+class ValidatorSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, socket_path, validator):
+        self.validator = validator
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+        super().__init__(socket_path, ValidatorRequestHandler)
+
+    def track_connection(self, connection):
+        with self.connections_lock:
+            self.connections.add(connection)
+
+    def untrack_connection(self, connection):
+        with self.connections_lock:
+            self.connections.discard(connection)
+
+    def drain(self):
+        self.validator.stopping.set()
+        self.shutdown()
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+def serve_socket(server, socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    socket_server = ValidatorSocketServer(socket_path, server)
+
+    def request_shutdown(signum, frame):
+        if not server.stopping.is_set():
+            threading.Thread(target=socket_server.drain).start()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    log('INFO', f"Dịch vụ kiểm tra bản ghi đang lắng nghe tại: {socket_path}")
+    try:
+        socket_server.serve_forever()
+    finally:
+        socket_server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def serve(socket_path=None):
+    output = sys.stdout
+    sys.stdout = sys.stderr
+    sys.stdin.reconfigure(encoding='utf-8')
+
+    log('INFO', "Đang khởi động dịch vụ kiểm tra bản ghi...")
+    warm_up()
+    get_registry().reset()
+    log('INFO', "Dịch vụ kiểm tra bản ghi đã sẵn sàng")
+
+    server = ValidatorServer(output)
+    if socket_path:
+        serve_socket(server, socket_path)
+    else:
+        serve_stdio(server)
+    log('INFO', "Dịch vụ kiểm tra bản ghi đã dừng")
+
+def read_batch_records(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+
+    if content.startswith('['):
+        try:
+            records = loads(content)
+        except json.JSONDecodeError:
+            records = decode_lenient(content)
+        if not isinstance(records, list):
+            raise ValueError("JSON batch must be an array")
+        return records
+
+    return [line for line in content.splitlines() if line.strip()]
+
+DEFAULT_CHUNK_SIZE = 1000
+
+def iter_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+def iter_chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def parse_stream_record(line):
+    try:
+        return parse_record(line)
+    except Exception:
+        return line
+
+def stream_validate(input_stream, output_stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    record_count = 0
+    records = (parse_stream_record(line) for line in iter_jsonl(input_stream))
+    for chunk in iter_chunks(records, chunk_size):
+        for record, result in zip(chunk, validate_records(chunk)):
+            record_id = safe_get(record, 'id')
+            output_stream.write(json.dumps({"recordId": record_id, **result}, ensure_ascii=False) + "\n")
+        output_stream.flush()
+        record_count += len(chunk)
+        log('INFO', f"Đã xử lý {record_count} bản ghi", processedRecords=record_count)
+    return record_count
+
+def run_stream(input_path=None, output_path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    output = sys.stdout
+    sys.stdout = sys.stderr
+
+    input_stream = sys.stdin
+    output_stream = output
+    try:
+        if input_path and input_path != '-':
+            input_stream = open(input_path, 'r', encoding='utf-8')
+        else:
+            sys.stdin.reconfigure(encoding='utf-8')
+        if output_path and output_path != '-':
+            output_stream = open(output_path, 'w', encoding='utf-8')
+        return stream_validate(input_stream, output_stream, chunk_size)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not output:
+            output_stream.close()
+        sys.stdout = output
+
+RESULT_EXIT_CODES = {"APPROVED": 0, "PENDING": 10, "REJECTED": 20}
+EXIT_USAGE_ERROR = 1
+EXIT_INTERNAL_ERROR = 3
+
+def print_result(result):
+    print("\n--- KẾT QUẢ PHÂN TÍCH ---")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print("--- HẾT KẾT QUẢ ---")
+
+def open_result_channel(target, stdout):
+    if target in ('-', 'stdout'):
+        return stdout
+    if target.startswith('fd:'):
+        return os.fdopen(int(target[3:]), 'w', encoding='utf-8', closefd=False)
+    return open(target, 'w', encoding='utf-8')
+
+def write_result(channel, result):
+    channel.write(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + "\n")
+    channel.flush()
+
+def result_exit_code(results):
+    return max((RESULT_EXIT_CODES.get(result.get("approvalStatus"), RESULT_EXIT_CODES["PENDING"]) for result in results), default=0)
+
+def pop_flag(args, name):
+    if name in args:
+        args.remove(name)
+        return True
+    return False
+
+def pop_option(args, name, default=None):
+    if name in args:
+        option_index = args.index(name)
+        if option_index + 1 < len(args):
+            value = args[option_index + 1]
+            del args[option_index:option_index + 2]
+            return value
+    return default
+
+def exit_with_results(results, channel, record_ids=None):
+    if channel is None:
+        print_result(results if record_ids is not None else results[0])
+        sys.exit(0)
+
+    for index, result in enumerate(results):
+        write_result(channel, result if record_ids is None else {"recordId": record_ids[index], **result})
+    sys.exit(result_exit_code(results))
+
 if __name__ == "__main__":
+    result_channel = None
+    metrics_exporter = None
     try:
         if len(sys.argv) < 2:
-            print("Hướng dẫn sử dụng: python record_validator.py <dữ_liệu_json> [--file] [--userId <user_id>]")
-            sys.exit(1)
-
-        is_file_path = False
-        user_id = None
+            print("Hướng dẫn sử dụng: python record_validator.py <dữ_liệu_json> [--file] [--userId <user_id>] [--json-out <-|fd:N|tệp>]")
+            print("                   python record_validator.py <tệp_json_hoặc_jsonl> --batch [--json-out <-|fd:N|tệp>]")
+            print("                   python record_validator.py --stream [<tệp_jsonl>] [--chunk-size <số_bản_ghi>] [--output <tệp_kết_quả>]")
+            print("                   python record_validator.py --serve [--socket <đường_dẫn_socket>]")
+            print("Tùy chọn chung:    [--log-level DEBUG|INFO|WARNING|ERROR] [--log-format text|json]")
+            print("                   [--stats-db <tệp_sqlite>] [--history-store <thư_mục_lịch_sử>] [--models <thư_mục_mô_hình>]")
+            print("                   [--duplicate-db <tệp_sqlite>] [--verdict-cache <tệp_sqlite|memory> [--verdict-cache-size <số_kết_quả>]]")
+            print("                   [--history-days <số_ngày>] [--history-max-records <số_bản_ghi>] [--rules <tệp_luật_json|yaml>]")
+            print("                   [--baselines <tệp_bảng_phân_vị_json>]")
+            print("                   [--online-detector (chỉ với --serve|--stream) [--user-window <số_bản_ghi>] [--event-window <số_bản_ghi>]]")
+            print("                   [--debug-timings] [--trace-allocations] [--metrics-file <tệp.prom|tệp.json>] [--metrics-interval <giây>]")
+            sys.exit(EXIT_USAGE_ERROR)
 
         args = sys.argv[1:]
-        if "--file" in args:
-            is_file_path = True
-            args.remove("--file")
+        json_out = pop_option(args, "--json-out", os.getenv('RESULT_JSON_OUT'))
+        log_format = pop_option(args, "--log-format", os.getenv('LOG_FORMAT', 'json' if json_out else 'text'))
+        log_level = pop_option(args, "--log-level", os.getenv('LOG_LEVEL', 'INFO'))
+        if json_out:
+            stdout = sys.stdout
+            sys.stdout = sys.stderr
+            result_channel = open_result_channel(json_out, stdout)
+        configure_logging(log_level, structured=log_format == 'json', stream=sys.stderr if json_out else None)
+
+        debug_timings = pop_flag(args, "--debug-timings") or os.getenv('VALIDATOR_DEBUG_TIMINGS') == '1'
+        configure_debug_timings(debug_timings, track_allocations=pop_flag(args, "--trace-allocations"))
+        metrics_file = pop_option(args, "--metrics-file", os.getenv('VALIDATOR_METRICS_FILE'))
+        metrics_interval = float(pop_option(args, "--metrics-interval", 15))
+        if metrics_file:
+            metrics_exporter = MetricsExporter(metrics_file, metrics_interval).start()
+
+        configure_rules(pop_option(args, "--rules", os.getenv('VALIDATION_RULES')))
+        configure_baselines(pop_option(args, "--baselines", os.getenv('POPULATION_BASELINES')))
+        configure_user_stats_store(pop_option(args, "--stats-db", os.getenv('USER_STATS_DB')))
+        configure_history_store(pop_option(args, "--history-store", os.getenv('USER_HISTORY_STORE')))
+        configure_duplicate_index(pop_option(args, "--duplicate-db", os.getenv('DUPLICATE_INDEX_DB')))
+        configure_verdict_cache(pop_option(args, "--verdict-cache", os.getenv('VERDICT_CACHE')),
+                                int(pop_option(args, "--verdict-cache-size", os.getenv('VERDICT_CACHE_SIZE', 0))))
+        configure_history_window(int(pop_option(args, "--history-days", os.getenv('HISTORY_WINDOW_DAYS', 7))),
+                                 int(pop_option(args, "--history-max-records", os.getenv('HISTORY_MAX_RECORDS', 0))))
+        online_detector = pop_flag(args, "--online-detector") or os.getenv('ONLINE_DETECTOR') == '1'
+        online_options = {'user_window': int(pop_option(args, "--user-window", 50)),
+                          'event_window': int(pop_option(args, "--event-window", 100))}
+        configure_anomaly_models(pop_option(args, "--models", os.getenv('ANOMALY_MODEL_DIR')),
+                                 pop_option(args, "--model-version", os.getenv('ANOMALY_MODEL_VERSION')))
+        if get_user_stats_store() is not None and get_anomaly_models() is None:
+            log('WARNING', "--stats-db không kèm --models: bỏ qua Isolation Forest/LOF, chỉ so độ lệch với thống kê tích lũy")
+
+        long_running = '--serve' in args or '--stream' in args
+        if online_detector and not long_running:
+            log('WARNING', "Bộ phát hiện trực tuyến chỉ giữ trạng thái trong --serve hoặc --stream, bỏ qua --online-detector")
+        configure_online_detector(online_detector and long_running, **online_options)
+
+        if pop_flag(args, "--serve"):
+            serve(pop_option(args, "--socket"))
+            sys.exit(0)
 
-        if "--userId" in args:
-            user_id_index = args.index("--userId")
-            if user_id_index + 1 < len(args):
-                user_id = args[user_id_index + 1]
-                args.remove("--userId")
-                args.remove(user_id)
+        if pop_flag(args, "--stream"):
+            chunk_size = int(pop_option(args, "--chunk-size", DEFAULT_CHUNK_SIZE))
+            output_path = pop_option(args, "--output")
+            run_stream(args[0] if args else None, output_path, chunk_size)
+            sys.exit(0)
+
+        if pop_flag(args, "--batch"):
+            if not args:
+                log('ERROR', "Lưu ý: Vui lòng cung cấp tệp dữ liệu JSON hoặc JSONL")
+                sys.exit(EXIT_USAGE_ERROR)
+            log('INFO', f"Đang đọc dữ liệu hàng loạt từ tệp: {args[0]}")
+            try:
+                records = [record if isinstance(record, dict) else parse_stream_record(record)
+                           for record in read_batch_records(args[0])]
+            except FileNotFoundError:
+                log('ERROR', f"Không tìm thấy tệp: {args[0]}")
+                sys.exit(EXIT_USAGE_ERROR)
+            exit_with_results(validate_records(records), result_channel, [safe_get(record, 'id') for record in records])
+
+        is_file_path = pop_flag(args, "--file")
+        user_id = pop_option(args, "--userId")
 
         if not args:
-            print("Lưu ý: Vui lòng cung cấp dữ liệu JSON")
-            sys.exit(1)
+            log('ERROR', "Lưu ý: Vui lòng cung cấp dữ liệu JSON")
+            sys.exit(EXIT_USAGE_ERROR)
 
         if is_file_path:
             file_path = args[0]
-            print(f"Đang đọc dữ liệu từ tệp: {file_path}")
+            log('INFO', f"Đang đọc dữ liệu từ tệp: {file_path}")
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     record_json = f.read().strip()
             except FileNotFoundError:
-                print(f"Không tìm thấy tệp: {file_path}")
-                sys.exit(1)
+                log('ERROR', f"Không tìm thấy tệp: {file_path}")
+                sys.exit(EXIT_USAGE_ERROR)
             except Exception as e:
-                print(f"Có vấn đề khi đọc tệp: {e}")
-                sys.exit(1)
+                log('ERROR', f"Có vấn đề khi đọc tệp: {e}")
+                sys.exit(EXIT_USAGE_ERROR)
         else:
             record_json = args[0]
 
         if not record_json:
-            print("Lưu ý: Dữ liệu JSON trống")
-            sys.exit(1)
+            log('ERROR', "Lưu ý: Dữ liệu JSON trống")
+            sys.exit(EXIT_USAGE_ERROR)
 
-        result = validate_record(record_json)
-        print("\n--- KẾT QUẢ PHÂN TÍCH ---")
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-        print("--- HẾT KẾT QUẢ ---")
+        exit_with_results([validate_record(record_json)], result_channel)
 
     except Exception as e:
-        print(f"Có vấn đề không mong đợi: {e}")
+        log('ERROR', f"Có vấn đề không mong đợi: {e}", errorType=type(e).__name__)
         error_result = {
             "approvalStatus": "PENDING",
             "fraudRisk": 50.0,
             "fraudType": "Cần hỗ trợ kỹ thuật",
             "reviewNote": f"Hệ thống gặp vấn đề và cần được hỗ trợ: {str(e)}"
         }
-        print("\n--- KẾT QUẢ PHÂN TÍCH ---")
-        print(json.dumps(error_result, ensure_ascii=False, indent=2))
-        print("--- HẾT KẾT QUẢ ---")
\ No newline at end of file
+        if result_channel is None:
+            print_result(error_result)
+        else:
+            write_result(result_channel, error_result)
+            sys.exit(EXIT_INTERNAL_ERROR)
+    finally:
+        if metrics_exporter is not None:
+            metrics_exporter.stop()
@@ -0,0 +1,248 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmark import summarize
+from history_stub import HistoryStubServer
+from lenient_json import decode_record
+from online_detector import detection_summary
+
+STATUSES = ['APPROVED', 'PENDING', 'REJECTED']
+CURRENT_CONFIG = {'name': 'current'}
+SHARDS_PER_WORKER = 2
+VERDICT_LABEL_TYPES = {
+    "Tốc độ xuất sắc": "Sử dụng phương tiện",
+    "Tốc độ cần xác nhận": "Sử dụng phương tiện",
+    "Tốc độ bất ngờ": "Sử dụng phương tiện",
+    "Di chuyển không ghi nhận bước chân": "Sử dụng phương tiện",
+    "Chiều dài bước đặc biệt": "Đi tắt đường",
+    "Chiều dài bước cần kiểm tra": "Đi tắt đường",
+    "Nhịp độ bước cần xác nhận": "Khai báo sai số bước",
+    "Số bước khác thường": "Khai báo sai số bước",
+    "Nhịp tim cần kiểm tra": "Nhịp tim bất thường",
+    "Nhịp tim khác thường": "Nhịp tim bất thường"
+}
+
+_active_config = None
+
+def load_config(path):
+    if not path or path == 'current':
+        return dict(CURRENT_CONFIG)
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return config
+
+def load_archive(path):
+    lines, records = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            lines.append(line)
+            try:
+                record = decode_record(line)
+            except (json.JSONDecodeError, ValueError):
+                record = None
+            records.append(record if isinstance(record, dict) else None)
+    return lines, records
+
+def history_records(records):
+    judged = any('approvalStatus' in record for record in records if record is not None)
+    return [record for record in records
+            if record is not None and (not judged or record.get('approvalStatus') == 'APPROVED')]
+
+def record_label(record):
+    label = record.get('label') if record is not None else None
+    if not isinstance(label, dict):
+        return None
+    return bool(label.get('isFraud')), label.get('fraudType')
+
+def apply_config(config, history_url):
+    global _active_config
+    if _active_config == (config, history_url):
+        return
+
+    import record_validator
+    from diagnostics import configure_logging
+    configure_logging('ERROR')
+    record_validator.configure_rules(config.get('rules'))
+    record_validator.configure_baselines(config.get('baselines'))
+    record_validator.configure_anomaly_models(config.get('models'), config.get('modelVersion'))
+    record_validator.configure_history_window(int(config.get('historyDays', 7)), config.get('historyMaxRecords'))
+    record_validator.configure_history_client(base_url=history_url, cache_ttl=0)
+    _active_config = (config, history_url)
+
+def replay_shard(config, history_url, indices, lines):
+    import record_validator
+    apply_config(config, history_url)
+
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index, line in zip(indices, lines):
+            start = time.perf_counter()
+            result = record_validator.validate_record(line)
+            results.append((index, result['approvalStatus'], result.get('fraudType'), time.perf_counter() - start))
+    return results
+
+def verdict_matrix(baseline_statuses, candidate_statuses):
+    matrix = {status: {other: 0 for other in STATUSES} for status in STATUSES}
+    for baseline_status, candidate_status in zip(baseline_statuses, candidate_statuses):
+        matrix[baseline_status][candidate_status] += 1
+    return matrix
+
+def label_type(fraud_type, type_map=VERDICT_LABEL_TYPES):
+    return type_map.get(fraud_type, fraud_type)
+
+def fraud_type_summary(flags, fraud_types, labels, type_map=VERDICT_LABEL_TYPES):
+    flags = np.asarray(flags, dtype=bool)
+    predicted = np.asarray([label_type(fraud_type, type_map) if flag else None
+                            for flag, fraud_type in zip(flags, fraud_types)], dtype=object)
+    actual = np.asarray([label[1] if label[0] else None for label in labels], dtype=object)
+
+    summary = {}
+    for fraud_type in sorted({value for value in actual if value is not None}):
+        is_type = actual == fraud_type
+        predicted_type = predicted == fraud_type
+        true_positive = int((is_type & predicted_type).sum())
+        summary[fraud_type] = {
+            'records': int(is_type.sum()),
+            'precision': true_positive / predicted_type.sum() if predicted_type.sum() else 0.0,
+            'recall': true_positive / is_type.sum(),
+            'detection_rate': float(flags[is_type].mean())
+        }
+    return summary
+
+def recorded_status(record):
+    status = record.get('approvalStatus') if record is not None else None
+    return status if status in STATUSES else None
+
+def config_report(config, results, labels, recorded, type_map=VERDICT_LABEL_TYPES):
+    statuses = [status for status, _, _ in results]
+    latencies = [latency for _, _, latency in results]
+    flags = [status != 'APPROVED' for status in statuses]
+    report = {
+        'config': config,
+        'verdicts': {status: statuses.count(status) for status in STATUSES},
+        'latency': summarize(latencies, 1) if latencies else None
+    }
+
+    labeled = [row for row, label in enumerate(labels) if label is not None]
+    if labeled:
+        labeled_flags = [flags[row] for row in labeled]
+        report['detection'] = detection_summary(labeled_flags, [labels[row][0] for row in labeled])
+        report['fraud_types'] = fraud_type_summary(labeled_flags, [results[row][1] for row in labeled],
+                                                   [labels[row] for row in labeled], type_map)
+
+    judged = [row for row, status in enumerate(recorded) if status is not None]
+    if judged:
+        report['recorded_matrix'] = verdict_matrix([recorded[row] for row in judged], [statuses[row] for row in judged])
+    return report
+
+def run_replay(lines, records, configs, workers=None, type_map=VERDICT_LABEL_TYPES):
+    workers = workers or os.cpu_count() or 1
+    server = HistoryStubServer(history_records(records)).start()
+    try:
+        n_shards = max(1, min(len(lines), workers * SHARDS_PER_WORKER))
+        shards = [list(range(shard, len(lines), n_shards)) for shard in range(n_shards)]
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(position, executor.submit(replay_shard, config, server.base_url, indices,
+                                                  [lines[index] for index in indices]))
+                       for position, config in enumerate(configs) for indices in shards]
+            results = [[None] * len(lines) for _ in configs]
+            for position, future in futures:
+                for index, status, fraud_type, latency in future.result():
+                    results[position][index] = (status, fraud_type, latency)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    labels = [record_label(record) for record in records]
+    recorded = [recorded_status(record) for record in records]
+    report = {
+        'records': len(lines),
+        'labeled_records': sum(label is not None for label in labels),
+        'judged_records': sum(status is not None for status in recorded),
+        'workers': workers,
+        'elapsed_s': elapsed,
+        'configs': [config_report(config, config_results, labels, recorded, type_map) for config, config_results in zip(configs, results)]
+    }
+    if len(configs) == 2:
+        baseline, candidate = ([status for status, _, _ in config_results] for config_results in results)
+        changed = [index for index, (old, new) in enumerate(zip(baseline, candidate)) if old != new]
+        report['verdict_matrix'] = verdict_matrix(baseline, candidate)
+        report['changed_records'] = [{
+            'index': index,
+            'id': None if records[index] is None else records[index].get('id'),
+            'baseline': baseline[index],
+            'candidate': candidate[index]
+        } for index in changed]
+    return report
+
+def print_matrix(title, matrix):
+    print(title)
+    print(f"{'':<12}" + "".join(f"{status:>12}" for status in STATUSES))
+    for status, row in matrix.items():
+        print(f"{status:<12}" + "".join(f"{row[other]:>12}" for other in STATUSES))
+
+def print_report(report):
+    print(f"Đã phát lại {report['records']} bản ghi ({report['labeled_records']} bản ghi có nhãn) "
+          f"với {report['workers']} tiến trình trong {report['elapsed_s']:.1f} giây")
+    for config_report in report['configs']:
+        latency = config_report['latency'] or {}
+        print(f"\n=== Cấu hình {config_report['config']['name']} ===")
+        print("Kết quả: " + ", ".join(f"{status} {count}" for status, count in config_report['verdicts'].items()))
+        print(f"Độ trễ: p50 {latency.get('p50_ms', 0):.2f} ms, p95 {latency.get('p95_ms', 0):.2f} ms, "
+              f"p99 {latency.get('p99_ms', 0):.2f} ms, {latency.get('throughput_per_s', 0):.0f} bản ghi/s mỗi tiến trình")
+        if 'detection' in config_report:
+            detection = config_report['detection']
+            print(f"Tổng thể: precision {detection['precision']:.3f}, recall {detection['recall']:.3f}, "
+                  f"tỉ lệ gắn cờ {detection['flag_rate']:.3f}")
+            print(f"{'Loại gian lận':<32}{'bản ghi':>10}{'precision':>12}{'recall':>10}{'phát hiện':>12}")
+            for fraud_type, summary in config_report['fraud_types'].items():
+                print(f"{fraud_type:<32}{summary['records']:>10}{summary['precision']:>12.3f}"
+                      f"{summary['recall']:>10.3f}{summary['detection_rate']:>12.3f}")
+        if 'recorded_matrix' in config_report:
+            print_matrix("Ma trận so với kết quả đã lưu (đã lưu theo hàng):", config_report['recorded_matrix'])
+
+    if 'verdict_matrix' in report:
+        baseline_name, candidate_name = (config_report['config']['name'] for config_report in report['configs'])
+        print_matrix(f"\n=== Ma trận kết quả ({baseline_name} theo hàng, {candidate_name} theo cột) ===",
+                     report['verdict_matrix'])
+        print(f"Số bản ghi thay đổi kết quả: {len(report['changed_records'])}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 1:
+        print("Hướng dẫn sử dụng: python replay_harness.py <tệp_jsonl_lưu_trữ> [--baseline <tệp_cấu_hình_json|current>] "
+              "[--candidate <tệp_cấu_hình_json|current>] [--workers <số_tiến_trình>] [--type-map <tệp_ánh_xạ_loại_json>] "
+              "[--output <tệp_báo_cáo_json>]")
+        sys.exit(1)
+
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    lines, records = load_archive(args[0])
+    configs = [load_config(option('--baseline', 'current'))]
+    if option('--candidate'):
+        configs.append(load_config(option('--candidate')))
+    workers = int(option('--workers')) if option('--workers') else None
+    type_map = dict(VERDICT_LABEL_TYPES)
+    if option('--type-map'):
+        with open(option('--type-map'), 'r', encoding='utf-8') as f:
+            type_map.update(json.load(f))
+
+    report = run_replay(lines, records, configs, workers, type_map)
+    print_report(report)
+    if option('--output'):
+        with open(option('--output'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã lưu báo cáo phát lại: {option('--output')}")
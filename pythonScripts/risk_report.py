@@ -0,0 +1,257 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+FRAUD_TYPE_WEIGHTS = {
+    "Bản ghi trùng giữa các tài khoản": 1.0,
+    "Phiên chạy trùng thời gian": 1.0,
+    "Vượt giới hạn quãng đường": 0.9,
+    "Sử dụng phương tiện": 1.0,
+    "Đi tắt đường": 0.8,
+    "Khai báo sai số bước": 0.6,
+    "Nhịp tim bất thường": 0.7,
+    "Tương quan bất thường": 0.5,
+    "Dữ liệu bất thường": 0.4
+}
+DEFAULT_RISK_CONFIG = {
+    'fraud_type_weights': FRAUD_TYPE_WEIGHTS,
+    'default_weight': 0.5,
+    'risk_levels': [[70, "Cao"], [40, "Trung bình"]],
+    'default_level': "Thấp"
+}
+FRAUD_AVERAGE_COLUMNS = ['AvgSpeed', 'DistancePerStep', 'TotalSteps', 'TotalDistance', 'heartRate']
+USER_COLUMNS = ['total_activities', 'fraud_count', 'fraud_ratio', 'risk_score', 'risk_level', 'worst_fraud_type']
+
+def load_risk_config(path=None, overrides=None):
+    config = {**DEFAULT_RISK_CONFIG, 'fraud_type_weights': dict(FRAUD_TYPE_WEIGHTS)}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = {**json.load(f), **(overrides or {})}
+    if overrides:
+        overrides = dict(overrides)
+        config['fraud_type_weights'].update(overrides.pop('fraud_type_weights', {}))
+        config.update(overrides)
+    config['risk_levels'] = sorted(config['risk_levels'], key=lambda level: level[0], reverse=True)
+    return config
+
+def user_id_column(df):
+    return 'UserId' if 'UserId' in df.columns else 'Id'
+
+def json_value(value):
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def native_records(df):
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def fraud_type_counts(fraud_df, user_id_col):
+    counts = fraud_df.groupby([user_id_col, 'FraudType'], sort=False).size().reset_index(name='count')
+    counts['first_seen'] = np.arange(len(counts))
+    return counts.sort_values(['count', 'first_seen'], ascending=[False, True], kind='stable')
+
+def risk_levels(risk_score, config):
+    conditions = [risk_score >= threshold for threshold, _ in config['risk_levels']]
+    return np.select(conditions, [level for _, level in config['risk_levels']], config['default_level']).astype(object)
+
+class RiskReport:
+    def __init__(self, totals, fraud_types, users, user_fraud_types, events, user_id_col):
+        self.totals = totals
+        self.fraud_types = fraud_types
+        self.users = users
+        self.user_fraud_types = user_fraud_types
+        self.events = events
+        self.user_id_col = user_id_col
+
+    def fraud_users(self):
+        return self.users[self.users['fraud_count'] > 0]
+
+    def user_risk_scores(self, fraud_only=False):
+        users = self.fraud_users() if fraud_only else self.users
+        return {
+            user_id: {
+                "risk_score": risk_score,
+                "risk_level": risk_level,
+                "fraud_count": fraud_count,
+                "total_activities": total_activities,
+                "fraud_ratio": fraud_ratio
+            }
+            for user_id, total_activities, fraud_count, fraud_ratio, risk_score, risk_level in zip(
+                users.index, users['total_activities'].tolist(), users['fraud_count'].tolist(),
+                users['fraud_ratio'].tolist(), users['risk_score'].tolist(), users['risk_level'].tolist())
+        }
+
+    def fraud_types_by_user(self):
+        by_user = {}
+        for user_id, fraud_type, count in zip(self.user_fraud_types[self.user_id_col], self.user_fraud_types['FraudType'],
+                                              self.user_fraud_types['count'].tolist()):
+            by_user.setdefault(user_id, {})[fraud_type] = count
+        return by_user
+
+    def to_dict(self, fraud_only=False):
+        users = self.fraud_users() if fraud_only else self.users
+        fraud_types_by_user = self.fraud_types_by_user()
+        average_columns = [col for col in users.columns if col.startswith('fraud_avg_')]
+        user_rows = native_records(users)
+        return {
+            "totals": {key: json_value(value) for key, value in self.totals.items()},
+            "fraud_types": native_records(self.fraud_types),
+            "events": native_records(self.events) if self.events is not None else [],
+            "users": [{
+                "user_id": json_value(user_id),
+                **{col: row[col] for col in USER_COLUMNS},
+                "fraud_types": fraud_types_by_user.get(user_id, {}),
+                "fraud_averages": {col[len('fraud_avg_'):]: row[col] for col in average_columns}
+            } for user_id, row in zip(users.index, user_rows)]
+        }
+
+    def write_json(self, path, fraud_only=False):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(fraud_only), f, ensure_ascii=False, indent=2)
+
+    def write_csv(self, path, fraud_only=False):
+        users = self.fraud_users() if fraud_only else self.users
+        by_type = self.user_fraud_types.pivot_table(index=self.user_id_col, columns='FraudType', values='count',
+                                                    aggfunc='sum', fill_value=0)
+        by_type = by_type.reindex(users.index, fill_value=0).add_prefix('fraud_type:')
+        users.join(by_type).rename_axis('user_id').to_csv(path, encoding='utf-8')
+
+    def summary_lines(self):
+        totals = self.totals
+        lines = [
+            "\n=== BÁO CÁO PHÁT HIỆN GIAN LẬN ===",
+            f"Tổng số bản ghi phân tích: {totals['records']}",
+            f"Tổng số người dùng: {totals['users']}",
+            f"Số bản ghi gian lận: {totals['fraud_records']} ({totals['fraud_record_ratio']*100:.2f}%)",
+            f"Số người dùng gian lận: {totals['fraud_users']} ({totals['fraud_user_ratio']*100:.2f}%)"
+        ]
+        if totals['fraud_records'] > 0:
+            lines.append("\nThống kê theo loại gian lận:")
+            for fraud_type, count, share in zip(self.fraud_types['fraud_type'], self.fraud_types['count'], self.fraud_types['share']):
+                lines.append(f"- {fraud_type}: {count} trường hợp ({share*100:.2f}%)")
+
+        lines.append("\nBáo cáo rủi ro theo người dùng:")
+        users = self.fraud_users()
+        for user_id, risk_score, risk_level, fraud_count, total_activities, fraud_ratio in zip(
+                users.index, users['risk_score'], users['risk_level'], users['fraud_count'],
+                users['total_activities'], users['fraud_ratio']):
+            lines.append(f"- Người dùng {user_id}:")
+            lines.append(f"  + Điểm rủi ro: {risk_score:.1f}/100 (Mức: {risk_level})")
+            lines.append(f"  + Số hoạt động gian lận: {fraud_count}/{total_activities} ({fraud_ratio*100:.1f}%)")
+        return lines
+
+    def detail_lines(self, fraud_user_order=None):
+        lines = [f"\n=== Phân tích chi tiết {self.totals['fraud_records']} trường hợp gian lận ==="]
+        if self.totals['fraud_records'] == 0:
+            lines.append("Không có trường hợp gian lận được phát hiện.")
+            return lines
+
+        lines.append("\nPhân loại các trường hợp gian lận:")
+        for fraud_type, count in zip(self.fraud_types['fraud_type'], self.fraud_types['count']):
+            lines.append(f"- {fraud_type}: {count} trường hợp")
+
+        users = self.fraud_users()
+        if fraud_user_order is not None:
+            users = users.reindex(fraud_user_order)
+        lines.append(f"\nSố người dùng có dấu hiệu gian lận: {len(users)}")
+
+        fraud_types_by_user = self.fraud_types_by_user()
+        average_formats = [
+            ('fraud_avg_AvgSpeed', "  + Tốc độ: {:.2f} km/h"),
+            ('fraud_avg_DistancePerStep', "  + Khoảng cách/bước: {:.5f} km"),
+            ('fraud_avg_TotalSteps', "  + Số bước: {:.0f}"),
+            ('fraud_avg_TotalDistance', "  + Quãng đường: {:.2f} km"),
+            ('fraud_avg_heartRate', "  + Nhịp tim: {:.1f} bpm")
+        ]
+        for user_id, row in zip(users.index, users.to_dict('records')):
+            lines.append(f"\nNgười dùng {user_id}:")
+            lines.append(f"- Tổng số hoạt động: {row['total_activities']}")
+            lines.append(f"- Số hoạt động gian lận: {row['fraud_count']} ({row['fraud_ratio']*100:.1f}%)")
+            for fraud_type, count in fraud_types_by_user.get(user_id, {}).items():
+                lines.append(f"  + {fraud_type}: {count} trường hợp")
+            lines.append("- Thông số trung bình trong các hoạt động gian lận:")
+            for col, format_str in average_formats:
+                if col in row and (col != 'fraud_avg_heartRate' or not pd.isna(row[col])):
+                    lines.append(format_str.format(row[col]))
+        return lines
+
+def build_risk_report(df, config=None):
+    config = config or load_risk_config()
+    user_id_col = user_id_column(df)
+    user_ids = df[user_id_col]
+    is_fraud = (df['IsFraud'] == 1).to_numpy() if 'IsFraud' in df.columns else np.zeros(len(df), dtype=bool)
+    fraud_df = df[is_fraud]
+    if 'FraudType' not in fraud_df.columns:
+        fraud_df = fraud_df.assign(FraudType="Dữ liệu bất thường")
+
+    grouped = pd.Series(is_fraud, index=df.index).groupby(user_ids, sort=False)
+    users = pd.DataFrame({'total_activities': grouped.size(), 'fraud_count': grouped.sum().astype(int)})
+    users['fraud_ratio'] = users['fraud_count'] / users['total_activities']
+
+    user_fraud_types = fraud_type_counts(fraud_df, user_id_col)
+    worst = user_fraud_types.drop_duplicates(user_id_col).set_index(user_id_col)['FraudType']
+    users['worst_fraud_type'] = worst.reindex(users.index)
+    weights = users['worst_fraud_type'].map(config['fraud_type_weights']).astype(float).fillna(config['default_weight'])
+    risk_score = users['fraud_ratio'] * 100 * np.where(users['fraud_count'] > 0, 1 + weights, 1)
+    users['risk_score'] = risk_score.clip(0, 100)
+    users['risk_level'] = risk_levels(users['risk_score'].to_numpy(), config)
+
+    average_columns = [col for col in FRAUD_AVERAGE_COLUMNS if col in fraud_df.columns]
+    if average_columns:
+        averages = fraud_df.groupby(user_id_col, sort=False)[average_columns].mean()
+        users = users.join(averages.add_prefix('fraud_avg_'))
+
+    fraud_types = fraud_df['FraudType'].value_counts().rename_axis('fraud_type').reset_index(name='count')
+    fraud_types['share'] = fraud_types['count'] / max(len(fraud_df), 1)
+
+    events = None
+    if 'EventId' in df.columns:
+        event_grouped = df.assign(_fraud=is_fraud, _fraud_user=user_ids.where(is_fraud)).groupby('EventId', sort=False)
+        events = pd.DataFrame({
+            'records': event_grouped.size(),
+            'users': event_grouped[user_id_col].nunique(),
+            'fraud_records': event_grouped['_fraud'].sum().astype(int),
+            'fraud_users': event_grouped['_fraud_user'].nunique()
+        }).rename_axis('event_id').reset_index()
+
+    total_users = len(users)
+    fraud_users = int((users['fraud_count'] > 0).sum())
+    totals = {
+        'records': len(df),
+        'users': total_users,
+        'fraud_records': len(fraud_df),
+        'fraud_users': fraud_users,
+        'fraud_record_ratio': len(fraud_df) / len(df) if len(df) else 0.0,
+        'fraud_user_ratio': fraud_users / total_users if total_users else 0.0,
+        'mean_risk_score': float(users['risk_score'].mean()) if total_users else 0.0
+    }
+    return RiskReport(totals, fraud_types, users[USER_COLUMNS + [col for col in users.columns if col not in USER_COLUMNS]],
+                      user_fraud_types[[user_id_col, 'FraudType', 'count']], events, user_id_col)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) < 1:
+        print("Hướng dẫn sử dụng: python risk_report.py <tệp_dữ_liệu_csv_hoặc_jsonl> [--workers <số_tiến_trình>] [--risk-config <tệp_json>]")
+        print("                   [--json <tệp_json>] [--csv <tệp_csv>] [--fraud-only]")
+        sys.exit(1)
+
+    from module import load_marathon_data
+    from population_scan import scan_population
+
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else 1
+    config = load_risk_config(args[args.index('--risk-config') + 1] if '--risk-config' in args else None)
+    fraud_only = '--fraud-only' in args
+
+    analyzed_df, _, _ = scan_population(load_marathon_data(args[0]), workers=workers, risk_config=config)
+    report = build_risk_report(analyzed_df, config)
+    print("\n".join(report.summary_lines()))
+    if '--json' in args:
+        report.write_json(args[args.index('--json') + 1], fraud_only)
+        print(f"Đã lưu báo cáo rủi ro: {args[args.index('--json') + 1]}")
+    if '--csv' in args:
+        report.write_csv(args[args.index('--csv') + 1], fraud_only)
+        print(f"Đã lưu báo cáo rủi ro: {args[args.index('--csv') + 1]}")
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import math
+import operator
+import os
+import sys
+
+from run_record import DEFAULT_EVENT_ID, approval_status, is_missing
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'validation_rules.json')
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+_rule_book = None
+
+def spec_digest(spec):
+    canonical = json.dumps(spec, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+def resolve_value(value, params):
+    if isinstance(value, str) and value.startswith('$'):
+        if value[1:] not in params:
+            raise ValueError(f"Không tìm thấy tham số luật {value[1:]}")
+        return params[value[1:]]
+    return value
+
+def compile_conditions(conditions, params):
+    compiled = []
+    for feature, op, value in conditions or []:
+        if op not in OPERATORS:
+            raise ValueError(f"Toán tử luật không hợp lệ: {op}")
+        compiled.append((feature, OPERATORS[op], resolve_value(value, params)))
+    return compiled
+
+def row_features(features, index):
+    import numpy as np
+    return {name: values[index] if np.ndim(values) else values for name, values in features.items()}
+
+class Rule:
+    __slots__ = ('id', 'when', 'unless', 'optional', 'risk', 'fraud_type', 'review_note', 'append_note', 'rank')
+
+    def __init__(self, spec, params, section_spec, position):
+        self.id = spec.get('id', str(position))
+        self.when = compile_conditions(spec.get('when'), params)
+        self.unless = compile_conditions(spec.get('unless'), params)
+        self.optional = frozenset(spec.get('optional', ()))
+        self.risk = float(resolve_value(spec.get('risk', 0), params))
+        self.fraud_type = spec.get('fraudType', section_spec.get('fraudType'))
+        self.review_note = spec.get('reviewNote', section_spec.get('reviewNote'))
+        self.append_note = spec.get('appendNote')
+        self.rank = (spec.get('priority', position), position)
+
+    def features(self):
+        return {feature for feature, _, _ in self.when + self.unless}
+
+    def matches(self, features):
+        for feature, compare, value in self.when:
+            current = features.get(feature)
+            if current is None:
+                if feature in self.optional:
+                    continue
+                return False
+            if not compare(current, value):
+                return False
+        if self.unless:
+            return not all(features.get(feature) is not None and compare(features[feature], value)
+                           for feature, compare, value in self.unless)
+        return True
+
+    def mask(self, features, size):
+        import numpy as np
+        mask = np.ones(size, dtype=bool)
+        for feature, compare, value in self.when:
+            current = features.get(feature)
+            if current is None:
+                if feature in self.optional:
+                    continue
+                return np.zeros(size, dtype=bool)
+            mask &= compare(current, value)
+        if self.unless:
+            holds = np.ones(size, dtype=bool)
+            for feature, compare, value in self.unless:
+                current = features.get(feature)
+                holds &= False if current is None else compare(current, value)
+            mask &= ~holds
+        return mask
+
+class RuleSet:
+    def __init__(self, section_spec, params):
+        self.rules = [Rule(spec, params, section_spec, position) for position, spec in enumerate(section_spec.get('rules', []))]
+        self.order = sorted(range(len(self.rules)), key=lambda index: self.rules[index].rank)
+        self.default = section_spec.get('default')
+
+    def features(self):
+        return set().union(*(rule.features() for rule in self.rules))
+
+    def result(self, fired, features):
+        default = self.default or {}
+        if not fired and self.default is None:
+            return None
+
+        fraud_risk = max((rule.risk for rule in fired), default=0.0)
+        typed = [rule for rule in fired if rule.fraud_type is not None]
+        noted = [rule for rule in fired if rule.review_note is not None]
+        fraud_type = max(typed, key=lambda rule: rule.rank).fraud_type if typed else default.get('fraudType')
+        if noted:
+            review_note = max(noted, key=lambda rule: rule.rank).review_note.format_map(features)
+        else:
+            review_note = default.get('reviewNote')
+        for rule in fired:
+            if rule.append_note:
+                review_note = f"{review_note} {rule.append_note}"
+        return {
+            "approvalStatus": approval_status(fraud_risk),
+            "fraudRisk": float(fraud_risk),
+            "fraudType": fraud_type,
+            "reviewNote": review_note
+        }
+
+    def score(self, features):
+        return self.result([rule for rule in self.rules if rule.matches(features)], features)
+
+    def evaluate(self, features, size, notes=True):
+        import numpy as np
+        masks = [rule.mask(features, size) for rule in self.rules]
+        fired = np.zeros(size, dtype=bool)
+        fraud_risk = np.zeros(size)
+        fraud_type = np.full(size, None, dtype=object)
+        note_rule = np.full(size, -1)
+        for index in self.order:
+            rule, mask = self.rules[index], masks[index]
+            fired |= mask
+            fraud_risk = np.where(mask, np.maximum(fraud_risk, rule.risk), fraud_risk)
+            if rule.fraud_type is not None:
+                fraud_type[mask] = rule.fraud_type
+            if rule.review_note is not None:
+                note_rule[mask] = index
+
+        default = self.default or {}
+        fraud_type[fraud_type == None] = default.get('fraudType')
+        if not notes:
+            return fired, fraud_risk, fraud_type, None
+
+        review_note = np.full(size, default.get('reviewNote'), dtype=object)
+        for row in np.flatnonzero(note_rule >= 0):
+            review_note[row] = self.rules[note_rule[row]].review_note.format_map(row_features(features, row))
+        for rule, mask in zip(self.rules, masks):
+            if rule.append_note:
+                for row in np.flatnonzero(mask):
+                    review_note[row] = f"{review_note[row]} {rule.append_note}"
+        return fired, fraud_risk, fraud_type, review_note
+
+    def score_many(self, features, size):
+        fired, fraud_risk, fraud_type, review_note = self.evaluate(features, size)
+        results = []
+        for row in range(size):
+            if not fired[row] and self.default is None:
+                results.append(None)
+                continue
+            results.append({
+                "approvalStatus": approval_status(fraud_risk[row]),
+                "fraudRisk": float(fraud_risk[row]),
+                "fraudType": fraud_type[row],
+                "reviewNote": review_note[row]
+            })
+        return results
+
+class RuleBook:
+    def __init__(self, spec):
+        self.version = spec.get('version')
+        self.digest = spec_digest(spec)
+        self.params = dict(spec.get('params', {}))
+        self.sections = spec.get('sections', {})
+        self.compiled = {DEFAULT_EVENT_ID: self.compile_sections(self.params, {})}
+        for event_id, event_spec in spec.get('events', {}).items():
+            self.compiled[str(event_id)] = self.compile_sections({**self.params, **event_spec.get('params', {})},
+                                                                 event_spec.get('sections', {}))
+
+    def compile_sections(self, params, section_overrides):
+        return {section: RuleSet(section_overrides.get(section, section_spec), params)
+                for section, section_spec in self.sections.items()}
+
+    def rule_set(self, section, event_id=None):
+        rule_sets = self.compiled.get(str(event_id) if event_id is not None else DEFAULT_EVENT_ID,
+                                      self.compiled[DEFAULT_EVENT_ID])
+        if section not in rule_sets:
+            raise ValueError(f"Không tìm thấy nhóm luật {section}")
+        return rule_sets[section]
+
+    def event_groups(self, section, event_ids):
+        import numpy as np
+        if event_ids is None or len(self.compiled) == 1:
+            return [(self.rule_set(section), None)]
+        event_ids = np.asarray([str(event_id) if not is_missing(event_id) else DEFAULT_EVENT_ID for event_id in event_ids])
+        groups = {}
+        for event_id in np.unique(event_ids):
+            rule_set = self.rule_set(section, event_id if event_id in self.compiled else None)
+            groups.setdefault(id(rule_set), (rule_set, []))[1].append(event_id)
+        if len(groups) == 1:
+            return [(next(iter(groups.values()))[0], None)]
+        return [(rule_set, np.flatnonzero(np.isin(event_ids, group_ids))) for rule_set, group_ids in groups.values()]
+
+    def score(self, section, features, event_id=None):
+        return self.rule_set(section, event_id).score(features)
+
+    def score_many(self, section, features, size, event_ids=None):
+        import numpy as np
+        results = [None] * size
+        for rule_set, rows in self.event_groups(section, event_ids):
+            if rows is None:
+                return rule_set.score_many(features, size)
+            subset = {name: values[rows] if np.ndim(values) else values for name, values in features.items()}
+            for row, result in zip(rows, rule_set.score_many(subset, len(rows))):
+                results[row] = result
+        return results
+
+    def evaluate(self, section, features, size, event_ids=None, notes=True):
+        import numpy as np
+        groups = self.event_groups(section, event_ids)
+        if groups[0][1] is None:
+            return groups[0][0].evaluate(features, size, notes)
+        fired = np.zeros(size, dtype=bool)
+        fraud_risk = np.zeros(size)
+        fraud_type = np.full(size, None, dtype=object)
+        review_note = np.full(size, None, dtype=object) if notes else None
+        for rule_set, rows in groups:
+            subset = {name: values[rows] if np.ndim(values) else values for name, values in features.items()}
+            fired[rows], fraud_risk[rows], fraud_type[rows], group_notes = rule_set.evaluate(subset, len(rows), notes)
+            if notes:
+                review_note[rows] = group_notes
+        return fired, fraud_risk, fraud_type, review_note
+
+def load_rule_spec(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if not path.endswith(('.yaml', '.yml')):
+            return json.load(f)
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Cần cài đặt pyyaml để đọc tệp luật YAML")
+        return yaml.safe_load(f)
+
+def load_rule_book(path=None):
+    return RuleBook(load_rule_spec(path or DEFAULT_RULES_PATH))
+
+def configure_rules(path=None):
+    global _rule_book
+    _rule_book = load_rule_book(path or os.getenv('VALIDATION_RULES'))
+    return _rule_book
+
+def get_rule_book():
+    if _rule_book is None:
+        configure_rules()
+    return _rule_book
+
+def record_features(run):
+    steps, distance, time_taken = run.steps, run.distance, run.time_taken
+    return {
+        'steps': steps,
+        'distance': distance,
+        'time_taken': time_taken,
+        'heart_rate': math.nan if is_missing(run.heart_rate) else run.heart_rate,
+        'speed': distance / (time_taken / 60) if time_taken > 0 else 0,
+        'distance_per_step': distance * 1000 / steps if steps > 0 else 0,
+        'steps_per_minute': steps / time_taken if time_taken > 0 else 0
+    }
+
+def frame_record_features(record_df):
+    import numpy as np
+    steps = record_df['TotalSteps'].to_numpy(dtype=float)
+    distance = record_df['TotalDistance'].to_numpy(dtype=float)
+    time_taken = record_df['TimeTaken'].to_numpy(dtype=float)
+    if 'heartRate' in record_df.columns:
+        heart_rate = record_df['heartRate'].to_numpy(dtype=float)
+    else:
+        heart_rate = np.full(len(record_df), np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'steps': steps,
+            'distance': distance,
+            'time_taken': time_taken,
+            'heart_rate': heart_rate,
+            'speed': np.where(time_taken > 0, distance / (time_taken / 60), 0),
+            'distance_per_step': np.where(steps > 0, distance * 1000 / steps, 0),
+            'steps_per_minute': np.where(time_taken > 0, steps / time_taken, 0)
+        }
+
+def history_features(deviations, step_distance_correlation, if_flagged, lof_flagged):
+    return {
+        'step_deviation': abs(deviations.get('StepDeviation', 0.0)),
+        'speed_deviation': abs(deviations.get('SpeedDeviation', 0.0)),
+        'distance_per_step_deviation': abs(deviations.get('DistPerStepDeviation', 0.0)),
+        'heart_rate_deviation': abs(deviations.get('HeartRateDeviation', 0.0)),
+        'step_distance_correlation': step_distance_correlation,
+        'if_flagged': bool(if_flagged),
+        'lof_flagged': bool(lof_flagged)
+    }
+
+def frame_features(df, names):
+    return {name: df[name].to_numpy(dtype=float) for name in names if name in df.columns}
+
+def frame_event_ids(df):
+    return df['EventId'].to_numpy() if 'EventId' in df.columns else None
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Hướng dẫn sử dụng: python rules.py <tệp_luật_json_hoặc_yaml>")
+        sys.exit(1)
+
+    rule_book = load_rule_book(sys.argv[1])
+    for event_id, rule_sets in rule_book.compiled.items():
+        counts = ", ".join(f"{section}: {len(rule_set.rules)}" for section, rule_set in rule_sets.items())
+        print(f"Sự kiện {event_id} - {counts}")
@@ -0,0 +1,152 @@
+import math
+from datetime import datetime, timedelta
+
+def safe_get(data, key, default=None):
+    return data.get(key, default) if isinstance(data, dict) else default
+
+def safe_get_nested(data, keys, default=None):
+    current = data
+    for key in keys:
+        if isinstance(current, dict) and key in current:
+            current = current[key]
+        else:
+            return default
+    return current
+
+def safe_get_numeric(data, key, default=0, allow_none=False):
+    value = safe_get(data, key, default)
+    if value is None and allow_none:
+        return None
+    try:
+        return float(value) if value is not None else default
+    except (ValueError, TypeError):
+        return default
+
+DEFAULT_EVENT_ID = 'default'
+EPOCH = datetime(1970, 1, 1)
+SAMPLE_FIELDS = ('samples', 'splits')
+
+def record_event_id(record):
+    event_id = safe_get(record, 'eventId')
+    if event_id is None:
+        event_id = safe_get_nested(record, ['event', 'id'])
+    return str(event_id) if event_id is not None else DEFAULT_EVENT_ID
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def parse_timestamp(value):
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        if is_missing(value) or value == '':
+            return None
+        try:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(tz=None).replace(tzinfo=None)
+    return moment
+
+def end_time_seconds(value):
+    moment = parse_timestamp(value)
+    return None if moment is None else int((moment - EPOCH).total_seconds())
+
+def frame_time_seconds(df, column):
+    import numpy as np
+    import pandas as pd
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    codes, uniques = pd.factorize(df[column])
+    seconds = np.array([end_time_seconds(value) for value in uniques], dtype=float)
+    return np.where(codes >= 0, seconds[np.maximum(codes, 0)] if len(seconds) else np.nan, np.nan)
+
+def frame_end_seconds(df):
+    return frame_time_seconds(df, 'EndTime' if 'EndTime' in df.columns else 'Timestamp')
+
+def frame_start_seconds(df):
+    return frame_time_seconds(df, 'StartTime')
+
+def history_bounds(days, end_time=None):
+    end = parse_timestamp(end_time) or datetime.now()
+    return end - timedelta(days=days), end
+
+class RunRecord:
+    __slots__ = ('id', 'user_id', 'steps', 'distance', 'time_taken', 'avg_speed', 'end_time', 'heart_rate', 'trajectory',
+                 'event_id', 'start_time')
+
+    def __init__(self, id, user_id, steps, distance, time_taken, avg_speed, end_time, heart_rate, trajectory=None,
+                 event_id=DEFAULT_EVENT_ID, start_time=None):
+        self.id = id
+        self.user_id = user_id
+        self.steps = steps
+        self.distance = distance
+        self.time_taken = time_taken
+        self.avg_speed = avg_speed
+        self.end_time = end_time
+        self.heart_rate = heart_rate
+        self.trajectory = trajectory
+        self.event_id = event_id
+        self.start_time = start_time
+
+    @classmethod
+    def from_dict(cls, record):
+        trajectory = None
+        if any(safe_get(record, field) for field in SAMPLE_FIELDS):
+            from trajectory import record_trajectory
+            trajectory = record_trajectory(record)
+        return cls(
+            safe_get(record, 'id', ''),
+            safe_get_nested(record, ['user', 'id'], ''),
+            safe_get_numeric(record, 'steps', 0),
+            safe_get_numeric(record, 'distance', 0.0),
+            safe_get_numeric(record, 'timeTaken', 0),
+            safe_get_numeric(record, 'avgSpeed', 0.0),
+            safe_get(record, 'endTime', ''),
+            safe_get_numeric(record, 'heartRate', None, allow_none=True),
+            trajectory,
+            record_event_id(record),
+            safe_get(record, 'startTime')
+        )
+
+    def to_row(self):
+        row = {
+            'Id': self.id,
+            'UserId': self.user_id,
+            'TotalSteps': self.steps,
+            'TotalDistance': self.distance,
+            'TimeTaken': self.time_taken,
+            'AvgSpeed': self.avg_speed,
+            'EndTime': self.end_time,
+            'StartTime': self.start_time,
+            'heartRate': self.heart_rate,
+            'EventId': self.event_id
+        }
+        if self.trajectory is not None:
+            row.update(self.trajectory)
+        return row
+
+def basic_conditions_result(run):
+    from rules import get_rule_book, record_features
+    return get_rule_book().score('basic_conditions', record_features(run), run.event_id)
+
+def basic_conditions_ok(run):
+    return basic_conditions_result(run) is None
+
+def approval_status(fraud_risk):
+    if fraud_risk >= 70:
+        return "REJECTED"
+    if fraud_risk >= 40:
+        return "PENDING"
+    return "APPROVED"
+
+def validate_run_record(run):
+    from population_baselines import get_baselines
+    from rules import get_rule_book, record_features
+    features = record_features(run)
+    baselines = get_baselines()
+    if baselines is None:
+        return get_rule_book().score('single_record', features, run.event_id)
+    features.update(baselines.percentile_features(features, run.event_id))
+    return get_rule_book().score('cold_start', features, run.event_id)
@@ -0,0 +1,107 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from run_record import end_time_seconds, frame_end_seconds, frame_start_seconds
+
+DAY_SECONDS = 24 * 3600
+SESSION_HISTORY_DAYS = 7
+WEEK_SECONDS = SESSION_HISTORY_DAYS * DAY_SECONDS
+OVERLAP_TOLERANCE = 60
+USER_KEY_SHIFT = 34
+
+def session_starts(end_seconds, time_taken, start_seconds=None):
+    starts = end_seconds - np.nan_to_num(np.asarray(time_taken, dtype=float))
+    if start_seconds is not None:
+        starts = np.where(np.isnan(start_seconds), starts, start_seconds)
+    return np.round(starts)
+
+class SessionIndex:
+    def __init__(self, starts, ends, distances):
+        valid = ~np.isnan(starts) & ~np.isnan(ends)
+        order = np.argsort(ends[valid], kind='stable')
+        self.starts = np.sort(starts[valid])
+        self.ends = ends[valid][order]
+        self.distance_sums = np.concatenate([[0.0], np.cumsum(np.nan_to_num(distances[valid][order]))])
+
+    @classmethod
+    def from_frame(cls, history_df):
+        ends = frame_end_seconds(history_df)
+        starts = session_starts(ends, history_df['TimeTaken'], frame_start_seconds(history_df))
+        return cls(starts, ends, history_df['TotalDistance'].to_numpy(dtype=float))
+
+    def overlapping(self, start, end):
+        if end - start <= 2 * OVERLAP_TOLERANCE:
+            return 0
+        started = np.searchsorted(self.starts, end - OVERLAP_TOLERANCE, side='left')
+        finished = np.searchsorted(self.ends, start + OVERLAP_TOLERANCE, side='right')
+        return int(started - finished)
+
+    def volume(self, end, window):
+        lower = np.searchsorted(self.ends, end - window, side='right')
+        upper = np.searchsorted(self.ends, end, side='right')
+        return float(self.distance_sums[upper] - self.distance_sums[lower])
+
+    def session_features(self, end_time, time_taken, distance, start_time=None):
+        end = end_time_seconds(end_time)
+        if end is None:
+            return None
+        start = end_time_seconds(start_time)
+        if start is None:
+            start = round(end - (time_taken or 0))
+        return {
+            'overlapping_sessions': self.overlapping(start, end),
+            'daily_distance': self.volume(end, DAY_SECONDS) + distance,
+            'weekly_distance': self.volume(end, WEEK_SECONDS) + distance
+        }
+
+def frame_session_features(df):
+    user_id_col = 'UserId' if 'UserId' in df.columns else 'Id'
+    user_codes, _ = pd.factorize(df[user_id_col].astype(str))
+    ends = frame_end_seconds(df)
+    starts = session_starts(ends, df['TimeTaken'], frame_start_seconds(df))
+    distances = np.nan_to_num(df['TotalDistance'].to_numpy(dtype=float))
+    timed = np.flatnonzero(~np.isnan(ends))
+    users = user_codes[timed].astype(np.int64) << USER_KEY_SHIFT
+
+    def keys(seconds):
+        return users + np.maximum(np.round(seconds), 0).astype(np.int64)
+
+    start_keys = np.sort(keys(starts[timed]))
+    end_order = np.argsort(keys(ends[timed]), kind='stable')
+    end_keys = keys(ends[timed])[end_order]
+    distance_sums = np.concatenate([[0.0], np.cumsum(distances[timed][end_order])])
+
+    long_enough = ends[timed] - starts[timed] > 2 * OVERLAP_TOLERANCE
+    started = np.searchsorted(start_keys, keys(ends[timed] - OVERLAP_TOLERANCE), side='left')
+    finished = np.searchsorted(end_keys, keys(starts[timed] + OVERLAP_TOLERANCE), side='right')
+    overlapping = np.zeros(len(df), dtype=int)
+    overlapping[timed] = np.where(long_enough, started - finished - 1, 0)
+
+    upper = np.searchsorted(end_keys, keys(ends[timed]), side='right')
+    daily, weekly = distances.copy(), distances.copy()
+    for volume, window in ((daily, DAY_SECONDS), (weekly, WEEK_SECONDS)):
+        lower = np.searchsorted(end_keys, keys(ends[timed] - window), side='right')
+        volume[timed] = distance_sums[upper] - distance_sums[lower]
+    return {
+        'OverlappingSessions': overlapping,
+        'DailyDistance': daily,
+        'WeeklyDistance': weekly
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Hướng dẫn sử dụng: python session_index.py <tệp_dữ_liệu_csv_hoặc_jsonl>")
+        sys.exit(1)
+
+    from module import load_marathon_data
+    records_df = load_marathon_data(sys.argv[1])
+    features = frame_session_features(records_df)
+    print(json.dumps({
+        'totalRecords': len(records_df),
+        'overlappingRecords': int((features['OverlappingSessions'] > 0).sum()),
+        'maxDailyDistance': float(features['DailyDistance'].max()) if len(records_df) else 0.0,
+        'maxWeeklyDistance': float(features['WeeklyDistance'].max()) if len(records_df) else 0.0
+    }, ensure_ascii=False))
@@ -0,0 +1,91 @@
+import json
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+FRAUD_PATTERNS = {
+    'vehicle': "Sử dụng phương tiện",
+    'shortcut': "Đi tắt đường",
+    'step_count': "Khai báo sai số bước",
+    'heart_rate': "Nhịp tim bất thường"
+}
+
+def generate_marathon_records(n_users, records_per_user, fraud_ratio=0.05, seed=42, end_time=None, heart_rate_ratio=0.7):
+    rng = np.random.default_rng(seed)
+    end_time = end_time or datetime(2025, 6, 1, 7, 0, 0)
+    n_records = n_users * records_per_user
+
+    user_index = np.repeat(np.arange(n_users), records_per_user)
+    base_speed = rng.uniform(8.0, 12.0, n_users)[user_index]
+    base_stride = rng.uniform(0.0007, 0.0011, n_users)[user_index]
+    base_distance = rng.uniform(3.0, 21.0, n_users)[user_index]
+    base_heart_rate = rng.uniform(130.0, 165.0, n_users)[user_index]
+    has_heart_rate = (rng.random(n_users) < heart_rate_ratio)[user_index]
+
+    distance = base_distance * rng.uniform(0.6, 1.4, n_records)
+    speed = base_speed * rng.uniform(0.9, 1.1, n_records)
+    stride = base_stride * rng.uniform(0.95, 1.05, n_records)
+    heart_rate = base_heart_rate + (speed - base_speed) * 3 + rng.normal(0, 4, n_records)
+
+    fraud_type = np.full(n_records, None, dtype=object)
+    fraud_mask = rng.random(n_records) < fraud_ratio
+    fraud_type[fraud_mask] = rng.choice(list(FRAUD_PATTERNS), fraud_mask.sum())
+
+    vehicle = fraud_type == 'vehicle'
+    speed[vehicle] *= rng.uniform(2.5, 4.0, vehicle.sum())
+    stride[vehicle] *= rng.uniform(2.0, 3.0, vehicle.sum())
+
+    shortcut = fraud_type == 'shortcut'
+    distance_factor = rng.uniform(1.6, 2.2, shortcut.sum())
+    distance[shortcut] *= distance_factor
+    speed[shortcut] *= distance_factor
+    stride[shortcut] *= distance_factor
+
+    step_count = fraud_type == 'step_count'
+    stride[step_count] /= rng.uniform(1.8, 3.0, step_count.sum())
+
+    heart_rate_fraud = fraud_type == 'heart_rate'
+    distance[heart_rate_fraud] = np.maximum(distance[heart_rate_fraud], 12.0)
+    heart_rate[heart_rate_fraud] = rng.uniform(45.0, 58.0, heart_rate_fraud.sum())
+    has_heart_rate = has_heart_rate | heart_rate_fraud
+
+    time_taken = np.maximum(1, np.round(distance / speed * 60)).astype(int)
+    steps = np.maximum(1, np.round(distance / stride)).astype(int)
+    days_ago = records_per_user - np.tile(np.arange(records_per_user), n_users)
+    minutes_offset = rng.integers(0, 12 * 60, n_records)
+
+    records = []
+    for i in range(n_records):
+        record_end = end_time - timedelta(days=int(days_ago[i]), minutes=int(minutes_offset[i]))
+        record = {
+            "id": i + 1,
+            "user": {"id": int(user_index[i]) + 1},
+            "steps": int(steps[i]),
+            "distance": round(float(distance[i]), 3),
+            "timeTaken": int(time_taken[i]),
+            "avgSpeed": round(float(distance[i]) / (int(time_taken[i]) / 60), 3),
+            "heartRate": round(float(heart_rate[i]), 1) if has_heart_rate[i] else None,
+            "startTime": (record_end - timedelta(minutes=int(time_taken[i]))).strftime("%Y-%m-%dT%H:%M:%S"),
+            "endTime": record_end.strftime("%Y-%m-%dT%H:%M:%S"),
+            "label": {
+                "isFraud": int(fraud_type[i] is not None),
+                "fraudType": FRAUD_PATTERNS.get(fraud_type[i])
+            }
+        }
+        records.append(record)
+    return records
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Hướng dẫn sử dụng: python synthetic_data.py <số_người_dùng> <số_bản_ghi_mỗi_người> <tệp_jsonl> [--fraud-ratio <tỉ_lệ>] [--seed <hạt_giống>]")
+        sys.exit(1)
+
+    args = sys.argv[1:]
+    fraud_ratio = float(args[args.index('--fraud-ratio') + 1]) if '--fraud-ratio' in args else 0.05
+    seed = int(args[args.index('--seed') + 1]) if '--seed' in args else 42
+    records = generate_marathon_records(int(args[0]), int(args[1]), fraud_ratio=fraud_ratio, seed=seed)
+    with open(args[2], 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Đã tạo {len(records)} bản ghi giả lập: {args[2]}")
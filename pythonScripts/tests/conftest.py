@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def validator():
+    import record_validator
+    from diagnostics import configure_logging
+    configure_logging('ERROR')
+    yield record_validator
+    record_validator.configure_user_stats_store(None)
+    record_validator.configure_history_store(None)
+    record_validator.configure_duplicate_index(None)
+    record_validator.configure_verdict_cache(None)
+    record_validator.configure_online_detector(False)
+    record_validator.configure_anomaly_models(None)
+    record_validator.configure_baselines(None)
+    record_validator.configure_history_window()
+    record_validator.configure_rules()
+    record_validator.configure_history_client()
+    record_validator.configure_debug_timings(False)
+    configure_logging('INFO')
+
+@pytest.fixture
+def history_stub():
+    from history_stub import HistoryStubServer
+    server = HistoryStubServer().start()
+    yield server
+    server.stop()
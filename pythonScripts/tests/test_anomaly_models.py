@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import anomaly_models
+from anomaly_models import score_records, train_models
+from module import prepare_marathon_data
+
+def population_frame(size=400, seed=3):
+    rng = np.random.default_rng(seed)
+    distance = rng.uniform(5.0, 7.0, size)
+    speed = rng.normal(10.0, 1.0, size)
+    time_taken = distance / speed * 60
+    return prepare_marathon_data(pd.DataFrame({
+        'Id': np.arange(size),
+        'UserId': np.arange(size) % 40,
+        'TotalSteps': np.round(distance * 1000 / rng.normal(1.0, 0.05, size)),
+        'TotalDistance': distance,
+        'TimeTaken': time_taken,
+        'AvgSpeed': speed,
+        'heartRate': rng.normal(150.0, 8.0, size)
+    }))
+
+class CopyingScaler(anomaly_models.StandardScaler):
+    def transform(self, X, copy=None):
+        return super().transform(X, copy=True)
+
+@pytest.mark.parametrize('scaler', [anomaly_models.StandardScaler, CopyingScaler])
+def test_models_are_trained_on_scaled_features(monkeypatch, scaler):
+    monkeypatch.setattr(anomaly_models, 'StandardScaler', scaler)
+    population_df = population_frame()
+    bundle = train_models(population_df, contamination=0.05)
+
+    scores = score_records(bundle, population_df)
+    assert bundle['training_rows'] == len(population_df)
+    assert scores['if_predictions'].mean() == pytest.approx(0.05, abs=0.02)
+    assert scores['lof_predictions'].mean() < 0.2
+
+def test_training_needs_two_records():
+    with pytest.raises(ValueError):
+        train_models(population_frame(1))
+
+def test_saved_models_load_by_latest_and_version(tmp_path):
+    from anomaly_models import load_models, save_models
+    population_df = population_frame()
+    first = train_models(population_df, version='v1')
+    save_models(first, str(tmp_path))
+    save_models(train_models(population_df, n_estimators=20, version='v2'), str(tmp_path))
+
+    assert load_models(str(tmp_path))['version'] == 'v2'
+    loaded = load_models(str(tmp_path), 'v1')
+    assert loaded is load_models(str(tmp_path), 'v1')
+    assert json.loads((tmp_path / 'v1' / 'metadata.json').read_text(encoding='utf-8'))['training_rows'] == len(population_df)
+    assert np.array_equal(score_records(loaded, population_df)['if_scores'], score_records(first, population_df)['if_scores'])
+
+def test_models_with_other_features_are_refused(tmp_path):
+    from anomaly_models import load_models, save_models
+    bundle = train_models(population_frame(), version='old')
+    save_models({**bundle, 'features': bundle['features'][:-1]}, str(tmp_path))
+    with pytest.raises(ValueError):
+        load_models(str(tmp_path))
@@ -0,0 +1,38 @@
+import pytest
+
+from benchmark import compare_reports, parse_sizes, run_benchmarks, summarize
+from synthetic_data import FRAUD_PATTERNS, generate_marathon_records
+
+def test_generator_is_seeded_and_labeled():
+    records = generate_marathon_records(20, 10, fraud_ratio=0.2, seed=5)
+    assert records == generate_marathon_records(20, 10, fraud_ratio=0.2, seed=5)
+    assert records != generate_marathon_records(20, 10, fraud_ratio=0.2, seed=6)
+    assert len(records) == 200 and len({record['id'] for record in records}) == 200
+
+    fraud = [record for record in records if record['label']['isFraud']]
+    assert 0.1 < len(fraud) / len(records) < 0.3
+    assert {record['label']['fraudType'] for record in fraud} <= set(FRAUD_PATTERNS.values())
+    vehicle = [record['avgSpeed'] for record in fraud if record['label']['fraudType'] == "Sử dụng phương tiện"]
+    assert min(vehicle) > 15
+
+def test_summary_and_size_parsing():
+    summary = summarize([0.001, 0.002, 0.003, 0.004], 10)
+    assert summary['calls'] == 4
+    assert summary['p50_ms'] == pytest.approx(2.5)
+    assert summary['throughput_per_s'] == pytest.approx(4000)
+    assert parse_sizes('50x10,200X5') == [(50, 10), (200, 5)]
+
+def test_regressions_beyond_tolerance_are_reported():
+    baseline = {'sizes': {'50x10': {'stage': {'p50_ms': 10.0, 'peak_memory_mb': 2.0}}}}
+    current = {'sizes': {'50x10': {'stage': {'p50_ms': 12.0, 'peak_memory_mb': 3.0},
+                                   'new_stage': {'p50_ms': 1.0, 'peak_memory_mb': 1.0}}}}
+    regressions = compare_reports(baseline, current)
+    assert [(regression['stage'], regression['metric']) for regression in regressions] == [('stage', 'peak_memory_mb')]
+    assert len(compare_reports(baseline, current, tolerance=0.1)) == 2
+
+def test_small_run_measures_every_stage(validator):
+    report = run_benchmarks([(4, 6)], repeats=1, validate_samples=2)
+    stages = report['sizes']['4x6']
+    assert {'prepare_marathon_data', 'analyze_per_user', 'generate_final_report', 'validate_record'} <= stages.keys()
+    assert all(result['p50_ms'] >= 0 and result['peak_memory_mb'] >= 0 for result in stages.values())
+    assert stages['validate_record']['calls'] == 2
@@ -0,0 +1,85 @@
+import json
+
+from duplicate_index import DuplicateIndex, RecordFingerprint, duplicate_features, duplicate_users
+from module import records_to_marathon_data
+from run_record import RunRecord
+from test_record_validator import run_record
+
+def fingerprint(record):
+    return RecordFingerprint.from_row(RunRecord.from_dict(record).to_row())
+
+def test_exact_near_and_replayed_copies_are_matched(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'duplicates.db'))
+    original = run_record(1, user_id=1, heartRate=150.0)
+    assert index.matches(fingerprint(original)) == []
+    index.add(fingerprint(original))
+
+    copied = fingerprint(run_record(2, user_id=2, heartRate=150.0))
+    near = fingerprint(run_record(3, user_id=3, steps=8080, heartRate=151.0))
+    replayed = fingerprint(run_record(4, user_id=1, heartRate=150.0))
+    other_run = fingerprint(run_record(5, user_id=4, steps=9000, distance=7.0, end_time='2025-06-02T07:00:00'))
+    assert [match['exact'] for match in index.matches(copied)] == [True]
+    assert [match['exact'] for match in index.matches(near)] == [False]
+    assert duplicate_features(index.matches(replayed), replayed) == {'cross_user_matches': 0, 'replay_matches': 1}
+    assert index.matches(other_run) == []
+    assert index.matches(fingerprint(original)) == []
+    index.add(fingerprint(original))
+    assert index.record_count() == 1
+    index.close()
+
+    reopened = DuplicateIndex(str(tmp_path / 'duplicates.db'))
+    assert len(reopened.matches(copied)) == 1
+    reopened.close()
+
+def test_frame_scan_counts_other_accounts():
+    df = records_to_marathon_data([
+        run_record(1, user_id=1, heartRate=150.0),
+        run_record(2, user_id=2, heartRate=150.0),
+        run_record(3, user_id=3, steps=8080, heartRate=151.0),
+        run_record(4, user_id=1, end_time='2025-06-02T07:00:00'),
+        run_record(5, user_id=4, steps=9000, distance=7.0, end_time='2025-06-03T07:00:00')
+    ])
+    assert duplicate_users(df).tolist() == [2, 2, 2, 0, 0]
+
+def test_validator_rejects_copies_from_other_accounts(validator, history_stub, tmp_path):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_duplicate_index(str(tmp_path / 'duplicates.db'))
+
+    original = json.dumps(run_record(1, user_id=1))
+    assert validator.validate_record(original)['approvalStatus'] == 'APPROVED'
+    assert validator.validate_record(original)['approvalStatus'] == 'APPROVED'
+    copies = validator.validate_records([json.dumps(run_record(3, user_id=1)), json.dumps(run_record(2, user_id=2))])
+    assert [result['fraudType'] for result in copies] == ['Bản ghi bị gửi lại', 'Bản ghi trùng giữa các tài khoản']
+    assert [result['approvalStatus'] for result in copies] == ['REJECTED', 'REJECTED']
+
+def test_unsaved_submission_is_not_its_own_replay(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'duplicates.db'))
+    unsaved = fingerprint(run_record(None, user_id=1, heartRate=150.0))
+    index.add(unsaved)
+    index.add(unsaved)
+    saved = fingerprint(run_record(77, user_id=1, heartRate=150.0))
+    assert index.matches(saved) == []
+    index.add(saved)
+    assert index.record_count() == 1
+    assert index.matches(fingerprint(run_record(78, user_id=1, heartRate=150.0)))[0]['recordId'] == '77'
+    index.close()
+
+def test_validator_accepts_a_saved_run_it_saw_unsaved(validator, history_stub, tmp_path):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_duplicate_index(str(tmp_path / 'duplicates.db'))
+
+    assert validator.validate_record(json.dumps(run_record(None)))['approvalStatus'] == 'APPROVED'
+    assert validator.validate_record(json.dumps(run_record(77)))['approvalStatus'] == 'APPROVED'
+    other_run = {'user_id': 2, 'steps': 9000, 'distance': 7.0, 'end_time': '2025-06-02T07:00:00'}
+    results = validator.validate_records([json.dumps(run_record(None, **other_run)), json.dumps(run_record(80, **other_run))])
+    assert [result['approvalStatus'] for result in results] == ['APPROVED', 'APPROVED']
+
+def test_rejected_records_are_not_indexed(validator, history_stub, tmp_path):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    index = validator.configure_duplicate_index(str(tmp_path / 'duplicates.db'))
+
+    assert validator.validate_record(json.dumps(run_record(1, user_id=1)))['approvalStatus'] == 'APPROVED'
+    assert validator.validate_record(json.dumps(run_record(2, user_id=2)))['approvalStatus'] == 'REJECTED'
+    assert validator.validate_records([json.dumps(run_record(3, user_id=3, steps=9000)),
+                                       json.dumps(run_record(4, user_id=4, steps=9000))])[1]['approvalStatus'] == 'REJECTED'
+    assert index.record_count() == 2
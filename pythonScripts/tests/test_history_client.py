@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from history_client import HistoryClient
+
+def history_record(record_id, user_id, end_time):
+    return {'id': record_id, 'user': {'id': user_id}, 'steps': 8000, 'distance': 6.0, 'timeTaken': 40,
+            'avgSpeed': 9.0, 'endTime': end_time}
+
+def test_batch_scope_outlives_a_small_cache(history_stub):
+    for user_id in range(1, 6):
+        history_stub.add_record(history_record(user_id * 10, user_id, '2025-05-30T07:00:00'))
+    client = HistoryClient(base_url=history_stub.base_url, cache_size=2)
+    start, end = datetime(2025, 5, 25), datetime(2025, 6, 1)
+
+    with client.batch_scope({user_id: (start, end) for user_id in range(1, 6)}):
+        for user_id in range(1, 6):
+            assert [record['id'] for record in client.fetch_records(user_id, 7, '2025-06-01T00:00:00')] == [user_id * 10]
+    assert history_stub.request_count == 5
+    assert client.batch.indexes is None
+
+def test_fetch_records_applies_window_and_exclusion(history_stub):
+    for record_id, end_time in ((1, '2025-05-20T07:00:00'), (2, '2025-05-30T07:00:00'), (3, '2025-05-31T07:00:00')):
+        history_stub.add_record(history_record(record_id, 7, end_time))
+    client = HistoryClient(base_url=history_stub.base_url)
+
+    assert [record['id'] for record in client.fetch_records(7, 7, '2025-06-01T00:00:00', exclude_id=3)] == [2]
+    assert [record['id'] for record in client.fetch_records(7, 7, '2025-06-01T00:00:00', max_records=1)] == [3]
+    assert history_stub.request_count == 1
+
+def test_unparsed_end_times_are_logged_and_counted(monkeypatch):
+    import io
+    from diagnostics import configure_logging
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return [history_record(1, 7, '2025-05-30T07:00:00'), history_record(2, 7, 'không rõ'), history_record(3, 7, None)]
+
+    client = HistoryClient(base_url='http://history.invalid')
+    monkeypatch.setattr(client.session, 'get', lambda url, timeout: Response())
+    stream = io.StringIO()
+    configure_logging('WARNING', stream=stream)
+    try:
+        assert [record['id'] for record in client.fetch_records(7, 7, '2025-06-01T00:00:00')] == [1]
+    finally:
+        configure_logging('INFO')
+    assert client.unparsed_records == 2
+    assert "Bỏ qua 2 bản ghi lịch sử của người dùng 7" in stream.getvalue()
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+from history_store import HISTORY_ROW, HistoryStore
+
+def history_record(record_id, user_id, end_time, distance=6.0):
+    return {'id': record_id, 'user': {'id': user_id}, 'steps': 8000, 'distance': distance, 'timeTaken': 40,
+            'avgSpeed': 9.0, 'heartRate': 140.0, 'endTime': end_time}
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+def test_window_is_sorted_and_filtered(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append_records([history_record(3, 1, '2025-05-31T07:00:00'), history_record(1, 1, '2025-05-20T07:00:00')])
+    store.append_records([history_record(2, 1, '2025-05-30T07:00:00')])
+
+    assert store.row_count(1) == 3
+    assert list(store.window(1, 30, '2025-06-01T00:00:00')['id']) == [1, 2, 3]
+    assert list(store.window(1, 7, '2025-06-01T00:00:00', exclude_id=3)['id']) == [2]
+    assert list(store.window(1, 7, '2025-06-01T00:00:00', max_records=1)['id']) == [3]
+    assert store.window(2, 7, '2025-06-01T00:00:00') is None
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason="cần /proc để đếm mô tả tệp")
+def test_mapped_users_hold_one_descriptor_within_budget(tmp_path):
+    store = HistoryStore(str(tmp_path), mapped_files=8)
+    for user_id in range(40):
+        store.append_records([history_record(user_id, user_id, '2025-05-30T07:00:00')])
+
+    baseline = open_fds()
+    frames = 0
+    for user_id in range(40):
+        frames += len(store.window_frame(user_id, 7, '2025-06-01T00:00:00'))
+    assert frames == 40
+    assert len(store.mapped) == 8
+    assert open_fds() - baseline <= 8
+
+def test_torn_append_is_truncated_on_next_write(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append_records([history_record(1, 1, '2025-05-30T07:00:00')])
+    with open(store.history_path(1), 'ab') as f:
+        f.write(b'\x01' * (HISTORY_ROW.itemsize // 2))
+
+    store.append_records([history_record(2, 1, '2025-05-31T07:00:00')])
+    assert os.path.getsize(store.history_path(1)) == 2 * HISTORY_ROW.itemsize
+    assert list(store.window(1, 7, '2025-06-01T00:00:00')['id']) == [1, 2]
+
+def test_failed_rewrite_leaves_history_intact(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path))
+    store.append_records([history_record(1, 1, '2025-05-29T07:00:00'), history_record(3, 1, '2025-05-31T07:00:00')])
+
+    def crash(source, target):
+        raise OSError("mất điện")
+    monkeypatch.setattr(os, 'replace', crash)
+    with pytest.raises(OSError):
+        store.append_records([history_record(2, 1, '2025-05-30T07:00:00', distance=7.0)])
+    monkeypatch.undo()
+
+    window = store.window(1, 7, '2025-06-01T00:00:00')
+    assert list(window['id']) == [1, 3]
+    assert np.allclose(window['distance'], [6.0, 6.0])
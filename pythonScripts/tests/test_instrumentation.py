@@ -0,0 +1,76 @@
+import json
+
+from instrumentation import MetricsExporter, MetricsRegistry, stage, trace
+from test_record_validator import run_record
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry(buckets=(0.001, 0.01, 0.1))
+    for seconds in (0.0005, 0.005, 0.005, 0.05, 2.0):
+        registry.observe('history_fetch', seconds)
+    registry.count_outcome('APPROVED')
+
+    snapshot = registry.snapshot()
+    stage_metrics = snapshot['stages']['history_fetch']
+    assert stage_metrics['buckets'] == {'0.001': 1, '0.01': 3, '0.1': 4, '+Inf': 5}
+    assert stage_metrics['maxMs'] == 2000.0
+    assert snapshot['outcomes'] == {'APPROVED': 1}
+
+    text = registry.to_prometheus()
+    assert 'validator_stage_duration_seconds_bucket{stage="history_fetch",le="0.01"} 3' in text
+    assert 'validator_stage_duration_seconds_count{stage="history_fetch"} 5' in text
+    assert 'validator_results_total{status="APPROVED"} 1' in text
+
+def test_stage_timings_go_to_the_innermost_trace():
+    with trace() as outer:
+        with stage('parse'):
+            pass
+        with trace() as inner:
+            with stage('prepare'):
+                pass
+            with stage('prepare'):
+                pass
+    assert set(outer) == {'parse'}
+    assert set(inner) == {'prepare'} and inner['prepare']['ms'] >= 0
+
+def test_exporter_writes_on_stop(tmp_path):
+    registry = MetricsRegistry()
+    registry.observe('total', 0.002)
+    path = tmp_path / 'metrics.json'
+    MetricsExporter(str(path), interval=3600, registry=registry).start().stop()
+    assert json.loads(path.read_text(encoding='utf-8'))['stages']['total']['count'] == 1
+    assert not (tmp_path / 'metrics.json.tmp').exists()
+
+def test_debug_timings_list_validator_stages(validator, history_stub):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_debug_timings(True)
+    result = validator.validate_record(json.dumps(run_record()))
+    assert result['approvalStatus'] == 'APPROVED'
+    assert {'parse', 'history_fetch'} <= set(result['debug']['timings'])
+    assert result['debug']['totalMs'] >= result['debug']['timings']['parse']['ms']
+
+def test_nested_and_threaded_stages_keep_the_outer_peak():
+    import threading
+    import tracemalloc
+    from instrumentation import configure_instrumentation
+
+    def worker():
+        with stage('worker_alloc'):
+            pass
+
+    configure_instrumentation(True)
+    try:
+        with trace() as timings:
+            with stage('outer_alloc'):
+                block = bytearray(4 * 1024 * 1024)
+                del block
+                with stage('inner_alloc'):
+                    kept = bytearray(1024 * 1024)
+                thread = threading.Thread(target=worker)
+                thread.start()
+                thread.join()
+    finally:
+        configure_instrumentation(False)
+        tracemalloc.stop()
+    assert timings['outer_alloc']['allocatedKb'] >= 4096
+    assert 1024 <= timings['inner_alloc']['allocatedKb'] < 1200
+    assert len(kept) == 1024 * 1024
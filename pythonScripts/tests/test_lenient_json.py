@@ -0,0 +1,43 @@
+import json
+import math
+
+import pytest
+
+from lenient_json import decode_lenient, decode_record
+
+def test_repairs_common_malformations():
+    record = decode_record("{id: 7, 'user': {'id': 3}, steps: 8000, distance: 6.5, heartRate: None, "
+                           "endTime: '2025-06-01T07:00:00', avgSpeed: NaN,}")
+    assert record['id'] == 7
+    assert record['user'] == {'id': 3}
+    assert record['steps'] == 8000 and isinstance(record['steps'], int)
+    assert record['distance'] == 6.5
+    assert record['heartRate'] is None
+    assert record['endTime'] == '2025-06-01T07:00:00'
+    assert math.isnan(record['avgSpeed'])
+
+def test_drops_fields_outside_schema_and_keeps_nested_series():
+    record = decode_lenient("{'id': 1, 'note': {'deep': [1, 2,]}, 'samples': [{\"t\": 0, \"d\": 0.5}],}")
+    assert record == {'id': 1, 'samples': [{'t': 0, 'd': 0.5}]}
+
+def test_decodes_escapes():
+    assert decode_lenient("{'endTime': 'a\\u00e9\\n'}", schema=None) == {'endTime': 'aé\n'}
+
+def test_missing_comma_is_a_decode_error():
+    with pytest.raises(json.JSONDecodeError):
+        decode_record('{"steps":8000 "distance":6, "timeTaken": 40}')
+
+@pytest.mark.parametrize('text', ['not json', '[1, 2]', '42', "'text'"])
+def test_top_level_must_be_an_object(text):
+    with pytest.raises(json.JSONDecodeError):
+        decode_record(text)
+
+def test_unquoted_text_values_are_rejected():
+    with pytest.raises(json.JSONDecodeError):
+        decode_lenient("{'endTime': 2025-06-01 07:00}")
+
+@pytest.mark.parametrize('text', ['{"id": 1, "user": {"id": 1}, "steps":8000 "distance":6, "timeTaken": 40}', 'not json'])
+def test_validator_reports_format_error(validator, text):
+    result = validator.validate_record(text)
+    assert result['approvalStatus'] == 'PENDING'
+    assert result['fraudType'] == "Cần điều chỉnh định dạng"
@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from module import analyze_per_user, prepare_marathon_data, records_to_marathon_data
+from synthetic_data import generate_marathon_records
+
+DEVIATION_COLUMNS = ['StepDeviation', 'SpeedDeviation', 'DistPerStepDeviation', 'HeartRateDeviation']
+
+def marathon_frame():
+    records = generate_marathon_records(12, 6, fraud_ratio=0.1, seed=11)
+    records = [record for record in records if record['user']['id'] != 3 or record['id'] % 6 == 0]
+    records = [record for record in records if record['user']['id'] != 4 or record['id'] % 6 < 3]
+    for record in records:
+        if record['user']['id'] == 5 and record['id'] % 2:
+            record['heartRate'] = None
+    return prepare_marathon_data(records_to_marathon_data(records))
+
+def reference_analyze_per_user(df):
+    user_stats = {}
+    for user_id in df['UserId'].unique():
+        user_data = df[df['UserId'] == user_id]
+        if len(user_data) < 2:
+            continue
+        stats = {}
+        for col in ['TotalSteps', 'TotalDistance', 'AvgSpeed', 'DistancePerStep']:
+            stats[f'avg_{col.lower()}'] = user_data[col].mean()
+            stats[f'std_{col.lower()}'] = user_data[col].std()
+        heart_rates = user_data['heartRate'].dropna()
+        if len(heart_rates):
+            stats['avg_heartrate'] = heart_rates.mean()
+            stats['std_heartrate'] = heart_rates.std()
+        stats['record_count'] = len(user_data)
+        if len(user_data) >= 5:
+            stats['step_correlations'] = user_data[['TotalSteps', 'TotalDistance', 'AvgSpeed', 'TimeTaken']].corr()[
+                'TotalSteps'].drop('TotalSteps').to_dict()
+            pairs = user_data[['TotalSteps', 'heartRate']].dropna()
+            if len(heart_rates) and len(pairs) >= 2:
+                stats['step_heart_rate_correlation'] = pairs.corr().iloc[0, 1]
+        user_stats[user_id] = stats
+
+    deviations = {}
+    for col, prefix in zip(['TotalSteps', 'AvgSpeed', 'DistancePerStep', 'heartRate'], DEVIATION_COLUMNS):
+        deviations[prefix] = np.full(len(df), np.nan)
+        for row, (user_id, value) in enumerate(zip(df['UserId'], df[col])):
+            stats = user_stats.get(user_id, {})
+            if f'avg_{col.lower()}' in stats and not pd.isna(value):
+                deviations[prefix][row] = (value - stats[f'avg_{col.lower()}']) / (stats[f'std_{col.lower()}'] + 1e-6)
+    return deviations, user_stats
+
+def same_value(value, expected):
+    if isinstance(expected, dict):
+        return value.keys() == expected.keys() and all(same_value(value[key], expected[key]) for key in expected)
+    if isinstance(expected, float) and math.isnan(expected):
+        return math.isnan(value)
+    return math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-9)
+
+def test_grouped_statistics_match_per_user_loop():
+    df = marathon_frame()
+    expected_deviations, expected_stats = reference_analyze_per_user(df)
+
+    analyzed_df, user_stats = analyze_per_user(df.copy())
+    assert user_stats.keys() == expected_stats.keys()
+    assert 3 not in user_stats and 'step_correlations' not in user_stats[4]
+    for user_id, stats in expected_stats.items():
+        assert same_value(user_stats[user_id], stats), user_id
+    for column, expected in expected_deviations.items():
+        np.testing.assert_allclose(analyzed_df[column].to_numpy(dtype=float), expected, rtol=1e-9, atol=1e-9)
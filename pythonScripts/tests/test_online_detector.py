@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+from online_detector import OnlineAnomalyDetector
+from run_record import RunRecord
+from test_record_validator import run_record, steady_history
+
+def run(record_id, user_id=1, steps=8000, distance=6.0, time_taken=40, day=1):
+    return RunRecord.from_dict({'id': record_id, 'user': {'id': user_id}, 'steps': steps, 'distance': distance,
+                                'timeTaken': time_taken, 'avgSpeed': distance / (time_taken / 60),
+                                'endTime': f'2025-05-{day:02d}T07:00:00'})
+
+def test_score_does_not_change_state():
+    detector = OnlineAnomalyDetector(user_window=5, event_window=10)
+    for day in range(1, 6):
+        detector.update(run(day, steps=8000 + 100 * day, day=day))
+
+    first = detector.score(run(99, steps=30000, day=20))
+    second = detector.score(run(99, steps=30000, day=20))
+    assert first['history_count'] == second['history_count'] == 5
+    assert json.dumps(first) == json.dumps(second)
+    assert len(detector.users[1].runs) == 5
+    assert 2 not in detector.users and detector.score(run(100, user_id=2))['history_count'] == 0
+    assert 2 not in detector.users
+
+def test_observe_matches_score_then_update():
+    scored, observed = OnlineAnomalyDetector(event_window=10), OnlineAnomalyDetector(event_window=10)
+    for day in range(1, 25):
+        record = run(day, steps=8000 + 37 * day, distance=6.0 + 0.05 * (day % 4), day=day)
+        expected = scored.score(record)
+        scored.update(record)
+        assert json.dumps(observed.observe(record)) == json.dumps(expected)
+
+def test_only_approved_records_update_the_model(validator, history_stub):
+    for record in steady_history():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    detector = validator.configure_online_detector(True)
+
+    rejected = {'id': 1, 'user': {'id': 1}, 'steps': 8000, 'distance': 60.0, 'timeTaken': 40, 'avgSpeed': 90.0,
+                'endTime': '2025-06-01T07:00:00'}
+    assert validator.validate_record(json.dumps(rejected))['approvalStatus'] == 'REJECTED'
+    assert 1 not in detector.users
+
+    approved = run_record(2, steps=8150, distance=6.1, time_taken=41, heartRate=141.0, end_time='2025-06-01T08:00:00')
+    assert validator.validate_record(json.dumps(approved))['approvalStatus'] == 'APPROVED'
+    assert history_stub.request_count == 1
+    assert [r.id for r in detector.users[1].runs] == [2]
+
+def test_history_checks_still_run_with_online_detector(validator, history_stub):
+    for record in steady_history():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_online_detector(True)
+
+    overlapping = {'id': 3, 'user': {'id': 1}, 'steps': 8000, 'distance': 6.0, 'timeTaken': 40, 'avgSpeed': 9.0,
+                   'startTime': '2025-05-31T06:40:00', 'endTime': '2025-05-31T07:20:00'}
+    result = validator.validate_record(json.dumps(overlapping))
+    assert result['fraudType'] == "Phiên chạy trùng thời gian"
+
+def test_cli_ignores_online_detector_for_single_records(history_stub):
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'record_validator.py')
+    record = json.dumps({'id': 1, 'user': {'id': 1}, 'steps': 8000, 'distance': 6.0, 'timeTaken': 40, 'avgSpeed': 9.0,
+                         'endTime': '2025-06-01T07:00:00'})
+    completed = subprocess.run([sys.executable, script, '--online-detector', record], capture_output=True, text=True,
+                               env={**os.environ, 'API_URL': history_stub.base_url}, timeout=60)
+    assert "bỏ qua --online-detector" in completed.stdout
+    assert '"approvalStatus": "APPROVED"' in completed.stdout
@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+import pytest
+
+from population_baselines import build_baselines
+from test_record_validator import run_record
+
+def population(size=5000, seed=7):
+    rng = np.random.default_rng(seed)
+    distance = rng.uniform(5.0, 7.0, size)
+    speed = rng.normal(10.0, 1.2, size)
+    cadence = rng.normal(166.0, 6.0, size)
+    time_taken = distance / speed * 60
+    return {
+        'distance': distance,
+        'speed': speed,
+        'distance_per_step': speed * 1000 / 60 / cadence,
+        'steps_per_minute': cadence,
+        'heart_rate': rng.normal(150.0, 8.0, size),
+        'time_taken': time_taken
+    }
+
+def cold_start_record(speed, cadence, heart_rate=150.0, distance=6.0):
+    time_taken = distance / speed * 60
+    return run_record(distance=distance, time_taken=time_taken, steps=round(cadence * time_taken), heartRate=heart_rate)
+
+@pytest.fixture
+def cold_start(validator, history_stub, tmp_path):
+    path = str(tmp_path / 'baselines.json')
+    build_baselines(population()).write(path)
+    validator.configure_baselines(path)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    return validator
+
+def test_percentile_hit_alone_goes_to_review(cold_start):
+    result = cold_start.validate_record(json.dumps(cold_start_record(13.0, 170)))
+    assert result['approvalStatus'] == 'PENDING'
+    assert result['fraudType'] == 'Tốc độ xuất sắc'
+
+def test_typical_run_is_approved(cold_start):
+    assert cold_start.validate_record(json.dumps(cold_start_record(10.0, 166)))['approvalStatus'] == 'APPROVED'
+
+@pytest.mark.parametrize('speed, cadence, heart_rate, fraud_type', [
+    (16.0, 170, 150.0, 'Tốc độ cần xác nhận'),
+    (13.0, 170, 60.0, 'Nhịp tim cần kiểm tra')
+])
+def test_corroborated_hits_are_rejected(cold_start, speed, cadence, heart_rate, fraud_type):
+    record = json.dumps(cold_start_record(speed, cadence, heart_rate))
+    result = cold_start.validate_record(record)
+    assert result['approvalStatus'] == 'REJECTED'
+    assert result['fraudType'] == fraud_type
+    assert cold_start.validate_records([record])[0] == result
@@ -0,0 +1,48 @@
+import json
+
+import pandas as pd
+
+from module import records_to_marathon_data
+from population_scan import build_response, scan_population, shard_by_user
+from synthetic_data import generate_marathon_records
+
+def population_df():
+    records = generate_marathon_records(24, 8, fraud_ratio=0.1, seed=21)
+    overlap = dict(records[0], id=len(records) + 1)
+    return records_to_marathon_data(records + [overlap])
+
+def test_shards_keep_each_user_whole():
+    df = population_df()
+    shards = shard_by_user(df, 5)
+    assert sum(len(shard) for shard in shards) == len(df)
+    users = [set(shard['UserId']) for shard in shards]
+    assert all(not (first & second) for index, first in enumerate(users) for second in users[index + 1:])
+
+def test_parallel_scan_matches_serial_scan():
+    serial_df, serial_stats, serial_scores = scan_population(population_df(), workers=1)
+    parallel_df, parallel_stats, parallel_scores = scan_population(population_df(), workers=2)
+
+    columns = ['IsFraud', 'FraudType', 'StepDeviation', 'OverlappingSessions', 'DailyDistance', 'DuplicateUsers']
+    pd.testing.assert_frame_equal(serial_df[columns], parallel_df[columns])
+    assert list(serial_stats) == list(parallel_stats)
+    assert list(serial_scores) == list(parallel_scores)
+    assert json.dumps(serial_scores, default=str) == json.dumps(parallel_scores, default=str)
+    assert serial_df['IsFraud'].iloc[-1] == 1 and serial_df['OverlappingSessions'].iloc[-1] > 0
+
+def test_response_lists_flagged_records():
+    analyzed_df, _, user_risk_scores = scan_population(population_df(), workers=1)
+    response = json.loads(json.dumps(build_response(analyzed_df, user_risk_scores), ensure_ascii=False))
+    assert response['totalRecords'] == len(analyzed_df)
+    assert response['totalFraudRecords'] == int(analyzed_df['IsFraud'].sum()) == len(response['fraudRecordDetails'])
+    assert set(response['fraudUserIds']) == set(response['userRiskScores'])
+
+def test_persisted_models_score_in_the_workers(tmp_path):
+    from anomaly_models import save_models, train_models
+    from module import analyze_per_user, prepare_marathon_data
+    training_df, _ = analyze_per_user(prepare_marathon_data(population_df()))
+    save_models(train_models(training_df, version='v1'), str(tmp_path))
+
+    serial_df, _, serial_scores = scan_population(population_df(), workers=1, model_dir=str(tmp_path))
+    parallel_df, _, parallel_scores = scan_population(population_df(), workers=2, model_dir=str(tmp_path), model_version='v1')
+    pd.testing.assert_frame_equal(serial_df[['IsFraud', 'FraudType']], parallel_df[['IsFraud', 'FraudType']])
+    assert json.dumps(serial_scores, default=str) == json.dumps(parallel_scores, default=str)
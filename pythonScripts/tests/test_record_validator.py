@@ -0,0 +1,239 @@
+import io
+import json
+
+def run_record(record_id=1, user_id=1, steps=8000, distance=6.0, time_taken=40, end_time='2025-06-01T07:00:00', **fields):
+    return {
+        'id': record_id,
+        'user': {'id': user_id},
+        'steps': steps,
+        'distance': distance,
+        'timeTaken': time_taken,
+        'avgSpeed': distance / (time_taken / 60),
+        'endTime': end_time,
+        **fields
+    }
+
+def test_server_answers_each_line_in_order(validator, history_stub):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    server = validator.ValidatorServer(io.StringIO())
+    output = io.StringIO()
+
+    server.handle_line(json.dumps(run_record()) + "\n", output)
+    server.handle_line("   \n", output)
+    server.handle_line(json.dumps(run_record(2, speed=None, distance=60.0, time_taken=40)), output)
+    server.handle_line(validator.STATS_COMMAND, output)
+
+    responses = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(responses) == 3
+    assert responses[0]['approvalStatus'] == 'APPROVED'
+    assert responses[1]['approvalStatus'] == 'REJECTED'
+    assert 'stages' in responses[2]
+    assert server.is_idle()
+
+def steady_history(user_id=1, count=6, end_day=31):
+    return [run_record(100 + day, user_id, steps=8000 + 150 * (day % 3), distance=6.0 + 0.1 * (day % 3),
+                       time_taken=40 + day % 3, heartRate=140.0 + day % 3, end_time=f'2025-05-{end_day - day:02d}T07:00:00')
+            for day in range(count)]
+
+def test_history_frame_carries_derived_columns(validator, history_stub):
+    for record in steady_history():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+
+    history_df = validator.load_user_history(1, '2025-06-01T07:00:00')
+    for col in ('DistancePerStep', 'VeryActiveMinutes', 'VeryActiveDistance', 'HeartRatePerSpeed'):
+        assert history_df[col].notna().all()
+
+def test_typical_run_is_not_an_outlier_against_its_history(validator, history_stub):
+    for record in steady_history():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+
+    result = validator.validate_record(json.dumps(run_record(200, steps=8150, distance=6.1, time_taken=41, heartRate=141.0)))
+    assert result['approvalStatus'] == 'APPROVED'
+
+def test_batch_fetches_each_user_history_once(validator, history_stub):
+    for user_id in range(1, 6):
+        for record in steady_history(user_id):
+            history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=60, cache_size=2)
+
+    results = validator.validate_records([run_record(200 + user_id, user_id, steps=8150, distance=6.1, time_taken=41,
+                                                     heartRate=141.0) for user_id in range(1, 6)])
+    assert [result['approvalStatus'] for result in results] == ['APPROVED'] * 5
+    assert history_stub.request_count == 5
+
+def test_history_store_errors_fall_back_to_api(validator, history_stub, tmp_path, monkeypatch):
+    for record in steady_history():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    store = validator.configure_history_store(str(tmp_path))
+
+    def too_many_files(*args, **kwargs):
+        raise OSError(24, "Too many open files")
+    monkeypatch.setattr(store, 'window_frame', too_many_files)
+
+    history_df = validator.load_user_history(1, '2025-06-01T07:00:00')
+    assert len(history_df) == 6
+    assert history_stub.request_count == 1
+
+def test_batch_appends_approved_records_to_history_store(validator, tmp_path):
+    store = validator.configure_history_store(str(tmp_path))
+    store.append_records(steady_history())
+
+    results = validator.validate_records([
+        json.dumps(run_record(200, steps=8150, distance=6.1, time_taken=41, heartRate=141.0)),
+        json.dumps(run_record(201, user_id=2, distance=60.0, time_taken=40))
+    ])
+    assert [result['approvalStatus'] for result in results] == ['APPROVED', 'REJECTED']
+    assert store.row_count(1) == 7
+    assert store.row_count(2) == 0
+
+def test_batch_verdicts_match_single_record_verdicts(validator, history_stub):
+    for record in steady_history():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+
+    records = [
+        json.dumps(run_record(200, steps=8150, distance=6.1, time_taken=41, heartRate=141.0)),
+        json.dumps(run_record(201, user_id=2)),
+        json.dumps(run_record(202, distance=60.0, time_taken=40)),
+        json.dumps(run_record(203, steps=3000, distance=6.0, time_taken=40)),
+        json.dumps(run_record(204, steps=8150, distance=6.1, time_taken=41, heartRate=141.0)).replace('"', "'")[:-1] + ",}",
+        "[1, 2]",
+        "{\"id\": 205, \"steps\": }"
+    ]
+    batch = validator.validate_records(records)
+    assert batch == [validator.validate_record(record) for record in records]
+    assert [result['approvalStatus'] for result in batch[:3]] == ['APPROVED', 'APPROVED', 'REJECTED']
+    assert batch[4]['approvalStatus'] == 'APPROVED'
+    assert batch[5]['fraudType'] == "Cần xem xét thêm"
+    assert batch[6]['fraudType'] == "Cần điều chỉnh định dạng"
+
+def test_stream_writes_one_result_per_line_in_input_order(validator, history_stub, tmp_path, capsys):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    input_path, output_path = tmp_path / 'records.jsonl', tmp_path / 'results.jsonl'
+    input_path.write_text("\n".join([
+        json.dumps(run_record(1, user_id=1)),
+        "",
+        json.dumps(run_record(2, user_id=2, distance=60.0, time_taken=40)),
+        "{\"id\": 3, \"steps\": }",
+        json.dumps(run_record(4, user_id=4)),
+        json.dumps(run_record(5, user_id=5))
+    ]) + "\n", encoding='utf-8')
+
+    assert validator.run_stream(str(input_path), str(output_path), chunk_size=2) == 5
+    results = [json.loads(line) for line in output_path.read_text(encoding='utf-8').splitlines()]
+    assert [result['recordId'] for result in results] == [1, 2, None, 4, 5]
+    assert [result['approvalStatus'] for result in results] == ['APPROVED', 'REJECTED', 'PENDING', 'APPROVED', 'APPROVED']
+    assert capsys.readouterr().out == ""
+
+def test_chunks_are_read_lazily(validator):
+    consumed = []
+
+    def lines():
+        for index in range(5):
+            consumed.append(index)
+            yield index
+
+    chunks = validator.iter_chunks(lines(), 2)
+    assert next(chunks) == [0, 1]
+    assert consumed == [0, 1]
+    assert list(chunks) == [[2, 3], [4]]
+
+def run_cli(history_stub, *args):
+    import os
+    import subprocess
+    import sys
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'record_validator.py')
+    return subprocess.run([sys.executable, script, *args], capture_output=True, text=True, timeout=60,
+                          env={**os.environ, 'API_URL': history_stub.base_url})
+
+def test_json_out_keeps_stdout_machine_readable(history_stub):
+    completed = run_cli(history_stub, json.dumps(run_record()), '--json-out', '-')
+    assert completed.returncode == 0
+    lines = completed.stdout.splitlines()
+    assert len(lines) == 1 and json.loads(lines[0])['approvalStatus'] == 'APPROVED'
+    assert all(json.loads(line)['level'] for line in completed.stderr.splitlines())
+
+def test_batch_json_out_writes_record_ids_and_worst_exit_code(history_stub, tmp_path):
+    batch_path, result_path = tmp_path / 'batch.jsonl', tmp_path / 'results.jsonl'
+    batch_path.write_text(json.dumps(run_record(1)) + "\n" + json.dumps(run_record(2, distance=60.0)) + "\n",
+                          encoding='utf-8')
+    completed = run_cli(history_stub, str(batch_path), '--batch', '--json-out', str(result_path))
+    assert completed.returncode == 20
+    assert completed.stdout == ""
+    results = [json.loads(line) for line in result_path.read_text(encoding='utf-8').splitlines()]
+    assert [(result['recordId'], result['approvalStatus']) for result in results] == [(1, 'APPROVED'), (2, 'REJECTED')]
+
+def test_missing_arguments_exit_with_usage_error(history_stub):
+    completed = run_cli(history_stub)
+    assert completed.returncode == 1
+    assert "Hướng dẫn sử dụng" in completed.stdout
+
+def test_history_window_ends_at_the_record_not_at_now(validator, history_stub):
+    for day in (1, 2, 3, 10):
+        history_stub.add_record(run_record(100 + day, end_time=f'2025-05-{31 - day + 1:02d}T06:00:00', heartRate=140.0))
+    history_stub.add_record(run_record(200, end_time='2025-06-02T07:00:00'))
+    history_stub.add_record(run_record(300, end_time='2025-06-01T07:00:00'))
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+
+    def history_ids():
+        history_df = validator.load_user_history(1, '2025-06-01T07:00:00', 300)
+        return sorted(history_df['Id'].tolist())
+
+    assert history_ids() == [101, 102, 103]
+    validator.configure_history_window(3)
+    assert history_ids() == [101, 102]
+    validator.configure_history_window(30, 2)
+    assert history_ids() == [101, 102]
+
+def test_socket_server_answers_each_connection_and_drains(validator, history_stub, tmp_path):
+    import socket
+    import threading
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    socket_path = str(tmp_path / 'validator.sock')
+    socket_server = validator.ValidatorSocketServer(socket_path, validator.ValidatorServer(io.StringIO()))
+    thread = threading.Thread(target=socket_server.serve_forever)
+    thread.start()
+    try:
+        clients = []
+        for user_id in (1, 2):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(socket_path)
+            client.sendall((json.dumps(run_record(user_id, user_id)) + "\n" +
+                            json.dumps(run_record(10 + user_id, user_id, distance=60.0)) + "\n").encode('utf-8'))
+            clients.append(client)
+        for client in clients:
+            reader = client.makefile('r', encoding='utf-8')
+            statuses = [json.loads(reader.readline())['approvalStatus'] for _ in range(2)]
+            assert statuses == ['APPROVED', 'REJECTED']
+    finally:
+        socket_server.drain()
+        thread.join(timeout=10)
+        socket_server.server_close()
+    assert not thread.is_alive()
+    assert all(client.recv(1) == b'' for client in clients)
+
+def test_stdio_server_answers_until_stdin_closes(history_stub):
+    import os
+    import subprocess
+    import sys
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'record_validator.py')
+    completed = subprocess.run([sys.executable, script, '--serve'], capture_output=True, text=True, timeout=120,
+                               input=json.dumps(run_record(1)) + "\n\n" + json.dumps(run_record(2, distance=60.0)) + "\n",
+                               env={**os.environ, 'API_URL': history_stub.base_url})
+    assert completed.returncode == 0
+    assert [json.loads(line)['approvalStatus'] for line in completed.stdout.splitlines()] == ['APPROVED', 'REJECTED']
+
+def test_no_history_record_skips_pandas_pipeline(history_stub):
+    import os
+    import subprocess
+    import sys
+    code = ("import json, sys, record_validator\n"
+            f"record_validator.configure_history_client(base_url={history_stub.base_url!r}, cache_ttl=0)\n"
+            f"result = record_validator.validate_record({json.dumps(json.dumps(run_record()))})\n"
+            "print(result['approvalStatus'], 'module' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, timeout=60,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.split()
+    assert output[-2:] == ['APPROVED', 'False']
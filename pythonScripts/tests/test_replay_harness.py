@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from replay_harness import fraud_type_summary, load_archive, run_replay, verdict_matrix
+
+VEHICLE = "Sử dụng phương tiện"
+SHORTCUT = "Đi tắt đường"
+
+def test_fraud_type_summary_maps_verdict_types_to_labels():
+    summary = fraud_type_summary(
+        [True, True, False, True],
+        ["Tốc độ cần xác nhận", "Nhịp tim cần kiểm tra", "Hoàn hảo", "Mẫu chạy đặc biệt"],
+        [(True, VEHICLE), (True, VEHICLE), (False, None), (True, SHORTCUT)]
+    )
+    assert summary[VEHICLE] == {'records': 2, 'precision': 1.0, 'recall': 0.5, 'detection_rate': 1.0}
+    assert summary[SHORTCUT] == {'records': 1, 'precision': 0.0, 'recall': 0.0, 'detection_rate': 1.0}
+
+def test_verdict_matrix_counts_transitions():
+    matrix = verdict_matrix(['APPROVED', 'APPROVED', 'REJECTED'], ['APPROVED', 'PENDING', 'REJECTED'])
+    assert matrix['APPROVED'] == {'APPROVED': 1, 'PENDING': 1, 'REJECTED': 0}
+    assert matrix['REJECTED']['REJECTED'] == 1
+
+def archive_record(record_id, user_id, distance, time_taken, steps, fraud_type=None):
+    return {'id': record_id, 'user': {'id': user_id}, 'steps': steps, 'distance': distance, 'timeTaken': time_taken,
+            'avgSpeed': distance / (time_taken / 60), 'endTime': '2025-06-01T07:00:00',
+            'label': {'isFraud': int(fraud_type is not None), 'fraudType': fraud_type}}
+
+def test_replay_scores_a_known_shortcut_hit(tmp_path):
+    path = tmp_path / 'archive.jsonl'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(archive_record(1, 1, 12.0, 60, 10000, SHORTCUT), ensure_ascii=False) + "\n")
+        f.write(json.dumps(archive_record(2, 2, 6.0, 40, 8000)) + "\n")
+        f.write("not json\n")
+
+    lines, records = load_archive(str(path))
+    report = run_replay(lines, records, [{'name': 'current'}, {'name': 'strict', 'historyDays': 1}], workers=1)
+
+    assert report['records'] == 3 and report['labeled_records'] == 2
+    for config_report in report['configs']:
+        assert config_report['verdicts'] == {'APPROVED': 1, 'PENDING': 2, 'REJECTED': 0}
+        assert config_report['detection']['recall'] == 1.0
+        assert config_report['fraud_types'][SHORTCUT] == pytest.approx(
+            {'records': 1, 'precision': 1.0, 'recall': 1.0, 'detection_rate': 1.0})
+        assert config_report['latency']['calls'] == 3
+    assert report['changed_records'] == []
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from module import compute_user_risk_scores, generate_final_report
+from risk_report import build_risk_report, load_risk_config
+
+def classified_frame():
+    return pd.DataFrame({
+        'UserId': [1, 1, 1, 2, 2, 3],
+        'IsFraud': [1, 0, 0, 1, 1, 0],
+        'FraudType': ['Đi tắt đường', None, None, 'Sử dụng phương tiện', 'Đi tắt đường', None],
+        'AvgSpeed': [14.0, 10.0, 9.5, 30.0, 16.0, 10.0]
+    })
+
+def test_risk_scores_follow_fraud_type_weights():
+    scores = compute_user_risk_scores(classified_frame())
+    assert scores[1]['fraud_count'] == 1 and scores[1]['total_activities'] == 3
+    assert scores[1]['risk_score'] == pytest.approx(100 / 3 * 1.8)
+    assert scores[2]['risk_score'] == 100.0 and scores[2]['risk_level'] == "Cao"
+    assert scores[3]['risk_score'] == 0.0 and scores[3]['risk_level'] == "Thấp"
+
+def test_report_totals_and_fraud_types():
+    report = build_risk_report(classified_frame())
+    assert report.totals['fraud_records'] == 3 and report.totals['fraud_users'] == 2
+    assert report.fraud_types['fraud_type'].tolist()[0] == 'Đi tắt đường'
+    assert report.user_risk_scores(fraud_only=True).keys() == {1, 2}
+
+def test_final_report_keeps_positional_fraud_cases(capsys):
+    df = classified_frame()
+    scores = generate_final_report(df, df[df['IsFraud'] == 1])
+    assert scores == compute_user_risk_scores(df)
+    assert "Số bản ghi gian lận: 3 (50.00%)" in capsys.readouterr().out
+
+def test_final_report_limits_fraud_to_the_given_cases(capsys):
+    df = classified_frame()
+    scores = generate_final_report(df, df.loc[[3]])
+    output = capsys.readouterr().out
+    assert "Số bản ghi gian lận: 1 (16.67%)" in output and "- Sử dụng phương tiện: 1 trường hợp" in output
+    assert scores[1]['fraud_count'] == 0 and scores[2]['fraud_count'] == 1
+
+def test_final_report_takes_risk_config_by_keyword():
+    df = classified_frame()
+    config = load_risk_config(overrides={'risk_levels': [[50, "Cao"]]})
+    assert generate_final_report(df, risk_config=config)[1]['risk_level'] == "Cao"
+    with pytest.raises(TypeError):
+        generate_final_report(df, None, config)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from rules import RuleBook, load_rule_book
+
+SPEC = {
+    'version': 1,
+    'params': {'fast': 15, 'too_fast': 20},
+    'sections': {
+        'speed': {
+            'rules': [
+                {'id': 'review', 'when': [['speed', '>', '$fast']], 'unless': [['verified', '==', 1]],
+                 'risk': 50, 'fraudType': 'Nhanh', 'reviewNote': 'Tốc độ {speed:.1f}'},
+                {'id': 'reject', 'when': [['speed', '>', '$too_fast'], ['heart_rate', '<', 100]], 'optional': ['heart_rate'],
+                 'risk': 80, 'fraudType': 'Quá nhanh', 'reviewNote': 'Quá nhanh {speed:.0f}', 'priority': -1},
+                {'id': 'note', 'when': [['speed', '>', 30]], 'appendNote': 'Kiểm tra thiết bị.'}
+            ]
+        },
+        'summary': {
+            'default': {'fraudType': 'Hoàn hảo', 'reviewNote': 'Tốt'},
+            'rules': [{'when': [['speed', '>', '$fast']], 'risk': 40}]
+        }
+    },
+    'events': {
+        'trail': {'params': {'fast': 12}},
+        'sprint': {'sections': {'summary': {'rules': []}}}
+    }
+}
+
+FEATURES = {
+    'speed': np.array([10.0, 16.0, 16.0, 25.0, 25.0, 35.0, 13.0]),
+    'verified': np.array([0, 0, 1, 0, 0, 0, 0]),
+    'heart_rate': np.array([150.0, 150.0, 150.0, 150.0, 80.0, 80.0, 150.0])
+}
+EVENTS = ['default', 'default', 'default', 'default', 'default', 'default', 'trail']
+
+def row(index):
+    return {name: values[index].item() for name, values in FEATURES.items()}
+
+def test_vectorized_scores_match_row_scores():
+    book = RuleBook(SPEC)
+    size = len(FEATURES['speed'])
+    for section in ('speed', 'summary'):
+        batch = book.score_many(section, FEATURES, size, EVENTS)
+        assert batch == [book.score(section, row(index), EVENTS[index]) for index in range(size)]
+
+def test_rule_semantics():
+    book = RuleBook(SPEC)
+    assert book.score('speed', row(0)) is None
+    assert book.score('speed', row(2)) is None
+    assert book.score('speed', row(1)) == {'approvalStatus': 'PENDING', 'fraudRisk': 50.0, 'fraudType': 'Nhanh',
+                                          'reviewNote': 'Tốc độ 16.0'}
+    assert book.score('speed', row(3))['fraudRisk'] == 50.0
+    assert book.score('speed', {'speed': 25.0})['approvalStatus'] == 'REJECTED'
+    rejected = book.score('speed', row(5))
+    assert rejected['fraudType'] == 'Nhanh' and rejected['reviewNote'] == 'Tốc độ 35.0 Kiểm tra thiết bị.'
+    assert book.score('summary', row(0)) == {'approvalStatus': 'APPROVED', 'fraudRisk': 0.0, 'fraudType': 'Hoàn hảo',
+                                            'reviewNote': 'Tốt'}
+
+def test_event_overrides_and_fallback():
+    book = RuleBook(SPEC)
+    assert book.score('speed', row(6), 'trail')['fraudType'] == 'Nhanh'
+    assert book.score('speed', row(6), 'unknown') is None
+    assert book.score('summary', row(1), 'sprint') is None
+    with pytest.raises(ValueError):
+        book.score('missing', row(0))
+
+@pytest.mark.parametrize('rule', [
+    {'when': [['speed', '~', 1]]},
+    {'when': [['speed', '>', '$unknown']]}
+])
+def test_invalid_rules_are_refused(rule):
+    with pytest.raises(ValueError):
+        RuleBook({'sections': {'speed': {'rules': [rule]}}})
+
+def test_digest_tracks_the_spec():
+    changed = {**SPEC, 'params': {**SPEC['params'], 'fast': 14}}
+    assert RuleBook(SPEC).digest == RuleBook(dict(SPEC)).digest != RuleBook(changed).digest
+    assert load_rule_book().rule_set('basic_conditions').rules
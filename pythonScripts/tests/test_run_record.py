@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from module import prepare_marathon_data
+from run_record import RunRecord, end_time_seconds, history_bounds, parse_timestamp, validate_run_record
+from synthetic_data import generate_marathon_records
+from test_record_validator import run_record
+
+def test_single_record_path_does_not_import_pandas():
+    code = ("import sys, run_record\n"
+            "run = run_record.RunRecord.from_dict({'id': 1, 'user': {'id': 1}, 'steps': 8000, 'distance': 6.0, "
+            "'timeTaken': 40, 'avgSpeed': 9.0, 'endTime': '2025-06-01T07:00:00'})\n"
+            "print(run_record.validate_run_record(run)['approvalStatus'], 'pandas' in sys.modules)")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, timeout=60,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.split()
+    assert output == ['APPROVED', 'False']
+
+def test_single_record_path_matches_frame_rules(validator):
+    records = generate_marathon_records(30, 2, fraud_ratio=0.5, seed=9) + [
+        run_record(distance=60.0), run_record(steps=0), run_record(heartRate=30.0), run_record(time_taken=2)]
+    runs = [RunRecord.from_dict(record) for record in records]
+    frame_results = validator.validate_single_records(prepare_marathon_data(pd.DataFrame([run.to_row() for run in runs])))
+    assert [validate_run_record(run) for run in runs] == frame_results
+    assert {result['approvalStatus'] for result in frame_results} == {'APPROVED', 'PENDING', 'REJECTED'}
+
+def test_record_fields_tolerate_missing_and_malformed_values():
+    run = RunRecord.from_dict({'id': 7, 'steps': 'n/a', 'distance': None, 'heartRate': None, 'eventId': 42})
+    assert (run.user_id, run.steps, run.distance, run.heart_rate, run.event_id) == ('', 0, 0.0, None, '42')
+    assert json.dumps(run.to_row())
+
+@pytest.mark.parametrize('value, seconds', [
+    ('1970-01-02T00:00:00', 86400),
+    ('', None),
+    ('không phải ngày', None),
+    (float('nan'), None)
+])
+def test_end_time_seconds(value, seconds):
+    assert end_time_seconds(value) == seconds
+
+def test_history_bounds_end_at_the_record():
+    start, end = history_bounds(7, '2025-06-01T07:00:00')
+    assert end == parse_timestamp('2025-06-01T07:00:00')
+    assert (end - start).days == 7
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from session_index import SessionIndex, frame_session_features
+from test_record_validator import run_record
+
+def long_runs(user_id=1, days=range(2, 7), distance=100.0):
+    end = datetime(2025, 6, 1, 7)
+    return [run_record(200 + day, user_id, steps=130000, distance=distance, time_taken=600,
+                       end_time=(end - timedelta(days=day)).isoformat())
+            for day in days]
+
+def history_frame(rows):
+    return pd.DataFrame(rows, columns=['UserId', 'EndTime', 'TimeTaken', 'TotalDistance'])
+
+def test_session_features_sum_daily_and_weekly_distance():
+    index = SessionIndex.from_frame(history_frame([
+        (1, '2025-05-25T07:00:00', 3600, 50.0),
+        (1, '2025-05-29T07:00:00', 3600, 30.0),
+        (1, '2025-06-01T05:00:00', 3600, 20.0)
+    ]))
+
+    features = index.session_features('2025-06-01T07:00:00', 2400, 10.0)
+    assert features == {'overlapping_sessions': 0, 'daily_distance': 30.0, 'weekly_distance': 60.0}
+    assert index.session_features('2025-06-01T05:30:00', 3600, 10.0)['overlapping_sessions'] == 1
+    assert index.session_features('2025-06-01T05:30:00', 0, 10.0, '2025-06-01T05:10:00')['overlapping_sessions'] == 0
+    assert index.session_features(None, 2400, 10.0) is None
+
+def test_frame_features_match_per_user_index():
+    df = history_frame([
+        (1, '2025-05-30T07:00:00', 3600, 40.0),
+        (2, '2025-05-31T07:00:00', 3600, 90.0),
+        (1, '2025-05-31T07:00:00', 3600, 30.0),
+        (1, '2025-05-31T07:30:00', 3600, 10.0)
+    ])
+
+    features = frame_session_features(df)
+    assert features['DailyDistance'].tolist() == [40.0, 90.0, 30.0, 40.0]
+    assert features['WeeklyDistance'].tolist() == [40.0, 90.0, 70.0, 80.0]
+    assert features['OverlappingSessions'].tolist() == [0, 0, 1, 1]
+
+@pytest.mark.parametrize('days, max_records', [(1, None), (7, 2)])
+def test_weekly_cap_ignores_analysis_window(validator, history_stub, days, max_records):
+    for record in long_runs():
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_history_window(days, max_records)
+
+    record = run_record(distance=10.0, time_taken=60, steps=13000)
+    result = validator.validate_record(json.dumps(record))
+    assert result['fraudType'] == 'Vượt giới hạn quãng đường'
+    assert '510.0km' in result['reviewNote']
+    assert validator.validate_records([json.dumps(record)])[0]['fraudType'] == 'Vượt giới hạn quãng đường'
+
+def test_weekly_cap_uses_history_store_window(validator, tmp_path):
+    from history_store import HistoryStore
+    HistoryStore(str(tmp_path)).append_records(long_runs())
+    validator.configure_history_store(str(tmp_path))
+    validator.configure_history_window(1)
+
+    result = validator.validate_record(json.dumps(run_record(distance=10.0, time_taken=60, steps=13000)))
+    assert result['fraudType'] == 'Vượt giới hạn quãng đường'
+
+def test_runs_older_than_a_week_do_not_count(validator, history_stub):
+    for record in long_runs(days=range(8, 13)):
+        history_stub.add_record(record)
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_history_window(30)
+
+    result = validator.validate_record(json.dumps(run_record(distance=10.0, time_taken=60, steps=13000)))
+    assert result['fraudType'] != 'Vượt giới hạn quãng đường'
+
+def test_backend_runs_a_day_apart_do_not_overlap(validator, history_stub):
+    history_stub.add_record(run_record(2, steps=8000, distance=10.0, time_taken=3600,
+                                       startTime='2025-05-31T06:00:00', end_time='2025-05-31T07:00:00'))
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+
+    record = run_record(distance=10.0, time_taken=3600, startTime='2025-06-01T06:00:00', end_time='2025-06-01T07:00:00')
+    features = SessionIndex.from_frame(validator.load_user_history(1, record['endTime'], 1, 7)).session_features(
+        record['endTime'], record['timeTaken'], record['distance'], record['startTime'])
+    assert features['overlapping_sessions'] == 0
+    assert validator.validate_record(json.dumps(record))['fraudType'] != 'Phiên chạy trùng thời gian'
@@ -0,0 +1,53 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from trajectory import record_samples, record_trajectory, trajectory_result
+from test_record_validator import run_record
+
+def samples(segments, interval=30):
+    rows, elapsed, distance, steps = [{'time': 0, 'distance': 0.0, 'steps': 0, 'heartRate': 140.0}], 0, 0.0, 0
+    for count, speed, cadence in segments:
+        for _ in range(count):
+            elapsed += interval
+            distance += speed * interval / 3600
+            steps += cadence * interval / 60
+            rows.append({'time': elapsed, 'distance': round(distance, 4), 'steps': round(steps),
+                         'heartRate': 140.0 + cadence / 20})
+    return rows
+
+def trajectory_record(segments, record_id=1):
+    rows = samples(segments)
+    minutes = rows[-1]['time'] / 60
+    return run_record(record_id, steps=rows[-1]['steps'], distance=rows[-1]['distance'], time_taken=minutes,
+                      heartRate=145.0, samples=rows)
+
+def test_steady_run_has_even_pace_and_no_rule_hits():
+    features = record_trajectory({'samples': samples([(60, 10.0, 170)])})
+    assert features['MaxSustainedSpeed'] == pytest.approx(10.0, rel=0.01)
+    assert features['PaceVariation'] == pytest.approx(0.0, abs=0.01)
+    assert features['StepFreeDistanceRatio'] == 0.0
+    assert trajectory_result(features) is None
+
+def test_sample_layouts_and_ordering_are_normalised():
+    rows = samples([(10, 10.0, 170)])
+    start = datetime(2025, 6, 1, 6)
+    as_columns = {'splits': {'timestamp': [(start + timedelta(seconds=row['time'])).isoformat() for row in rows],
+                             'distance': [row['distance'] for row in rows],
+                             'steps': [row['steps'] for row in rows]}}
+    shuffled = {'samples': rows[::-1] + rows[:2]}
+    assert record_samples(as_columns)['time'][1] - record_samples(as_columns)['time'][0] == 30
+    assert record_trajectory(shuffled) == record_trajectory({'samples': rows})
+    assert record_trajectory({'samples': rows[:2]}) is None
+    assert record_trajectory({'samples': [{'time': 'x', 'distance': 1}] * 5}) is None
+
+def test_step_free_vehicle_segment_is_rejected(validator, history_stub):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    record = json.dumps(trajectory_record([(20, 10.0, 170), (6, 40.0, 0), (20, 10.0, 170)]))
+
+    result = validator.validate_record(record)
+    assert result['approvalStatus'] == 'REJECTED'
+    assert result['fraudType'] == 'Tốc độ cần xác nhận'
+    assert validator.validate_records([record]) == [result]
+    assert validator.validate_record(json.dumps(trajectory_record([(46, 10.0, 170)])))['approvalStatus'] == 'APPROVED'
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from user_stats_store import UserStatsStore, empty_state, state_to_user_stats, update_state
+
+def stats_row(steps, distance, time_taken, avg_speed, heart_rate=None):
+    return {'TotalSteps': steps, 'TotalDistance': distance, 'TimeTaken': time_taken, 'AvgSpeed': avg_speed,
+            'DistancePerStep': distance / steps, 'heartRate': heart_rate}
+
+ROWS = [stats_row(8000 + 300 * i, 6.0 + 0.2 * i, 40 + i, 9.0 + 0.1 * i, 140.0 + i) for i in range(6)]
+
+def test_running_moments_match_numpy():
+    state = empty_state()
+    for row in ROWS:
+        update_state(state, row)
+    stats = state_to_user_stats(state)
+
+    speeds = np.array([row['AvgSpeed'] for row in ROWS])
+    assert math.isclose(stats['avg_avgspeed'], speeds.mean())
+    assert math.isclose(stats['std_avgspeed'], speeds.std(ddof=1))
+    assert math.isclose(stats['std_heartrate'], np.std([row['heartRate'] for row in ROWS], ddof=1))
+    assert stats['step_correlations']['TotalDistance'] > 0.99
+
+def test_non_finite_values_do_not_poison_the_state():
+    state = empty_state()
+    for row in ROWS:
+        update_state(state, row)
+    update_state(state, stats_row(8100, 6.1, 41, float('nan'), float('inf')))
+    update_state(state, {**stats_row(8200, 6.2, 42, 9.2), 'AvgSpeed': None})
+
+    assert all(math.isfinite(value) for value in state.values())
+    stats = state_to_user_stats(state)
+    assert math.isclose(stats['avg_avgspeed'], np.mean([row['AvgSpeed'] for row in ROWS]))
+    assert state['hr_count'] == len(ROWS)
+
+def test_store_round_trip(tmp_path):
+    store = UserStatsStore(str(tmp_path / 'stats.db'))
+    for row in ROWS:
+        store.add_record('u1', row)
+    store.add_record('u1', stats_row(8100, 6.1, 41, float('nan')))
+
+    stats = store.user_stats('u1')
+    assert stats['record_count'] == len(ROWS) + 1
+    assert math.isfinite(stats['avg_avgspeed']) and math.isfinite(stats['std_avgspeed'])
+    assert store.user_stats('u2') is None
+    store.close()
+
+def test_cli_flags_that_stats_store_skips_detectors(tmp_path):
+    import json
+    import os
+    import subprocess
+    import sys
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'record_validator.py')
+    record = json.dumps({'id': 1, 'user': {'id': 1}, 'steps': 8000, 'distance': 6.0, 'timeTaken': 40, 'avgSpeed': 9.0,
+                         'endTime': '2025-06-01T07:00:00'})
+    completed = subprocess.run([sys.executable, script, '--stats-db', str(tmp_path / 'stats.db'), record],
+                               capture_output=True, text=True, timeout=60)
+    assert "bỏ qua Isolation Forest/LOF" in completed.stdout
+    assert '"approvalStatus": "APPROVED"' in completed.stdout
+
+def test_missing_values_match_the_pandas_history_stats():
+    import pandas as pd
+    from module import analyze_per_user
+    rows = ROWS + [stats_row(8100, 6.1, 41, float('nan'), None), stats_row(9900, 7.4, 47, 9.4)]
+    state = empty_state()
+    for row in rows:
+        update_state(state, row)
+    stats = state_to_user_stats(state)
+    _, pandas_stats = analyze_per_user(pd.DataFrame([{**row, 'UserId': 1} for row in rows]).astype(float))
+    expected = pandas_stats[1]
+
+    for key in ('avg_avgspeed', 'std_avgspeed', 'std_totalsteps', 'avg_heartrate', 'std_heartrate',
+                'step_heart_rate_correlation'):
+        assert math.isclose(stats[key], expected[key], rel_tol=1e-9), key
+    for col, value in expected['step_correlations'].items():
+        assert math.isclose(stats['step_correlations'][col], value, rel_tol=1e-9), col
+    assert stats['record_count'] == expected['record_count'] == len(rows)
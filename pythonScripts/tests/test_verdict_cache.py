@@ -0,0 +1,54 @@
+import json
+
+from verdict_cache import VerdictCache, verdict_key
+from test_record_validator import run_record
+
+RESULT = {'approvalStatus': 'APPROVED', 'fraudRisk': 0.0, 'fraudType': 'Hoàn hảo', 'reviewNote': 'Tốt'}
+
+def test_keys_are_canonical():
+    assert verdict_key(['v1'], {'a': 1, 'b': 2}) == verdict_key(['v1'], {'b': 2, 'a': 1})
+    assert verdict_key(['v1'], {'a': 1}) != verdict_key(['v2'], {'a': 1})
+
+def test_memory_cache_is_bounded_and_expires():
+    cache = VerdictCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, RESULT)
+    assert cache.get('a') is None and cache.get('c') == RESULT
+    cached = cache.get('c')
+    cached['approvalStatus'] = 'REJECTED'
+    assert cache.get('c') == RESULT
+
+    large = VerdictCache(max_entries=5000)
+    for key in range(5000):
+        large.put(str(key), RESULT)
+    assert large.get('0') == RESULT and len(large.entries) == 5000
+
+    expired = VerdictCache(ttl=-1)
+    expired.put('a', RESULT)
+    assert expired.get('a') is None
+
+def test_sqlite_cache_and_generations_survive_reopen(tmp_path):
+    path = str(tmp_path / 'verdicts.db')
+    cache = VerdictCache(path)
+    cache.put('a', RESULT)
+    cache.history_changed(7)
+    cache.history_changed(7)
+    cache.close()
+
+    reopened = VerdictCache(path)
+    assert reopened.get('a') == RESULT
+    assert reopened.history_generation(7) == 2 and reopened.history_generation(8) == 0
+    reopened.close()
+
+def test_resubmissions_skip_validation_until_history_changes(validator, history_stub):
+    validator.configure_history_client(base_url=history_stub.base_url, cache_ttl=0)
+    validator.configure_verdict_cache('memory')
+    record = json.dumps(run_record(1))
+
+    first = validator.validate_record(record)
+    assert validator.validate_record(record) == first
+    assert history_stub.request_count == 1
+
+    validator.validate_record(json.dumps(run_record(2, end_time='2025-06-02T07:00:00')))
+    assert validator.validate_record(record) == first
+    assert history_stub.request_count == 3
@@ -0,0 +1,142 @@
+import json
+import math
+import sys
+
+import numpy as np
+
+from rules import get_rule_book
+from run_record import SAMPLE_FIELDS, is_missing, parse_timestamp, record_event_id, safe_get
+
+TRAJECTORY_FEATURES = ['MaxSustainedSpeed', 'PaceVariation', 'MaxSpeedJump', 'StepFreeDistanceRatio', 'CadenceHeartRateCorrelation']
+SAMPLE_TIME_KEYS = ('time', 'timestamp')
+MIN_SAMPLES = 3
+SUSTAINED_SECONDS = 60
+STEP_FREE_CADENCE = 30
+
+def sample_number(value):
+    if is_missing(value) or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def sample_seconds(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    moment = parse_timestamp(value)
+    return math.nan if moment is None else moment.timestamp()
+
+def sample_array(values, convert):
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return np.array([convert(value) for value in values], dtype=float)
+
+def sample_column(samples, keys):
+    for key in keys:
+        if isinstance(samples, dict):
+            values = samples.get(key)
+            if not isinstance(values, list):
+                values = None
+        else:
+            values = [safe_get(sample, key) for sample in samples]
+            if all(value is None for value in values):
+                values = None
+        if values is not None:
+            return values
+    return None
+
+def record_samples(record):
+    samples = None
+    for field in SAMPLE_FIELDS:
+        samples = safe_get(record, field)
+        if isinstance(samples, (list, dict)) and samples:
+            break
+        samples = None
+    if samples is None:
+        return None
+
+    times = sample_column(samples, SAMPLE_TIME_KEYS)
+    distances = sample_column(samples, ('distance',))
+    if times is None or distances is None or len(times) != len(distances):
+        return None
+
+    columns = {
+        'time': sample_array(times, sample_seconds),
+        'distance': sample_array(distances, sample_number)
+    }
+    for column in ('steps', 'heartRate'):
+        values = sample_column(samples, (column,))
+        columns[column] = (sample_array(values, sample_number)
+                           if values is not None and len(values) == len(times) else np.full(len(times), np.nan))
+
+    valid = np.isfinite(columns['time']) & np.isfinite(columns['distance'])
+    if not valid.all():
+        columns = {column: values[valid] for column, values in columns.items()}
+    if len(columns['time']) and (np.diff(columns['time']) < 0).any():
+        order = np.argsort(columns['time'], kind='stable')
+        columns = {column: values[order] for column, values in columns.items()}
+    if len(columns['time']):
+        increasing = np.concatenate([[True], np.diff(columns['time']) > 0])
+        if not increasing.all():
+            columns = {column: values[increasing] for column, values in columns.items()}
+    return columns if len(columns['time']) >= MIN_SAMPLES else None
+
+def max_sustained_speed(times, distances, mean_speed, sustained_seconds):
+    if times[-1] - times[0] <= sustained_seconds:
+        return mean_speed
+    starts = np.searchsorted(times, times - sustained_seconds, side='right') - 1
+    ends = np.flatnonzero(starts >= 0)
+    starts = starts[ends]
+    return float(((distances[ends] - distances[starts]) / ((times[ends] - times[starts]) / 3600)).max())
+
+def trajectory_features(samples, sustained_seconds=SUSTAINED_SECONDS):
+    times, distances = samples['time'], samples['distance']
+    hours = np.diff(times) / 3600
+    segment_distance = np.maximum(np.diff(distances), 0)
+    segment_speed = segment_distance / hours
+    total_distance = segment_distance.sum()
+    mean_speed = total_distance / hours.sum()
+
+    features = dict.fromkeys(TRAJECTORY_FEATURES, math.nan)
+    features['MaxSustainedSpeed'] = max_sustained_speed(times, distances, mean_speed, sustained_seconds)
+    if mean_speed > 0:
+        features['PaceVariation'] = float(np.sqrt((hours * (segment_speed - mean_speed) ** 2).sum() / hours.sum()) / mean_speed)
+        features['MaxSpeedJump'] = float(np.abs(np.diff(segment_speed)).max() / mean_speed)
+    else:
+        features['PaceVariation'] = features['MaxSpeedJump'] = 0.0
+
+    cadence = np.diff(samples['steps']) / (hours * 60)
+    has_cadence = np.isfinite(cadence)
+    if has_cadence.any() and total_distance > 0:
+        step_free = has_cadence & (cadence < STEP_FREE_CADENCE)
+        features['StepFreeDistanceRatio'] = float(segment_distance[step_free].sum() / segment_distance[has_cadence].sum()) \
+            if segment_distance[has_cadence].sum() > 0 else 0.0
+
+    heart_rates = samples['heartRate']
+    segment_heart_rate = (heart_rates[:-1] + heart_rates[1:]) / 2
+    paired = has_cadence & np.isfinite(segment_heart_rate)
+    if paired.sum() >= MIN_SAMPLES and cadence[paired].std() > 0 and segment_heart_rate[paired].std() > 0:
+        features['CadenceHeartRateCorrelation'] = float(np.corrcoef(cadence[paired], segment_heart_rate[paired])[0, 1])
+    return features
+
+def record_trajectory(record):
+    samples = record_samples(record)
+    return trajectory_features(samples) if samples is not None else None
+
+def trajectory_result(features, event_id=None):
+    return get_rule_book().score('trajectory', features, event_id)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Hướng dẫn sử dụng: python trajectory.py <tệp_json_bản_ghi_có_samples>")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        record = json.load(f)
+    features = record_trajectory(record)
+    if features is None:
+        print("Bản ghi không có đủ dữ liệu hành trình để phân tích")
+        sys.exit(1)
+    print(json.dumps({"features": features, "result": trajectory_result(features, record_event_id(record))}, ensure_ascii=False, indent=2))
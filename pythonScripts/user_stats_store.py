@@ -0,0 +1,189 @@
+import json
+import math
+import sqlite3
+import sys
+import threading
+
+MOMENT_COLUMNS = ['TotalSteps', 'TotalDistance', 'AvgSpeed', 'DistancePerStep', 'TimeTaken', 'heartRate']
+STAT_COLUMNS = ['TotalSteps', 'TotalDistance', 'AvgSpeed', 'DistancePerStep']
+CORRELATION_COLUMNS = ['TotalDistance', 'AvgSpeed', 'TimeTaken']
+
+def pair_fields(prefix, x_key, y_key):
+    return [f'{prefix}_count', f'{prefix}_mean_{x_key}', f'{prefix}_m2_{x_key}', f'{prefix}_mean_{y_key}',
+            f'{prefix}_m2_{y_key}', f'{prefix}_co_{x_key}_{y_key}']
+
+CORRELATION_PAIRS = [(f'steps_{col.lower()}', 'totalsteps', col.lower()) for col in CORRELATION_COLUMNS]
+HEART_RATE_PAIR = ('hr', 'totalsteps', 'heartrate')
+
+STATE_FIELDS = (
+    ['count'] +
+    [f'count_{col.lower()}' for col in MOMENT_COLUMNS] +
+    [f'mean_{col.lower()}' for col in MOMENT_COLUMNS] +
+    [f'm2_{col.lower()}' for col in MOMENT_COLUMNS] +
+    [field for pair in CORRELATION_PAIRS + [HEART_RATE_PAIR] for field in pair_fields(*pair)]
+)
+
+def empty_state():
+    return {field: 0.0 for field in STATE_FIELDS}
+
+def finite_value(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+def update_pair(state, prefix, x_key, y_key, x, y):
+    if x is None or y is None:
+        return
+    state[f'{prefix}_count'] += 1
+    count = state[f'{prefix}_count']
+    x_delta = x - state[f'{prefix}_mean_{x_key}']
+    y_delta = y - state[f'{prefix}_mean_{y_key}']
+    state[f'{prefix}_mean_{x_key}'] += x_delta / count
+    state[f'{prefix}_mean_{y_key}'] += y_delta / count
+    state[f'{prefix}_m2_{x_key}'] += x_delta * (x - state[f'{prefix}_mean_{x_key}'])
+    state[f'{prefix}_m2_{y_key}'] += y_delta * (y - state[f'{prefix}_mean_{y_key}'])
+    state[f'{prefix}_co_{x_key}_{y_key}'] += x_delta * (y - state[f'{prefix}_mean_{y_key}'])
+
+def update_state(state, row):
+    state['count'] += 1
+
+    values = {}
+    for col in MOMENT_COLUMNS:
+        key = col.lower()
+        value = values[key] = finite_value(row.get(col))
+        if value is None:
+            continue
+        state[f'count_{key}'] += 1
+        delta = value - state[f'mean_{key}']
+        state[f'mean_{key}'] += delta / state[f'count_{key}']
+        state[f'm2_{key}'] += delta * (value - state[f'mean_{key}'])
+
+    for prefix, x_key, y_key in CORRELATION_PAIRS + [HEART_RATE_PAIR]:
+        update_pair(state, prefix, x_key, y_key, values[x_key], values[y_key])
+    return state
+
+def sample_std(m2, count):
+    if count < 2:
+        return float('nan')
+    return math.sqrt(max(m2, 0.0) / (count - 1))
+
+def correlation(co_moment, m2_x, m2_y):
+    denominator = math.sqrt(max(m2_x, 0.0) * max(m2_y, 0.0))
+    if denominator == 0:
+        return float('nan')
+    return max(-1.0, min(1.0, co_moment / denominator))
+
+def pair_correlation(state, prefix, x_key, y_key):
+    return correlation(state[f'{prefix}_co_{x_key}_{y_key}'], state[f'{prefix}_m2_{x_key}'], state[f'{prefix}_m2_{y_key}'])
+
+def state_to_user_stats(state):
+    count = int(state['count'])
+    if count < 2:
+        return None
+
+    stats = {}
+    for col in STAT_COLUMNS:
+        key = col.lower()
+        stats[f'avg_{key}'] = state[f'mean_{key}'] if state[f'count_{key}'] else float('nan')
+        stats[f'std_{key}'] = sample_std(state[f'm2_{key}'], int(state[f'count_{key}']))
+
+    heart_rate_count = int(state['count_heartrate'])
+    if heart_rate_count > 0:
+        stats['avg_heartrate'] = state['mean_heartrate']
+        stats['std_heartrate'] = sample_std(state['m2_heartrate'], heart_rate_count)
+    stats['record_count'] = count
+
+    if count >= 5:
+        stats['step_correlations'] = {
+            col: pair_correlation(state, *pair) for col, pair in zip(CORRELATION_COLUMNS, CORRELATION_PAIRS)
+        }
+        if state['hr_count'] >= 2:
+            stats['step_heart_rate_correlation'] = pair_correlation(state, *HEART_RATE_PAIR)
+
+    return stats
+
+class UserStatsStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{field} REAL NOT NULL DEFAULT 0" for field in STATE_FIELDS)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS user_stats (user_id TEXT PRIMARY KEY, {columns})")
+
+    def get_state(self, user_id):
+        with self.lock:
+            return self._read_state(str(user_id))
+
+    def _read_state(self, user_id):
+        row = self.connection.execute(
+            f"SELECT {', '.join(STATE_FIELDS)} FROM user_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(STATE_FIELDS, row))
+
+    def user_stats(self, user_id, pending_row=None):
+        state = self.get_state(user_id) or empty_state()
+        if pending_row is not None:
+            update_state(state, pending_row)
+        return state_to_user_stats(state)
+
+    def add_record(self, user_id, row):
+        user_id = str(user_id)
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                state = update_state(self._read_state(user_id) or empty_state(), row)
+                placeholders = ", ".join("?" for _ in STATE_FIELDS)
+                updates = ", ".join(f"{field} = excluded.{field}" for field in STATE_FIELDS)
+                self.connection.execute(
+                    f"INSERT INTO user_stats (user_id, {', '.join(STATE_FIELDS)}) VALUES (?, {placeholders}) "
+                    f"ON CONFLICT(user_id) DO UPDATE SET {updates}",
+                    [user_id] + [state[field] for field in STATE_FIELDS]
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+        return state
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def record_to_stats_row(record):
+    steps = float(record.get('steps') or 0.0)
+    distance = float(record.get('distance') or 0.0)
+    time_taken = float(record.get('timeTaken') or 0.0)
+    return {
+        'TotalSteps': steps,
+        'TotalDistance': distance,
+        'TimeTaken': time_taken,
+        'AvgSpeed': float(record.get('avgSpeed') or 0.0),
+        'DistancePerStep': distance / steps if steps > 0 else 0.0,
+        'heartRate': record.get('heartRate')
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Hướng dẫn sử dụng: python user_stats_store.py <tệp_sqlite> <tệp_jsonl_bản_ghi_đã_duyệt>")
+        sys.exit(1)
+
+    store = UserStatsStore(sys.argv[1])
+    loaded = 0
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            user_id = (record.get('user') or {}).get('id')
+            if user_id is None:
+                continue
+            store.add_record(user_id, record_to_stats_row(record))
+            loaded += 1
+    store.close()
+    print(f"Đã cập nhật thống kê từ {loaded} bản ghi vào {sys.argv[1]}")
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MEMORY_ENTRIES = 4096
+DEFAULT_TTL = 3600.0
+EVICTION_CHECK_INTERVAL = 1000
+
+def verdict_key(*parts):
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+class VerdictCache:
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, memory_entries=DEFAULT_MEMORY_ENTRIES, ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = min(memory_entries, max_entries) if path else max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.writes = 0
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, result TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, used_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS verdicts_used_at ON verdicts (used_at)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS history_generations (user_id TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+
+    def history_generation(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            if self.connection is None:
+                return self.generations.get(user_id, 0)
+            row = self.connection.execute(
+                "SELECT generation FROM history_generations WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return 0 if row is None else row[0]
+
+    def history_changed(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            if self.connection is None:
+                self.generations[user_id] = self.generations.get(user_id, 0) + 1
+                return
+            self.connection.execute(
+                "INSERT INTO history_generations (user_id, generation) VALUES (?, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET generation = generation + 1", (user_id,)
+            )
+
+    def _remember(self, key, expires_at, result):
+        self.entries[key] = (expires_at, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.memory_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self.entries.move_to_end(key)
+                    return dict(entry[1])
+                del self.entries[key]
+            if self.connection is None:
+                return None
+
+            row = self.connection.execute("SELECT result, expires_at FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self.connection.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+                return None
+            self.connection.execute("UPDATE verdicts SET used_at = ? WHERE key = ?", (now, key))
+            result = json.loads(row[0])
+            self._remember(key, row[1], result)
+            return dict(result)
+
+    def put(self, key, result):
+        now = time.time()
+        expires_at = now + self.ttl
+        with self.lock:
+            self._remember(key, expires_at, dict(result))
+            if self.connection is None:
+                return
+            self.connection.execute(
+                "INSERT OR REPLACE INTO verdicts (key, result, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), expires_at, now)
+            )
+            self.writes += 1
+            if self.writes >= EVICTION_CHECK_INTERVAL:
+                self.writes = 0
+                self._evict(now)
+
+    def _evict(self, now):
+        self.connection.execute("DELETE FROM verdicts WHERE expires_at < ?", (now,))
+        excess = self.connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY used_at LIMIT ?)", (excess,)
+            )
+
+    def entry_count(self):
+        with self.lock:
+            if self.connection is None:
+                return len(self.entries)
+            return self.connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM verdicts")
+
+    def close(self):
+        with self.lock:
+            self.entries.clear()
+            if self.connection is not None:
+                self.connection.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Hướng dẫn sử dụng: python verdict_cache.py <tệp_sqlite> [--clear]")
+        sys.exit(1)
+
+    cache = VerdictCache(sys.argv[1])
+    if '--clear' in sys.argv[2:]:
+        cache.clear()
+        print(f"Đã xóa bộ nhớ đệm kết quả: {sys.argv[1]}")
+    else:
+        print(f"Bộ nhớ đệm kết quả {sys.argv[1]} đang lưu {cache.entry_count()} kết quả")
+    cache.close()
@@ -15,7 +15,9 @@ import java.io.BufferedReader
 import java.io.File
 import java.io.InputStreamReader
 import java.nio.charset.StandardCharsets
-import java.util.stream.Collectors
+
+// Mã thoát của record_validator.py khi có kết quả: 0 = APPROVED, 10 = PENDING, 20 = REJECTED
+private val VALIDATION_EXIT_CODES = setOf(0, 10, 20)
 
 @Component
 class RecordApprovalServiceImpl(
@@ -82,15 +84,16 @@ class RecordApprovalServiceImpl(
             tempFile.deleteOnExit() // Đảm bảo file sẽ bị xóa khi JVM kết thúc
             tempFile.writeText(recordJson)
 
-            // Truyền đường dẫn đến file JSON thay vì nội dung JSON
-            val processBuilder = ProcessBuilder(pythonPath, scriptPath, tempFile.absolutePath, "--file")
+            // Truyền đường dẫn đến file JSON thay vì nội dung JSON.
+            // Kết quả được ghi thành một dòng JSON duy nhất trên stdout, log chẩn đoán đi qua stderr
+            val processBuilder = ProcessBuilder(pythonPath, scriptPath, tempFile.absolutePath, "--file", "--json-out", "-")
             processBuilder.directory(scriptDir)
-            processBuilder.redirectErrorStream(true)
+            processBuilder.redirectError(ProcessBuilder.Redirect.INHERIT)
 
             val process = processBuilder.start()
 
             val reader = BufferedReader(InputStreamReader(process.inputStream, StandardCharsets.UTF_8))
-            val output = reader.lines().collect(Collectors.joining("\n"))
+            val output = reader.readLine()
 
             val exitCode = process.waitFor()
             debugPythonExecution(output, exitCode)
@@ -98,7 +101,7 @@ class RecordApprovalServiceImpl(
             // Xóa file tạm sau khi xử lý xong
             tempFile.delete()
 
-            if (exitCode != 0) {
+            if (exitCode !in VALIDATION_EXIT_CODES || output.isNullOrBlank()) {
                 return RecordApprovalDTO(
                     approvalStatus = ERecordApprovalStatus.PENDING,
                     fraudRisk = 50.0,
@@ -107,9 +110,7 @@ class RecordApprovalServiceImpl(
                 )
             }
 
-            val jsonResult = extractJsonFromOutput(output)
-
-            return parseValidationResult(jsonResult)
+            return parseValidationResult(output)
 
         } catch (e: Exception) {
             e.printStackTrace() // In ra stack trace để debug chi tiết hơn
@@ -121,30 +122,6 @@ class RecordApprovalServiceImpl(
             )
         }
     }
-    /**
-     * Tìm chuỗi JSON trong output của Python script
-     */
-    private fun extractJsonFromOutput(output: String): String {
-        val beginMarker = "--- BEGIN JSON RESULT ---"
-        val endMarker = "--- END JSON RESULT ---"
-
-        val beginIndex = output.indexOf(beginMarker)
-        val endIndex = output.indexOf(endMarker)
-
-        if (beginIndex != -1 && endIndex != -1 && beginIndex < endIndex) {
-            val json = output.substring(beginIndex + beginMarker.length, endIndex).trim()
-            return json
-        }
-
-        val jsonStartIndex = output.lastIndexOf('{')
-        if (jsonStartIndex != -1) {
-            val json = output.substring(jsonStartIndex)
-            return json
-        }
-
-        return """{"approvalStatus":"PENDING","fraudRisk":50.0,"fraudType":"Lỗi phân tích","reviewNote":"Không thể phân tích kết quả"}"""
-    }
-
     /**
      * Phân tích JSON thành đối tượng RecordApprovalDTO
      */
@@ -175,7 +152,7 @@ class RecordApprovalServiceImpl(
     }
 
     // Thêm phương thức này vào lớp RecordApprovalServiceImpl của bạn
-    private fun debugPythonExecution(output: String, exitCode: Int) {
+    private fun debugPythonExecution(output: String?, exitCode: Int) {
         println("Python execution completed with exit code: $exitCode")
         println("Output:")
         println(output)